@@ -1,14 +1,13 @@
 #!/bin/bash
 # Database backup script for Job Posting Telegram Bot
+#
+# Uses SQLite's online backup API (via src/backup.py) so the bot can keep
+# running while the copy is taken. The backup is copied in small page steps,
+# integrity-checked, compressed and rotated.
 
 # Set backup directory
 BACKUP_DIR="./backups"
 DB_FILE="./data/jobbot.db"
-TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
-BACKUP_FILE="${BACKUP_DIR}/jobbot_${TIMESTAMP}.db"
-
-# Create backup directory if it doesn't exist
-mkdir -p "$BACKUP_DIR"
 
 # Check if database file exists
 if [ ! -f "$DB_FILE" ]; then
@@ -17,16 +16,11 @@ if [ ! -f "$DB_FILE" ]; then
 fi
 
 # Create backup
-echo "Creating backup of database..."
-cp "$DB_FILE" "$BACKUP_FILE"
-
-# Compress backup
-echo "Compressing backup..."
-gzip "$BACKUP_FILE"
-
-# Cleanup old backups (keep last 10)
-echo "Cleaning up old backups..."
-ls -t "${BACKUP_DIR}"/jobbot_*.db.gz | tail -n +11 | xargs -r rm
+echo "Creating online backup of database..."
+if ! python3 -m src.backup --dir "$BACKUP_DIR" --keep 10; then
+    echo "Error: Backup failed"
+    exit 1
+fi
 
-echo "Backup completed: ${BACKUP_FILE}.gz"
-echo "Total backups: $(ls "${BACKUP_DIR}"/jobbot_*.db.gz | wc -l)" 
\ No newline at end of file
+echo "Backup completed."
+echo "Total backups: $(ls "${BACKUP_DIR}"/jobbot_[0-9]*.db* | wc -l)"
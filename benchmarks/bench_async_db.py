@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Measure event loop lag while bot handlers hit the database concurrently
+
+Compares calling DatabaseManager directly inside coroutines (the old handler
+behaviour) with going through AsyncDatabaseManager's bounded executor.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Use a throwaway database before the src package creates its engine
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+import logging
+logging.disable(logging.INFO)
+
+from src.db_manager import DatabaseManager
+from src.async_db import AsyncDatabaseManager
+from src.loop_monitor import EventLoopLagMonitor
+
+async def simulate_command(db_call, telegram_id):
+    """One /filter + /showfilters round trip for a user"""
+    await db_call("add_keyword_filter", telegram_id, f"keyword{telegram_id % 50}")
+    await db_call("get_user_filters", telegram_id)
+    await db_call("remove_keyword_filter", telegram_id, f"keyword{telegram_id % 50}")
+
+async def run_load(db_call, users, rounds):
+    """Fire concurrent commands for all users and report loop lag"""
+    monitor = EventLoopLagMonitor(sample_interval=0.005, report_interval=3600)
+    monitor.start()
+    started = time.perf_counter()
+    
+    for _ in range(rounds):
+        await asyncio.gather(*[simulate_command(db_call, telegram_id) for telegram_id in range(1, users + 1)])
+    
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+    stats = monitor.summary()
+    commands = users * rounds * 3
+    return commands / elapsed, stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    
+    db_manager = DatabaseManager()
+    for telegram_id in range(1, args.users + 1):
+        db_manager.register_user(telegram_id, username=f"user{telegram_id}")
+    
+    async def blocking_call(name, *call_args):
+        return getattr(db_manager, name)(*call_args)
+    
+    async_db = AsyncDatabaseManager(db_manager)
+    
+    async def executor_call(name, *call_args):
+        return await getattr(async_db, name)(*call_args)
+    
+    for label, db_call in (("blocking (direct)", blocking_call), ("AsyncDatabaseManager", executor_call)):
+        throughput, stats = asyncio.run(run_load(db_call, args.users, args.rounds))
+        print(
+            f"{label:22} {throughput:8.0f} db calls/s | loop lag avg {stats['avg_ms']:7.1f} ms "
+            f"p99 {stats['p99_ms']:7.1f} ms max {stats['max_ms']:7.1f} ms"
+        )
+    
+    async_db.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Throughput of category-only matching: per-user queries vs the subscription index
+
+Fills a throwaway database with category-only subscribers and a batch of new
+jobs, then measures how many (user, job) pairs per second each approach
+evaluates:
+
+- get_new_jobs_for_user called once per user (the original notification loop)
+- the subscription index looking up category -> users per job
+- a full SubscriptionIndex.match over the batch, ledger checks included
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Use a throwaway database before the src package creates its engine
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+import logging
+logging.disable(logging.WARNING)
+
+from src.models import User, Category, user_category, get_session
+from src.db_manager import DatabaseManager
+from src.matching import SubscriptionIndex
+
+def populate(db_manager, users, jobs, categories, rng):
+    """Insert users following 1-3 random categories, and a batch of jobs"""
+    session = get_session()
+    try:
+        session.add_all([Category(name=f"Category {i}") for i in range(1, categories + 1)])
+        session.flush()
+        session.execute(User.__table__.insert(), [{"telegram_id": i, "is_active": True} for i in range(1, users + 1)])
+        session.execute(user_category.insert(), [
+            {"user_id": user_id, "category_id": category_id}
+            for user_id in range(1, users + 1)
+            for category_id in rng.sample(range(1, categories + 1), rng.randint(1, 3))
+        ])
+        session.commit()
+    finally:
+        session.close()
+    
+    db_manager.add_jobs([
+        {
+            "title": f"Job {i}",
+            "url": f"https://example.az/{i}",
+            "source": "bench",
+            "category": f"Category {rng.randint(1, categories)}"
+        }
+        for i in range(jobs)
+    ])
+
+def report(label, pairs_evaluated, seconds, matched):
+    print(f"{label:28} {pairs_evaluated / seconds:14,.0f} user-job pairs/s  ({seconds * 1000:9.1f} ms, {matched} matches)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--categories", type=int, default=30)
+    parser.add_argument("--db-users", type=int, default=500, help="users to time the per-user query loop on")
+    args = parser.parse_args()
+    
+    rng = random.Random(7)
+    db_manager = DatabaseManager()
+    populate(db_manager, args.users, args.jobs, args.categories, rng)
+    
+    subscriptions = db_manager.get_active_subscriptions()
+    jobs = db_manager.get_new_jobs()
+    print(f"{args.users} category-only users, {len(jobs)} jobs, {args.categories} categories")
+    
+    # Original loop: one get_new_jobs_for_user call per user (timed on a sample)
+    sample = subscriptions[:args.db_users]
+    started = time.perf_counter()
+    matched = sum(len(db_manager.get_new_jobs_for_user(subscription.telegram_id, since_timestamp=None)) for subscription in sample)
+    report("get_new_jobs_for_user loop", len(sample) * len(jobs), time.perf_counter() - started, matched)
+    
+    index = SubscriptionIndex(subscriptions)
+    
+    started = time.perf_counter()
+    pairs = [
+        (user_id, position)
+        for position, job in enumerate(jobs)
+        for user_id in index.category_only_users.get(job.category_id, ())
+    ]
+    report("dict index lookup", len(subscriptions) * len(jobs), time.perf_counter() - started, len(pairs))
+    
+    started = time.perf_counter()
+    matches = index.match(jobs)
+    report("SubscriptionIndex.match", len(subscriptions) * len(jobs), time.perf_counter() - started, sum(map(len, matches.values())))
+
+if __name__ == "__main__":
+    main()
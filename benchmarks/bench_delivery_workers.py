@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Sharded delivery across local worker processes
+
+Queues a burst of notifications in the outbox, then starts several delivery
+worker processes that send them to a fake Bot API (a fixed latency per call,
+every send logged to a file per worker). Optionally kills one worker midway
+to show its partitions being taken over once its leases expire. Reports
+throughput, the busiest second across all workers, the shortest gap between
+two messages to one chat, and any message sent twice.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Worker processes inherit the parent's environment, so they open the same database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["DELIVERY_MODE"] = "workers"
+
+import logging
+logging.disable(logging.WARNING)
+
+def worker_process(worker_id, log_path, latency, rate, lease_seconds, heartbeat_seconds):
+    """One delivery worker whose fake Bot API appends "time chat_id outbox_id" per send to log_path"""
+    from src.async_db import AsyncDatabaseManager
+    from src.db_manager import DatabaseManager
+    from src.delivery_worker import DeliveryWorker
+    
+    log = open(log_path, "a", buffering=1)
+    
+    async def send(delivery):
+        await asyncio.sleep(latency)
+        log.write(f"{time.time()} {delivery.chat_id} {delivery.outbox_id}\n")
+        return True
+    
+    async def run():
+        db = AsyncDatabaseManager(DatabaseManager())
+        worker = DeliveryWorker(
+            db, send, worker_id, global_rate=rate, batch_size=50,
+            lease_seconds=lease_seconds, heartbeat_seconds=heartbeat_seconds, poll_seconds=0.2
+        )
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, worker.stop)
+        await worker.run()
+    
+    asyncio.run(run())
+
+def queue_burst(db_manager, chats, jobs_per_chat):
+    """Register `chats` users and queue `jobs_per_chat` notifications for each"""
+    from src.dispatcher import Delivery
+    
+    db_manager.add_jobs([
+        dict(title=f"Python Developer {i}", company="ABB", location="Bakı", url=f"https://example.az/{i}", source="Bench", category="IT")
+        for i in range(jobs_per_chat)
+    ])
+    jobs = db_manager.get_new_jobs()
+    deliveries = []
+    for chat_id in range(1000, 1000 + chats):
+        user_id = db_manager.register_user(chat_id)
+        deliveries.extend(Delivery(chat_id, user_id, job) for job in jobs)
+    return db_manager.enqueue_notifications(deliveries)
+
+def read_sends(paths):
+    """(time, chat_id, outbox_id, worker) for every logged send, in time order"""
+    sends = []
+    for worker, path in paths.items():
+        if os.path.exists(path):
+            with open(path) as log:
+                for line in log:
+                    sent_at, chat_id, outbox_id = line.split()
+                    sends.append((float(sent_at), int(chat_id), int(outbox_id), worker))
+    return sorted(sends)
+
+def max_per_second(times):
+    best, start = 0, 0
+    for end, sent_at in enumerate(times):
+        while sent_at - times[start] >= 1.0:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--jobs-per-chat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per fake Bot API call")
+    parser.add_argument("--rate", type=float, default=30, help="global messages per second across all workers")
+    parser.add_argument("--lease", type=int, default=3, help="lease length in seconds")
+    parser.add_argument("--heartbeat", type=int, default=1, help="seconds between heartbeats")
+    parser.add_argument("--kill-after", type=float, default=5, help="SIGKILL one worker after this many seconds (0 to keep all)")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+    
+    from src.db_manager import DatabaseManager
+    from src.config import DELIVERY_PARTITIONS
+    
+    db_manager = DatabaseManager()
+    queued = queue_burst(db_manager, args.chats, args.jobs_per_chat)
+    print(f"{queued} notifications for {args.chats} chats queued; {args.workers} workers, {DELIVERY_PARTITIONS} partitions")
+    
+    log_dir = tempfile.mkdtemp()
+    paths = {f"worker-{n}": os.path.join(log_dir, f"worker-{n}.log") for n in range(args.workers)}
+    context = multiprocessing.get_context("spawn")
+    processes = {
+        worker_id: context.Process(
+            target=worker_process, args=(worker_id, path, args.latency, args.rate, args.lease, args.heartbeat)
+        )
+        for worker_id, path in paths.items()
+    }
+    
+    started = time.time()
+    for process in processes.values():
+        process.start()
+    
+    killed = None
+    while time.time() - started < args.timeout:
+        time.sleep(0.2)
+        if args.kill_after and killed is None and time.time() - started >= args.kill_after:
+            killed = next(iter(processes))
+            os.kill(processes[killed].pid, signal.SIGKILL)
+            print(f"killed {killed} after {args.kill_after:.0f} s")
+        if db_manager.get_outbox_stats()['pending'] == 0:
+            break
+    elapsed = time.time() - started
+    
+    for worker_id, process in processes.items():
+        if worker_id != killed:
+            process.terminate()
+        process.join()
+    
+    sends = read_sends(paths)
+    times = [sent_at for sent_at, _, _, _ in sends]
+    per_chat = defaultdict(list)
+    for sent_at, chat_id, _, _ in sends:
+        per_chat[chat_id].append(sent_at)
+    gaps = [b - a for chat_times in per_chat.values() for a, b in zip(chat_times, chat_times[1:])]
+    resent = sum(count - 1 for count in Counter(outbox_id for _, _, outbox_id, _ in sends).values() if count > 1)
+    per_worker = Counter(worker for _, _, _, worker in sends)
+    
+    print(f"{len(sends)} sends in {elapsed:.1f} s = {len(sends) / elapsed:.1f} msg/s (limit {args.rate:.0f}/s)")
+    print(f"max {max_per_second(times)} in any second, min per-chat gap {min(gaps) if gaps else 0:.2f} s")
+    print(f"per worker: {dict(sorted(per_worker.items()))}")
+    print(f"{resent} messages sent twice (in flight when a worker died), {db_manager.get_outbox_stats()['pending']} left pending")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+API calls saved by digest mode
+
+Draws a Zipf-distributed number of matched jobs per user for one cycle and
+compares the number of Bot API calls needed with one message per job against
+digests of the given size (each under Telegram's 4096-character limit).
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+import logging
+logging.disable(logging.INFO)
+
+from src.db_manager import JobRecord
+from src.digest import TELEGRAM_MESSAGE_LIMIT, build_digests
+from src.text import normalize_text
+
+TITLES = [
+    "Senior Python Developer", "Baş mühasib", "Satış meneceri", "Data Analyst (SQL, Power BI)",
+    "Frontend Developer (React)", "HR Business Partner", "Kassir", "Sistem inzibatçısı",
+    "Marketing Specialist", "Product Manager - Digital Banking", "QA Engineer", "Anbardar"
+]
+COMPANIES = ["Kapital Bank", "PASHA Bank", "ABB", "Azercell", "Bakcell", "Unibank", None]
+LOCATIONS = ["Bakı", "Gəncə", "Sumqayıt", None]
+
+def build_jobs(count, rng):
+    """Jobs with realistic title, company, location and URL lengths"""
+    jobs = []
+    for job_id in range(1, count + 1):
+        title = rng.choice(TITLES)
+        jobs.append(JobRecord(
+            job_id, title, normalize_text(title), rng.choice(COMPANIES), rng.choice(LOCATIONS),
+            f"https://jobsearch.az/vacancies/{normalize_text(title).replace(' ', '-')}-{job_id}",
+            "JobSearch.az", 1, "IT", None
+        ))
+    return jobs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--jobs", type=int, default=300, help="jobs scraped in the cycle")
+    parser.add_argument("--max-matches", type=int, default=100, help="most jobs one user can match")
+    parser.add_argument("--zipf", type=float, default=1.2, help="Zipf exponent for matches per user")
+    parser.add_argument("--size", type=int, action="append", help="digest sizes to compare (repeatable)")
+    args = parser.parse_args()
+    
+    rng = random.Random(42)
+    jobs = build_jobs(args.jobs, rng)
+    weights = [1 / rank ** args.zipf for rank in range(1, args.max_matches + 1)]
+    matches = [
+        rng.sample(jobs, count)
+        for count in rng.choices(range(1, args.max_matches + 1), weights, k=args.users)
+    ]
+    total = sum(len(user_jobs) for user_jobs in matches)
+    print(f"{args.users} users, {total} matched jobs (mean {total / args.users:.1f}, max {max(map(len, matches))} per user)")
+    print(f"{'one message per job':24} {total:9} API calls")
+    
+    for size in args.size or [10, 25, 50]:
+        started = time.perf_counter()
+        digests = [digest for user_jobs in matches for digest in build_digests(user_jobs, size)]
+        seconds = time.perf_counter() - started
+        longest = max(len(digest.text) for digest in digests)
+        assert longest <= TELEGRAM_MESSAGE_LIMIT
+        print(
+            f"{f'digests of {size}':24} {len(digests):9} API calls ({1 - len(digests) / total:6.1%} fewer), "
+            f"longest message {longest} chars, built in {seconds * 1000:.0f} ms"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Sequential sends vs the rate-limited notification dispatcher
+
+Sends a synthetic batch of notifications to a fake Bot API that answers after
+a fixed latency and occasionally responds with RetryAfter, then reports
+throughput and checks that the global and per-chat limits were respected.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+import logging
+logging.disable(logging.WARNING)
+
+from telegram.error import RetryAfter
+
+from src.dispatcher import Delivery, NotificationDispatcher
+
+class FakeBotAPI:
+    """Records send times per chat; answers after `latency` seconds, sometimes with RetryAfter"""
+    
+    def __init__(self, latency, retry_after_rate, rng):
+        self.latency = latency
+        self.retry_after_rate = retry_after_rate
+        self.rng = rng
+        self.sends = []
+        self.chat_sends = defaultdict(list)
+        self.retry_afters = 0
+    
+    async def send(self, delivery):
+        await asyncio.sleep(self.latency)
+        if self.rng.random() < self.retry_after_rate:
+            self.retry_afters += 1
+            raise RetryAfter(1)
+        now = time.monotonic()
+        self.sends.append(now)
+        self.chat_sends[delivery.chat_id].append(now)
+        return True
+    
+    def max_per_second(self):
+        """Most messages delivered inside any one-second window"""
+        best, start = 0, 0
+        for end, sent_at in enumerate(self.sends):
+            while sent_at - self.sends[start] >= 1.0:
+                start += 1
+            best = max(best, end - start + 1)
+        return best
+    
+    def min_chat_gap(self):
+        """Shortest time between two messages to the same chat"""
+        gaps = [b - a for times in self.chat_sends.values() for a, b in zip(times, times[1:])]
+        return min(gaps) if gaps else None
+
+def build_deliveries(messages, chats, rng):
+    """Messages spread over chats, some chats getting several"""
+    return [Delivery(chat_id, chat_id, job_id) for job_id, chat_id in enumerate(rng.choices(range(1, chats + 1), k=messages))]
+
+async def run_sequential(deliveries, api):
+    """The old loop: one awaited send after another, RetryAfter treated as a failure"""
+    sent = 0
+    for delivery in deliveries:
+        try:
+            sent += await api.send(delivery)
+        except RetryAfter:
+            pass
+    return sent
+
+def report(label, sent, seconds, api):
+    gap = api.min_chat_gap()
+    gap_text = f"{gap:.2f} s" if gap is not None else "n/a"
+    print(
+        f"{label:12} {sent:6} sent in {seconds:7.2f} s = {sent / seconds:6.1f} msg/s, "
+        f"max {api.max_per_second()} in any second, min per-chat gap {gap_text}, {api.retry_afters} RetryAfter"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=600)
+    parser.add_argument("--chats", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.15, help="seconds per Bot API call")
+    parser.add_argument("--retry-after-rate", type=float, default=0.005, help="fraction of calls answered with RetryAfter")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+    
+    rng = random.Random(42)
+    deliveries = build_deliveries(args.messages, args.chats, rng)
+    print(f"{args.messages} messages to {len(set(d.chat_id for d in deliveries))} chats, {args.latency * 1000:.0f} ms per call")
+    
+    if not args.skip_sequential:
+        api = FakeBotAPI(args.latency, args.retry_after_rate, random.Random(1))
+        started = time.monotonic()
+        sent = asyncio.run(run_sequential(deliveries, api))
+        report("sequential", sent, time.monotonic() - started, api)
+    
+    api = FakeBotAPI(args.latency, args.retry_after_rate, random.Random(1))
+    dispatcher = NotificationDispatcher(api.send, workers=args.workers)
+    started = time.monotonic()
+    stats = asyncio.run(dispatcher.dispatch(deliveries))
+    report("dispatcher", stats['sent'], time.monotonic() - started, api)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Compare loading matched jobs as ORM instances with the JobRecord projection
+
+Measures wall time and peak Python memory for fetching N jobs together with
+their category name, the data send_job_notification needs.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Use a throwaway database before the src package creates its engine
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+import logging
+logging.disable(logging.INFO)
+
+from sqlalchemy.orm import joinedload
+from src.models import Job, Category, get_session
+from src.db_manager import DatabaseManager, JobRecord, JOB_RECORD_COLUMNS
+
+def load_orm():
+    """Old path: full Job instances, category eagerly joined so it survives the session"""
+    session = get_session()
+    try:
+        jobs = session.query(Job).options(joinedload(Job.category)).all()
+        return [(job.title, job.category.name if job.category else None) for job in jobs], jobs
+    finally:
+        session.close()
+
+def load_records():
+    """New path: column-only projection joined on category"""
+    session = get_session()
+    try:
+        query = session.query(*JOB_RECORD_COLUMNS).outerjoin(Category, Job.category_id == Category.id)
+        jobs = [JobRecord(*row) for row in query]
+        return [(job.title, job.category_name) for job in jobs], jobs
+    finally:
+        session.close()
+
+def measure(loader, repeat):
+    """Return best wall time and peak traced memory for a loader"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        loader()
+        best = min(best, time.perf_counter() - started)
+    
+    tracemalloc.start()
+    result = loader()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    db_manager = DatabaseManager()
+    categories = ["IT", "Finance", "Marketing", "Sales", "Design"]
+    db_manager.add_jobs([
+        {
+            "title": f"Software Engineer {i}",
+            "company": f"Company {i % 300}",
+            "location": "Bakı",
+            "url": f"https://example.az/jobs/{i}",
+            "source": "bench",
+            "category": categories[i % len(categories)]
+        }
+        for i in range(args.jobs)
+    ])
+    
+    print(f"Loading {args.jobs} matched jobs with their category")
+    for label, loader in (("ORM instances", load_orm), ("JobRecord projection", load_records)):
+        seconds, peak = measure(loader, args.repeat)
+        print(f"{label:22} {seconds * 1000:8.1f} ms  peak {peak / 1024 / 1024:7.2f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Compare the user-centric matcher with the Aho-Corasick subscription index
+
+Builds synthetic subscriptions and jobs in memory (no database) and times
+how long each matcher takes to decide which user gets which job.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Nothing is written, but keep the src package away from the real database
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+import logging
+logging.disable(logging.INFO)
+
+from src.db_manager import Subscription, JobRecord
+from src.fuzzy import FuzzyKeywordMatcher
+from src.matching import SubscriptionIndex, match_jobs_per_user
+from src.text import normalize_text
+
+TITLE_WORDS = [
+    "senior", "junior", "lead", "python", "java", "frontend", "backend", "developer", "engineer",
+    "data", "analyst", "manager", "product", "designer", "devops", "mühasib", "satış", "menecer",
+    "marketing", "specialist", "qa", "tester", "support", "hr", "bank", "operator", "sistem", "inzibatçı"
+]
+
+def misspell(word, rng):
+    """Drop or swap one letter, the way keywords get mistyped"""
+    if len(word) < 4:
+        return word
+    position = rng.randrange(1, len(word) - 1)
+    if rng.random() < 0.5:
+        return word[:position] + word[position + 1:]
+    return word[:position - 1] + word[position] + word[position - 1] + word[position + 1:]
+
+def build_subscriptions(users, categories, rng, fuzzy=0.0):
+    """Random mix of category-only, keyword-only, combined and unfiltered users
+    
+    A fraction of the keyword users get misspelled, fuzzy-matched keywords instead.
+    """
+    subscriptions = []
+    for user_id in range(1, users + 1):
+        kind = rng.random()
+        category_ids = frozenset(rng.sample(range(1, categories + 1), rng.randint(1, 3))) if kind < 0.7 else frozenset()
+        keywords = tuple(normalize_text(word) for word in rng.sample(TITLE_WORDS, rng.randint(1, 3))) if 0.4 < kind < 0.98 else ()
+        fuzzy_keywords = ()
+        if keywords and rng.random() < fuzzy:
+            keywords, fuzzy_keywords = (), tuple(misspell(keyword, rng) for keyword in keywords)
+        subscriptions.append(Subscription(user_id, user_id, None, category_ids, keywords, fuzzy_keywords))
+    return subscriptions
+
+def build_jobs(jobs, categories, rng):
+    """Random job titles drawn from the same vocabulary"""
+    records = []
+    for job_id in range(1, jobs + 1):
+        title = " ".join(rng.sample(TITLE_WORDS, 3)).title()
+        records.append(JobRecord(
+            job_id, title, normalize_text(title), None, None,
+            f"https://example.az/{job_id}", "bench", rng.randint(1, categories), None, None
+        ))
+    return records
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--fuzzy", type=float, default=0.0, help="fraction of keyword users with misspelled fuzzy keywords")
+    parser.add_argument("--skip-per-user", action="store_true", help="only time the subscription index")
+    args = parser.parse_args()
+    
+    rng = random.Random(42)
+    subscriptions = build_subscriptions(args.users, args.categories, rng, args.fuzzy)
+    jobs = build_jobs(args.jobs, args.categories, rng)
+    print(f"{args.users} users, {args.jobs} jobs, {args.categories} categories")
+    
+    started = time.perf_counter()
+    matcher = SubscriptionIndex(subscriptions)
+    build_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    matches = matcher.match(jobs)
+    match_seconds = time.perf_counter() - started
+    pairs = sum(len(user_jobs) for user_jobs in matches.values())
+    print(
+        f"subscription index:   build {build_seconds * 1000:8.1f} ms, match {match_seconds * 1000:8.1f} ms "
+        f"({pairs} user/job pairs, {len(matcher.keyword_users)} distinct keywords)"
+    )
+    
+    if matcher.fuzzy_keyword_users:
+        # Time each title against a fresh fuzzy matcher, so no lookup is served from its cache
+        fuzzy_keywords = list(matcher.fuzzy_keyword_users)
+        timings = []
+        for job in jobs:
+            fuzzy_matcher = FuzzyKeywordMatcher(fuzzy_keywords)
+            started = time.perf_counter()
+            fuzzy_matcher.search(job.title_normalized)
+            timings.append(time.perf_counter() - started)
+        print(
+            f"fuzzy lookup:         {len(fuzzy_keywords)} distinct fuzzy keywords, uncached per job "
+            f"mean {sum(timings) / len(timings) * 1e6:6.1f} us, max {max(timings) * 1e6:6.1f} us"
+        )
+    
+    if not args.skip_per_user:
+        started = time.perf_counter()
+        reference = match_jobs_per_user(subscriptions, jobs)
+        seconds = time.perf_counter() - started
+        same = dict(reference) == dict(matches)
+        print(f"per-user loop:        match {seconds * 1000:8.1f} ms (results identical: {same})")
+
+if __name__ == "__main__":
+    main()
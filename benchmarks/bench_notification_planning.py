@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Notification planning and delivery at synthetic scale
+
+Fills a throwaway database with users, Zipf-distributed category and keyword
+filters (optionally filter expressions) and a cycle's worth of jobs, then
+measures the "which user gets which job" planning step for each matcher
+implementation:
+
+- the subscription index (DatabaseManager.plan_notifications), cold and warm
+- the in-memory per-user loop over the same bulk-loaded data
+- one get_new_jobs_for_user query per user (sampled and extrapolated)
+
+For each it reports wall time, statements issued and peak Python memory.
+Delivery is timed separately through the outbox, for a sample of the planned
+pairs: queueing them, loading them back in batches and completing each one,
+with the Telegram send itself left out.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Use a throwaway database (and working directory, for any log files) before the
+# src package creates its engine, and count statements per DatabaseManager method
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())
+os.environ["DATABASE_URL"] = f"sqlite:///{os.getcwd()}/bench.db"
+os.environ["QUERY_STATS_ENABLED"] = "true"
+os.environ["SLOW_QUERY_THRESHOLD_MS"] = "1e9"
+
+import logging
+logging.disable(logging.WARNING)
+
+from src.models import User, Category, Keyword, Job, user_category, user_keyword, get_session
+from src.db_manager import DatabaseManager, notification_cutoff
+from src.dispatcher import Delivery
+from src.instrumentation import query_stats
+from src.matching import match_jobs_per_user
+from src.text import normalize_text
+
+TITLE_WORDS = [
+    "senior", "junior", "lead", "python", "java", "frontend", "backend", "developer", "engineer",
+    "data", "analyst", "manager", "product", "designer", "devops", "mühasib", "satış", "menecer",
+    "marketing", "specialist", "qa", "tester", "support", "hr", "bank", "operator", "sistem", "inzibatçı",
+    "kassir", "sürücü", "həkim", "müəllim", "hüquqşünas", "logistika", "anbardar", "ofisiant", "aşpaz",
+    "dizayner", "proqramçı", "texnik", "mühəndis", "satıcı", "konsultant", "koordinator", "assistent"
+]
+
+# Filter expressions handed out to users, most popular first
+EXPRESSIONS = [
+    "python OR java NOT senior",
+    "developer AND (baki OR remote)",
+    "manager NOT bank",
+    "source:glorri AND (data OR analyst)",
+    "NOT (junior OR intern)",
+    "company:\"kapital bank\" OR company:pasha",
+    "title:mühasib OR title:accountant",
+    "(designer OR dizayner) location:baki",
+]
+
+def zipf_weights(count, exponent):
+    """Weights making the k-th item 1/k^s as likely as the first"""
+    return [1 / rank ** exponent for rank in range(1, count + 1)]
+
+def zipf_sample(population, weights, count, rng):
+    """Up to count distinct items drawn with Zipf weights"""
+    return set(rng.choices(population, weights, k=count))
+
+def build_vocabulary(size):
+    """Keyword vocabulary: real title words first (the most popular), then synthetic ones"""
+    words = list(TITLE_WORDS)
+    words.extend(f"skill{i}" for i in range(size - len(words)))
+    return words[:size]
+
+def populate(args, rng):
+    """Insert categories, keywords, users with their filters, and one cycle of jobs"""
+    vocabulary = build_vocabulary(args.keywords)
+    category_ids = list(range(1, args.categories + 1))
+    keyword_ids = list(range(1, len(vocabulary) + 1))
+    category_weights = zipf_weights(len(category_ids), args.zipf)
+    keyword_weights = zipf_weights(len(keyword_ids), args.zipf)
+    now = datetime.utcnow()
+    
+    session = get_session()
+    try:
+        session.execute(Category.__table__.insert(), [
+            {"id": category_id, "name": f"Category {category_id}"} for category_id in category_ids
+        ])
+        session.execute(Keyword.__table__.insert(), [
+            {"id": keyword_id, "word": word, "normalized": normalize_text(word)}
+            for keyword_id, word in zip(keyword_ids, vocabulary)
+        ])
+        expression_weights = zipf_weights(len(EXPRESSIONS), args.zipf)
+        session.execute(User.__table__.insert(), [
+            {
+                "id": user_id, "telegram_id": user_id, "is_active": True, "created_at": now - timedelta(days=30),
+                "filter_expression": rng.choices(EXPRESSIONS, expression_weights)[0] if rng.random() < args.expressions else None
+            }
+            for user_id in range(1, args.users + 1)
+        ])
+        
+        category_rows, keyword_rows = [], []
+        for user_id in range(1, args.users + 1):
+            for category_id in zipf_sample(category_ids, category_weights, rng.randint(0, 3), rng):
+                category_rows.append({"user_id": user_id, "category_id": category_id})
+            for keyword_id in zipf_sample(keyword_ids, keyword_weights, rng.randint(0, 3), rng):
+                keyword_rows.append({"user_id": user_id, "keyword_id": keyword_id, "fuzzy": rng.random() < args.fuzzy})
+        session.execute(user_category.insert(), category_rows)
+        session.execute(user_keyword.insert(), keyword_rows)
+        
+        job_rows = []
+        for job_id in range(1, args.jobs + 1):
+            title = " ".join(rng.choices(vocabulary, keyword_weights, k=rng.randint(2, 5))).title()
+            job_rows.append({
+                "id": job_id,
+                "title": title,
+                "title_normalized": normalize_text(title),
+                "url": f"https://example.az/{job_id}",
+                "company": rng.choice(["Kapital Bank", "PASHA Bank", "ABB", "Azercell", None]),
+                "location": rng.choice(["Bakı", "Gəncə", "Remote", None]),
+                "source": rng.choice(["Glorri", "JobSearch.az", "HelloJob.az"]),
+                "category_id": rng.choices(category_ids, category_weights)[0],
+                "scraped_date": now - timedelta(minutes=rng.randint(1, 600))
+            })
+        session.execute(Job.__table__.insert(), job_rows)
+        session.commit()
+        return len(category_rows), len(keyword_rows)
+    finally:
+        session.close()
+
+def measure(function, memory):
+    """Run function once; return (result, seconds, statements issued, peak MiB or None)"""
+    query_stats.report(reset=True)
+    if memory:
+        tracemalloc.start()
+    
+    started = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - started
+    
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    statements = sum(entry['statements'] for entry in query_stats.report(reset=True))
+    return result, seconds, statements, peak
+
+def count_pairs(matches):
+    """Number of (user, job) pairs in a dict of user -> jobs"""
+    return sum(len(jobs) for jobs in matches.values())
+
+def report(label, seconds, statements, peak, pairs, note=""):
+    peak_text = f"{peak:8.1f} MiB" if peak is not None else "       n/a"
+    print(f"{label:30} {seconds * 1000:10.1f} ms {statements:9} statements {peak_text} peak {pairs:10} pairs{note}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--jobs", type=int, default=200, help="jobs scraped in the cycle")
+    parser.add_argument("--categories", type=int, default=30)
+    parser.add_argument("--keywords", type=int, default=500, help="size of the keyword vocabulary")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent for category and keyword popularity")
+    parser.add_argument("--fuzzy", type=float, default=0.0, help="fraction of keyword filters that are fuzzy")
+    parser.add_argument("--expressions", type=float, default=0.0, help="fraction of users with a filter expression")
+    parser.add_argument("--query-sample", type=int, default=200, help="users timed with per-user queries (0 skips)")
+    parser.add_argument("--deliver", type=int, default=2000, help="planned pairs sent through the outbox (0 skips)")
+    parser.add_argument("--batch-size", type=int, default=100, help="outbox entries loaded per batch")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc passes")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    db_manager = DatabaseManager()
+    
+    started = time.perf_counter()
+    category_rows, keyword_rows = populate(args, rng)
+    print(
+        f"{args.users} users ({category_rows} category / {keyword_rows} keyword filters, zipf s={args.zipf}), "
+        f"{args.jobs} jobs, populated in {time.perf_counter() - started:.1f} s"
+    )
+    print()
+    
+    def plan_cold():
+        db_manager.subscription_index = None
+        return db_manager.plan_notifications()
+    
+    def plan_per_user_loop():
+        subscriptions = db_manager.get_active_subscriptions()
+        cutoff = notification_cutoff()
+        jobs = db_manager.get_new_jobs(cutoff)
+        sent_pairs = db_manager.get_sent_pairs(cutoff)
+        return match_jobs_per_user(subscriptions, jobs, sent_pairs)
+    
+    sample = rng.sample(range(1, args.users + 1), min(args.query_sample, args.users))
+    def plan_per_user_queries():
+        return {user_id: db_manager.get_new_jobs_for_user(user_id) for user_id in sample}
+    
+    matchers = [
+        ("subscription index (cold)", plan_cold),
+        ("subscription index (warm)", db_manager.plan_notifications),
+        ("per-user loop", plan_per_user_loop),
+    ]
+    if sample:
+        matchers.append(("per-user queries", plan_per_user_queries))
+    
+    print("Planning")
+    planned = None
+    for label, function in matchers:
+        result, seconds, statements, _ = measure(function, memory=False)
+        peak = None
+        if not args.no_memory:
+            _, _, _, peak = measure(function, memory=True)
+        
+        note = ""
+        if label == "per-user queries":
+            # Extrapolate the sampled users to the whole population
+            scale = args.users / len(sample)
+            seconds, statements = seconds * scale, int(statements * scale)
+            note = f"  (extrapolated from {len(sample)} users; pairs are for the sample)"
+        report(label, seconds, statements, peak, count_pairs(result), note)
+        
+        if planned is None:
+            planned = result
+        elif label == "per-user loop":
+            same = {s.user_id: [job.id for job in jobs] for s, jobs in planned.items()} == \
+                   {s.user_id: [job.id for job in jobs] for s, jobs in result.items()}
+            print(f"{'':30} results identical to the subscription index: {same}")
+    
+    if args.deliver:
+        # Users were inserted with telegram_id == id, so the chat is the user ID
+        deliveries = [
+            Delivery(subscription.telegram_id, subscription.user_id, job)
+            for subscription, jobs in planned.items() for job in jobs
+        ][:args.deliver]
+        
+        def enqueue():
+            return db_manager.enqueue_notifications(deliveries, datetime.utcnow())
+        
+        def drain():
+            completed = 0
+            while True:
+                batch = db_manager.get_due_outbox(args.batch_size)
+                if not batch:
+                    return completed
+                completed += sum(db_manager.complete_outbox_entry(delivery.outbox_id, delivery.user_id) for delivery in batch)
+        
+        queued, enqueue_seconds, enqueue_statements, _ = measure(enqueue, memory=False)
+        completed, drain_seconds, drain_statements, _ = measure(drain, memory=False)
+        seconds = enqueue_seconds + drain_seconds
+        total = count_pairs(planned)
+        print()
+        print("Delivery through the outbox (no Telegram calls)")
+        print(f"{'enqueue_notifications':30} {enqueue_seconds * 1000:10.1f} ms {enqueue_statements:9} statements {queued:10} entries")
+        print(f"{'get_due_outbox + complete':30} {drain_seconds * 1000:10.1f} ms {drain_statements:9} statements {completed:10} entries")
+        print(
+            f"{completed / seconds:,.0f} notifications/s end to end; "
+            f"all {total} planned pairs would take ~{total / (completed / seconds):.1f} s"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Job message rendering: once per recipient vs once per job
+
+Builds a cycle's deliveries (popular jobs reach many users) and times
+rendering every notification text from scratch against the shared
+JobMessageRenderer, which escapes each job's body once and splices in the
+per-recipient emoji and closing line.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+import logging
+logging.disable(logging.INFO)
+
+from src.db_manager import JobRecord
+from src.rendering import JobMessageRenderer, render_job_body
+from src.text import normalize_text
+
+TITLES = [
+    "Senior Python Developer", "Baş mühasib", "Satış meneceri", "Data_Analyst (SQL, Power BI)",
+    "Frontend Developer [React]", "HR Business Partner", "Kassir", "Sistem inzibatçısı",
+    "Marketing *Specialist*", "Product Manager - Digital Banking", "QA Engineer", "Anbardar"
+]
+COMPANIES = ["Kapital Bank", "PASHA Bank", "ABB", "Azercell", "Bakcell", "Unibank", None]
+LOCATIONS = ["Bakı", "Gəncə", "Sumqayıt", None]
+EMOJIS = ["💼", "👔", "🏢", "💻", "📊"]
+MOTIVATIONS = ["Your dream job is just around the corner! 🌈", "Exciting opportunities await! ✨"]
+
+def build_jobs(count, rng):
+    """Jobs with realistic field lengths and some Markdown special characters"""
+    jobs = []
+    for job_id in range(1, count + 1):
+        title = rng.choice(TITLES)
+        jobs.append(JobRecord(
+            job_id, title, normalize_text(title), rng.choice(COMPANIES), rng.choice(LOCATIONS),
+            f"https://jobsearch.az/vacancies/{normalize_text(title).replace(' ', '-')}-{job_id}",
+            "JobSearch.az", 1, "IT", None
+        ))
+    return jobs
+
+def render_uncached(job, emoji, motivation):
+    """What every send did before: escape and format the whole message"""
+    return f"{emoji} *Exciting Job Alert!* {emoji}\n\n{render_job_body(job)}\n\n{motivation}"
+
+def time_renders(deliveries, render, rng):
+    started = time.perf_counter()
+    for job in deliveries:
+        render(job, rng.choice(EMOJIS), rng.choice(MOTIVATIONS))
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=300, help="jobs scraped in the cycle")
+    parser.add_argument("--deliveries", type=int, default=200000, help="notifications sent in the cycle")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent for recipients per job")
+    parser.add_argument("--cache-size", type=int, default=5000)
+    args = parser.parse_args()
+    
+    rng = random.Random(42)
+    jobs = build_jobs(args.jobs, rng)
+    weights = [1 / rank ** args.zipf for rank in range(1, len(jobs) + 1)]
+    deliveries = rng.choices(jobs, weights=weights, k=args.deliveries)
+    print(f"{args.deliveries} notifications for {len(set(job.id for job in deliveries))} distinct jobs")
+    
+    seconds = time_renders(deliveries, render_uncached, random.Random(1))
+    print(f"per recipient  {seconds:7.3f} s = {args.deliveries / seconds:10,.0f} messages/s, {args.deliveries} renders")
+    
+    renderer = JobMessageRenderer(args.cache_size)
+    seconds = time_renders(deliveries, renderer.render, random.Random(1))
+    stats = renderer.stats()
+    print(
+        f"shared cache   {seconds:7.3f} s = {args.deliveries / seconds:10,.0f} messages/s, "
+        f"{stats['renders']} renders, {stats['hit_rate']:.1%} cache hits"
+    )
+    
+    # Same text either way
+    job = deliveries[0]
+    assert renderer.render(job, EMOJIS[0], MOTIVATIONS[0]) == render_uncached(job, EMOJIS[0], MOTIVATIONS[0])
+
+if __name__ == "__main__":
+    main()
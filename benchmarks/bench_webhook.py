@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Command throughput in webhook mode
+
+Starts the bot in webhook mode in a separate process, pointed at a local fake
+Bot API, then posts recorded command updates (/start, /help, /filter, ...)
+from many users to the webhook at high concurrency. Reports how fast the
+webhook accepted them, how fast replies came back, reply latency
+percentiles, and that requests with a wrong secret token are rejected.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SECRET_TOKEN = "bench-secret-token"
+BOT_TOKEN = "123456:BENCH"
+
+# Commands as Telegram posts them; the user, chat and IDs are filled in per update
+RECORDED_COMMANDS = ["/start", "/help", "/filter", "/digest 5", "/showfilters", "/pause", "/resume"]
+RECORDED_UPDATE = {
+    "update_id": 0,
+    "message": {
+        "message_id": 0,
+        "from": {"id": 0, "is_bot": False, "first_name": "Aysel", "username": "aysel", "language_code": "az"},
+        "chat": {"id": 0, "first_name": "Aysel", "username": "aysel", "type": "private"},
+        "date": 1760000000,
+        "text": "",
+        "entities": [{"offset": 0, "length": 0, "type": "bot_command"}]
+    }
+}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class FakeBotAPI(BaseHTTPRequestHandler):
+    """Answers the Bot API methods the bot calls and records when each chat got a reply"""
+    replies = {}
+    webhook_set = threading.Event()
+    
+    def do_POST(self):
+        method = self.path.rsplit("/", 1)[-1]
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+        params = {key: values[0] for key, values in parse_qs(body).items()}
+        if not params and body.startswith("{"):
+            params = json.loads(body)
+        
+        if method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            FakeBotAPI.replies.setdefault(chat_id, time.perf_counter())
+            result = {
+                "message_id": 1, "date": int(time.time()), "text": params.get("text", ""),
+                "chat": {"id": chat_id, "type": "private"}
+            }
+        else:
+            if method == "setWebhook":
+                FakeBotAPI.webhook_set.set()
+            result = True
+        
+        payload = json.dumps({"ok": True, "result": result}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def log_message(self, *args):
+        pass
+
+def run_bot():
+    """Bot process: the real JobBot in webhook mode (configured through the inherited environment)"""
+    import logging
+    logging.disable(logging.WARNING)
+    from src.bot import get_bot
+    get_bot().run()
+
+def build_updates(count):
+    """One recorded command per user, cycling through the commands"""
+    updates = []
+    for n in range(count):
+        command = RECORDED_COMMANDS[n % len(RECORDED_COMMANDS)]
+        update = json.loads(json.dumps(RECORDED_UPDATE))
+        message = update["message"]
+        update["update_id"] = message["message_id"] = n + 1
+        message["from"]["id"] = message["chat"]["id"] = 100000 + n
+        message["text"] = command
+        message["entities"][0]["length"] = len(command.split()[0])
+        updates.append(update)
+    return updates
+
+async def post_updates(url, updates, concurrency, secret):
+    """Post every update; returns {chat_id: post time} and the HTTP status counts"""
+    posted, statuses = {}, {}
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+    
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def post(update):
+            async with semaphore:
+                posted[update["message"]["chat"]["id"]] = time.perf_counter()
+                response = await client.post(url, json=update, headers=headers)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        
+        await asyncio.gather(*(post(update) for update in updates))
+    return posted, statuses
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=2000, help="command updates to post, one per user")
+    parser.add_argument("--concurrency", type=int, default=50, help="requests in flight at once")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+    
+    api = ThreadingHTTPServer(("127.0.0.1", free_port()), FakeBotAPI)
+    threading.Thread(target=api.serve_forever, daemon=True).start()
+    
+    webhook_port = free_port()
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{tempfile.mkdtemp()}/bench.db",
+        "TELEGRAM_BOT_TOKEN": BOT_TOKEN,
+        "TELEGRAM_API_BASE_URL": f"http://127.0.0.1:{api.server_address[1]}/bot",
+        "BOT_MODE": "webhook",
+        "WEBHOOK_URL": f"http://127.0.0.1:{webhook_port}",
+        "WEBHOOK_LISTEN": "127.0.0.1",
+        "WEBHOOK_PORT": str(webhook_port),
+        "WEBHOOK_PATH": "telegram",
+        "WEBHOOK_SECRET_TOKEN": SECRET_TOKEN
+    })
+    bot = multiprocessing.get_context("spawn").Process(target=run_bot)
+    bot.start()
+    
+    try:
+        if not FakeBotAPI.webhook_set.wait(60):
+            sys.exit("The bot did not register its webhook")
+        time.sleep(0.5)
+        url = f"http://127.0.0.1:{webhook_port}/telegram"
+        
+        _, rejected = asyncio.run(post_updates(url, build_updates(1), 1, "wrong-secret"))
+        print(f"wrong secret token: HTTP {', '.join(str(status) for status in rejected)}")
+        
+        updates = build_updates(args.updates)
+        started = time.perf_counter()
+        posted, statuses = asyncio.run(post_updates(url, updates, args.concurrency, SECRET_TOKEN))
+        accepted = time.perf_counter() - started
+        print(f"{len(updates)} updates accepted in {accepted:.2f} s = {len(updates) / accepted:.0f} updates/s, HTTP {statuses}")
+        
+        while len(FakeBotAPI.replies) < len(updates) and time.perf_counter() - started < args.timeout:
+            time.sleep(0.05)
+        replies = {chat_id: at for chat_id, at in FakeBotAPI.replies.items() if chat_id in posted}
+        finished = max(replies.values()) - started if replies else 0.0
+        latencies = [(replies[chat_id] - posted[chat_id]) * 1000 for chat_id in replies]
+        print(
+            f"{len(replies)}/{len(updates)} commands answered in {finished:.2f} s = {len(replies) / finished:.0f} commands/s; "
+            f"reply latency p50 {percentile(latencies, 0.5):.0f} ms, p95 {percentile(latencies, 0.95):.0f} ms, "
+            f"p99 {percentile(latencies, 0.99):.0f} ms"
+        )
+    finally:
+        bot.terminate()
+        bot.join(10)
+        api.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -53,7 +53,16 @@ if [ -f "data/jobbot.db" ]; then
         echo "Database statistics:"
         echo "- Users: $(sqlite3 data/jobbot.db "SELECT COUNT(*) FROM users;")"
         echo "- Jobs: $(sqlite3 data/jobbot.db "SELECT COUNT(*) FROM jobs;")"
+        if [ -f "data/jobbot_archive.db" ]; then
+            echo "- Archived jobs: $(sqlite3 data/jobbot_archive.db "SELECT COUNT(*) FROM jobs_archive;")"
+        fi
         echo "- Categories: $(sqlite3 data/jobbot.db "SELECT COUNT(*) FROM categories;")"
+        echo "- Outbox pending: $(sqlite3 data/jobbot.db "SELECT COUNT(*) FROM outbox WHERE status = 'pending';")"
+        echo "- Outbox oldest pending: $(sqlite3 data/jobbot.db "SELECT COALESCE(MIN(created_at), '-') FROM outbox WHERE status = 'pending';")"
+        echo "- Outbox dead-lettered: $(sqlite3 data/jobbot.db "SELECT COUNT(*) FROM outbox WHERE status = 'dead';")"
+        echo "- Users deactivated after failed sends: $(sqlite3 data/jobbot.db "SELECT COUNT(*) FROM users WHERE is_active = 0 AND deactivated_reason = 'unreachable';")"
+        echo "- Users backing off: $(sqlite3 data/jobbot.db "SELECT COUNT(*) FROM users WHERE is_active = 1 AND backoff_until > datetime('now');")"
+        echo "- Delivery workers holding leases: $(sqlite3 data/jobbot.db "SELECT COUNT(DISTINCT worker_id) FROM delivery_leases WHERE expires_at > datetime('now');")"
     fi
 else
     echo "❌ Database file not found."
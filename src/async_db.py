@@ -0,0 +1,49 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config import DB_EXECUTOR_WORKERS
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class AsyncDatabaseManager:
+    """Non-blocking facade over DatabaseManager for use inside async handlers
+    
+    Every call is run on a dedicated, bounded thread pool so a slow SQLite
+    transaction never stalls the event loop. The pool size also caps how many
+    database connections the handlers can hold at once. Every DatabaseManager
+    method is available under the same name as a coroutine, e.g.
+    `await db.get_user_filters(telegram_id)`.
+    """
+    
+    def __init__(self, db_manager, max_workers=DB_EXECUTOR_WORKERS):
+        self.db_manager = db_manager
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+    
+    async def run(self, function, *args, **kwargs):
+        """Run a blocking function on the executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+    
+    def __getattr__(self, name):
+        """Expose every DatabaseManager method as a coroutine that runs it on the executor"""
+        if name in ('db_manager', 'executor'):
+            raise AttributeError(name)
+        method = getattr(self.db_manager, name)
+        if not callable(method):
+            return method
+        
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+        return call
+    
+    def shutdown(self):
+        """Stop the executor, waiting for in-flight database calls"""
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,177 @@
+import argparse
+import glob
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from sqlalchemy.engine import make_url
+
+from src.config import (
+    DATABASE_URL, BACKUP_DIR, BACKUP_KEEP, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP, BACKUP_MAX_RESTARTS,
+    BACKUP_COMPRESS
+)
+from src.models import ARCHIVE_DB_PATH
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class BackupError(Exception):
+    """Raised when a backup cannot be taken or fails verification"""
+
+def sqlite_database_path():
+    """Path of the SQLite database file, or None for other databases"""
+    url = make_url(DATABASE_URL)
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        return None
+    return url.database
+
+class BackupManager:
+    """Takes online backups of the SQLite databases"""
+    
+    def __init__(self, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP, pages_per_step=BACKUP_PAGES_PER_STEP,
+                 step_sleep=BACKUP_STEP_SLEEP, max_restarts=BACKUP_MAX_RESTARTS, compress=BACKUP_COMPRESS):
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.max_restarts = max_restarts
+        self.compress = compress
+    
+    def copy_database(self, source_path, target_path):
+        """Copy a live database: in one step in WAL mode, in throttled steps otherwise
+        
+        SQLite restarts a stepped backup whenever another connection writes to the
+        source, so under steady writes it may never finish. A WAL read snapshot does
+        not block writers, so WAL databases are copied in a single step; others are
+        copied step by step and the backup fails after max_restarts restarts.
+        """
+        restarts = 0
+        last_remaining = None
+        
+        def throttle(status, remaining, total):
+            # Called after every step; sleeping here releases the source's read lock
+            # so the scraper and handlers can write between steps
+            nonlocal restarts, last_remaining
+            if last_remaining is not None and remaining >= last_remaining:
+                restarts += 1
+                if restarts > self.max_restarts:
+                    raise BackupError(f"Backup of {source_path} restarted {restarts} times by concurrent writes")
+            last_remaining = remaining
+            if remaining:
+                time.sleep(self.step_sleep)
+        
+        source = sqlite3.connect(source_path, timeout=30)
+        target = sqlite3.connect(target_path)
+        
+        try:
+            if source.execute("PRAGMA journal_mode").fetchone()[0] == 'wal':
+                source.backup(target)
+            else:
+                source.backup(target, pages=self.pages_per_step, progress=throttle)
+            
+            # A copy of a WAL database is itself in WAL mode; make it a standalone file
+            target.execute("PRAGMA journal_mode=DELETE")
+            
+            result = target.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != 'ok':
+                raise BackupError(f"Integrity check failed for {target_path}: {result}")
+        finally:
+            target.close()
+            source.close()
+    
+    def compress_file(self, path):
+        """Gzip a file in place, returning the compressed path"""
+        compressed_path = f"{path}.gz"
+        with open(path, 'rb') as source, gzip.open(compressed_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(path)
+        return compressed_path
+    
+    def rotate(self, prefix):
+        """Delete all but the newest backups with the given prefix"""
+        backups = sorted(
+            glob.glob(os.path.join(self.backup_dir, f"{prefix}_[0-9]*.db*")),
+            key=os.path.getmtime,
+            reverse=True
+        )
+        for old_backup in backups[self.keep:]:
+            os.remove(old_backup)
+            logger.info(f"Removed old backup {old_backup}")
+    
+    def backup_file(self, source_path, timestamp):
+        """Back up one database file, returning the backup path"""
+        prefix = os.path.splitext(os.path.basename(source_path))[0]
+        target_path = os.path.join(self.backup_dir, f"{prefix}_{timestamp}.db")
+        partial_path = f"{target_path}.partial"
+        
+        started = time.monotonic()
+        try:
+            self.copy_database(source_path, partial_path)
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        os.replace(partial_path, target_path)
+        
+        if self.compress:
+            target_path = self.compress_file(target_path)
+        
+        self.rotate(prefix)
+        logger.info(
+            f"Backed up {source_path} to {target_path} "
+            f"({os.path.getsize(target_path) / 1024:.0f} KiB in {time.monotonic() - started:.1f}s)"
+        )
+        return target_path
+    
+    def run(self):
+        """Back up the main database and the job archive, returning the backup paths"""
+        database_path = sqlite_database_path()
+        if not database_path:
+            logger.warning("Online backups are only supported for SQLite databases")
+            return []
+        
+        os.makedirs(self.backup_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        backups = []
+        
+        for source_path in (database_path, ARCHIVE_DB_PATH):
+            if not source_path or not os.path.exists(source_path):
+                continue
+            try:
+                backups.append(self.backup_file(source_path, timestamp))
+            except Exception as e:
+                logger.error(f"Error backing up {source_path}: {e}")
+        
+        return backups
+
+def main():
+    """Take a backup from the command line"""
+    parser = argparse.ArgumentParser(description="Take an online backup of the job bot database")
+    parser.add_argument("--dir", default=BACKUP_DIR, help="directory to write backups to")
+    parser.add_argument("--keep", type=int, default=BACKUP_KEEP, help="number of backups to keep")
+    parser.add_argument("--pages-per-step", type=int, default=BACKUP_PAGES_PER_STEP)
+    parser.add_argument("--step-sleep", type=float, default=BACKUP_STEP_SLEEP)
+    parser.add_argument("--max-restarts", type=int, default=BACKUP_MAX_RESTARTS)
+    parser.add_argument("--no-compress", action="store_true", help="leave the backup uncompressed")
+    args = parser.parse_args()
+    
+    manager = BackupManager(
+        backup_dir=args.dir,
+        keep=args.keep,
+        pages_per_step=args.pages_per_step,
+        step_sleep=args.step_sleep,
+        max_restarts=args.max_restarts,
+        compress=BACKUP_COMPRESS and not args.no_compress
+    )
+    if not manager.run():
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,18 @@ from telegram.ext import (
 )
 
 from src.db_manager import DatabaseManager
-from src.config import TELEGRAM_BOT_TOKEN
+from src.async_db import AsyncDatabaseManager
+from src.loop_monitor import EventLoopLagMonitor
+from src.dispatcher import Delivery
+from src.digest import Digest, MAX_DIGEST_INTERVAL_HOURS, MAX_DIGEST_SIZE, build_digests, digest_due
+from src.delivery import JobSender, OutboxDrainer
+from src.latency import alert_latency
+from src.rendering import JOB_EMOJIS, MOTIVATIONAL_MESSAGES, JobMessageRenderer
+from src.filter_expr import FilterExpressionError, FILTER_FIELDS, parse_filter_expression
+from src.config import (
+    TELEGRAM_BOT_TOKEN, TELEGRAM_API_BASE_URL, DELIVERY_MODE, BOT_MODE,
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET_TOKEN
+)
 
 # Set up logging
 logging.basicConfig(
@@ -24,39 +35,53 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Conversation states
-CHOOSING_FILTER_TYPE, ADDING_CATEGORY, ADDING_KEYWORD, REMOVING_FILTER = range(4)
+CHOOSING_FILTER_TYPE, ADDING_CATEGORY, ADDING_KEYWORD, REMOVING_FILTER, ADDING_EXPRESSION = range(5)
 
 # Callback data
 CATEGORY_FILTER = "category_filter"
 KEYWORD_FILTER = "keyword_filter"
+EXPRESSION_FILTER = "expression_filter"
 REMOVE_FILTER = "remove_filter"
 CANCEL = "cancel"
 
-# Fun job-related emojis
-JOB_EMOJIS = ["💼", "👔", "🏢", "💻", "📊", "📈", "🔍", "🚀", "💡", "🌟", "✨", "🎯", "🏆"]
-
-# Fun motivational messages
-MOTIVATIONAL_MESSAGES = [
-    "Your dream job is just around the corner! 🌈",
-    "Success is loading... ⌛",
-    "You're going to crush that interview! 💪",
-    "Your skills are in high demand! 📈",
-    "The perfect job is searching for YOU! 🔍",
-    "Your career journey is about to level up! 🚀",
-    "Exciting opportunities await! ✨",
-    "Your professional adventure continues! 🌟",
-    "New job, new possibilities! 🎉",
-    "Your talent deserves recognition! 🏆"
-]
-
 class JobBot:
     """Telegram bot for job notifications"""
     
     def __init__(self):
         self.db_manager = DatabaseManager()
-        self.application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        self.db = AsyncDatabaseManager(self.db_manager)
+        self.loop_monitor = EventLoopLagMonitor()
+        # Shared by every send, so each job is rendered once however many users receive it
+        self.renderer = JobMessageRenderer()
+        self.application = (
+            Application.builder()
+            .token(TELEGRAM_BOT_TOKEN)
+            .base_url(TELEGRAM_API_BASE_URL)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
+        self.sender = JobSender(self.application.bot, self.renderer)
+        self.outbox = OutboxDrainer(self.db, self.sender.send)
+        self._startup_callbacks = []
         self._setup_handlers()
     
+    def on_startup(self, callback):
+        """Call `callback(application)` once the application's event loop is running"""
+        self._startup_callbacks.append(callback)
+    
+    async def _post_init(self, application):
+        """Start background monitoring and run the startup callbacks once the event loop is running"""
+        self.loop_monitor.start()
+        for callback in self._startup_callbacks:
+            callback(application)
+    
+    async def _post_shutdown(self, application):
+        """Stop background monitoring and release the database executor"""
+        await self.loop_monitor.stop()
+        self.loop_monitor.log_report()
+        self.db.shutdown()
+    
     def _setup_handlers(self):
         """Set up all command and conversation handlers"""
         # Command handlers
@@ -66,6 +91,7 @@ class JobBot:
         self.application.add_handler(CommandHandler("clearfilters", self.clear_filters_command))
         self.application.add_handler(CommandHandler("pause", self.pause_command))
         self.application.add_handler(CommandHandler("resume", self.resume_command))
+        self.application.add_handler(CommandHandler("digest", self.digest_command))
         
         # Filter conversation handler
         filter_conv_handler = ConversationHandler(
@@ -74,6 +100,7 @@ class JobBot:
                 CHOOSING_FILTER_TYPE: [
                     CallbackQueryHandler(self.category_filter_selected, pattern=f"^{CATEGORY_FILTER}$"),
                     CallbackQueryHandler(self.keyword_filter_selected, pattern=f"^{KEYWORD_FILTER}$"),
+                    CallbackQueryHandler(self.expression_filter_selected, pattern=f"^{EXPRESSION_FILTER}$"),
                     CallbackQueryHandler(self.remove_filter_selected, pattern=f"^{REMOVE_FILTER}$"),
                     CallbackQueryHandler(self.cancel_filter, pattern=f"^{CANCEL}$"),
                 ],
@@ -85,8 +112,12 @@ class JobBot:
                     MessageHandler(filters.TEXT & ~filters.COMMAND, self.add_keyword_filter),
                     CommandHandler("cancel", self.cancel_filter),
                 ],
+                ADDING_EXPRESSION: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.add_expression_filter),
+                    CommandHandler("cancel", self.cancel_filter),
+                ],
                 REMOVING_FILTER: [
-                    CallbackQueryHandler(self.remove_filter, pattern=r"^remove_category_(.+)$|^remove_keyword_(.+)$"),
+                    CallbackQueryHandler(self.remove_filter, pattern=r"^remove_category_(.+)$|^remove_keyword_(.+)$|^remove_expression$"),
                     CallbackQueryHandler(self.cancel_filter, pattern=f"^{CANCEL}$"),
                 ],
             },
@@ -102,7 +133,7 @@ class JobBot:
         user = update.effective_user
         
         # Register user in database
-        self.db_manager.register_user(
+        await self.db.register_user(
             telegram_id=user.id,
             username=user.username,
             first_name=user.first_name,
@@ -138,7 +169,8 @@ class JobBot:
             f"👀 /showfilters - See what job filters you've set up\n"
             f"🧹 /clearfilters - Start fresh with no filters\n"
             f"⏸️ /pause - Need a break? Pause notifications\n"
-            f"▶️ /resume - Ready for more? Resume notifications\n\n"
+            f"▶️ /resume - Ready for more? Resume notifications\n"
+            f"📬 /digest - Get your jobs bundled into digests instead of one message each\n\n"
             f"✨ *Pro Tip:* The more specific your filters, the better matches you'll get!\n\n"
             f"{random.choice(MOTIVATIONAL_MESSAGES)}"
         , parse_mode="Markdown")
@@ -150,6 +182,9 @@ class JobBot:
                 InlineKeyboardButton("🏷️ Filter by Category", callback_data=CATEGORY_FILTER),
                 InlineKeyboardButton("🔤 Filter by Keyword", callback_data=KEYWORD_FILTER),
             ],
+            [
+                InlineKeyboardButton("🧮 Filter Expression", callback_data=EXPRESSION_FILTER),
+            ],
             [
                 InlineKeyboardButton("🗑️ Remove Filters", callback_data=REMOVE_FILTER),
                 InlineKeyboardButton("❌ Cancel", callback_data=CANCEL),
@@ -189,20 +224,38 @@ class JobBot:
             "🔤 *Keyword Filter* 🔤\n\n"
             "What keyword should I look for in job titles?\n\n"
             "Examples: Developer, Manager, Designer, etc.\n\n"
+            "Start it with ~ (e.g. ~Develper) to also match titles with typos or spelling variants.\n\n"
             "Type the keyword or /cancel to abort."
         , parse_mode="Markdown")
         
         return ADDING_KEYWORD
     
+    async def expression_filter_selected(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle filter expression selection"""
+        query = update.callback_query
+        await query.answer()
+        
+        await query.edit_message_text(
+            "🧮 *Filter Expression* 🧮\n\n"
+            "Combine words with AND, OR, NOT and parentheses. Plain words are looked up in the "
+            "title, company and location; prefix a word with a field to search only there.\n\n"
+            f"Fields: {', '.join(FILTER_FIELDS)}\n\n"
+            "Example: `python AND (Bakı OR remote) NOT senior source:glorri`\n\n"
+            "The expression applies on top of your category and keyword filters and replaces any earlier one.\n\n"
+            "Type the expression or /cancel to abort."
+        , parse_mode="Markdown")
+        
+        return ADDING_EXPRESSION
+    
     async def remove_filter_selected(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle remove filter selection"""
         query = update.callback_query
         await query.answer()
         
         user_id = update.effective_user.id
-        filters = self.db_manager.get_user_filters(user_id)
+        filters = await self.db.get_user_filters(user_id)
         
-        if not filters or (not filters['categories'] and not filters['keywords']):
+        if not filters or (not filters['categories'] and not filters['keywords'] and not filters['expression']):
             await query.edit_message_text(
                 "🤷‍♂️ You don't have any filters to remove! 🤷‍♀️\n\n"
                 "Use /filter to add some first."
@@ -221,6 +274,11 @@ class JobBot:
                 InlineKeyboardButton(f"🔤 Keyword: {keyword}", callback_data=f"remove_keyword_{keyword}")
             ])
         
+        if filters.get('expression'):
+            keyboard.append([
+                InlineKeyboardButton(f"🧮 Expression: {filters['expression']}", callback_data="remove_expression")
+            ])
+        
         keyboard.append([InlineKeyboardButton("❌ Cancel", callback_data=CANCEL)])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -243,12 +301,16 @@ class JobBot:
         
         if callback_data.startswith("remove_category_"):
             category = callback_data.replace("remove_category_", "")
-            success = self.db_manager.remove_category_filter(user_id, category)
+            success = await self.db.remove_category_filter(user_id, category)
             filter_type = "category"
             filter_value = category
+        elif callback_data == "remove_expression":
+            success = await self.db.set_filter_expression(user_id, None)
+            filter_type = "expression"
+            filter_value = "expression"
         else:
             keyword = callback_data.replace("remove_keyword_", "")
-            success = self.db_manager.remove_keyword_filter(user_id, keyword)
+            success = await self.db.remove_keyword_filter(user_id, keyword)
             filter_type = "keyword"
             filter_value = keyword
         
@@ -283,7 +345,7 @@ class JobBot:
         user_id = update.effective_user.id
         category_name = update.message.text.strip()
         
-        success = self.db_manager.add_category_filter(user_id, category_name)
+        success = await self.db.add_category_filter(user_id, category_name)
         
         if success:
             await update.message.reply_text(
@@ -306,7 +368,14 @@ class JobBot:
         user_id = update.effective_user.id
         keyword = update.message.text.strip()
         
-        success = self.db_manager.add_keyword_filter(user_id, keyword)
+        # A leading "~" asks for typo-tolerant matching of this keyword
+        fuzzy = keyword.startswith("~")
+        if fuzzy:
+            keyword = keyword.lstrip("~").strip()
+        
+        success = await self.db.add_keyword_filter(user_id, keyword, fuzzy)
+        if fuzzy:
+            keyword = f"~{keyword}"
         
         if success:
             await update.message.reply_text(
@@ -324,12 +393,43 @@ class JobBot:
         
         return ConversationHandler.END
     
+    async def add_expression_filter(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Set the filter expression, asking again if it does not parse"""
+        user_id = update.effective_user.id
+        expression = update.message.text.strip()
+        
+        try:
+            parse_filter_expression(expression)
+        except FilterExpressionError as e:
+            await update.message.reply_text(
+                f"🤔 I couldn't read that expression: {e}\n\n"
+                f"Please try again or /cancel to abort."
+            )
+            return ADDING_EXPRESSION
+        
+        success = await self.db.set_filter_expression(user_id, expression)
+        
+        if success:
+            await update.message.reply_text(
+                f"🧮 *Filter expression set:* `{expression}`\n\n"
+                f"Only jobs matching it will reach you from now on.\n\n"
+                f"{random.choice(MOTIVATIONAL_MESSAGES)}",
+                parse_mode="Markdown"
+            )
+        else:
+            await update.message.reply_text(
+                "😕 Oops! Failed to save your filter expression.\n\n"
+                "Please try again later or contact support."
+            )
+        
+        return ConversationHandler.END
+    
     async def show_filters_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /showfilters command"""
         user_id = update.effective_user.id
-        filters = self.db_manager.get_user_filters(user_id)
+        filters = await self.db.get_user_filters(user_id)
         
-        if not filters or (not filters['categories'] and not filters['keywords']):
+        if not filters or (not filters['categories'] and not filters['keywords'] and not filters['expression']):
             await update.message.reply_text(
                 "🔎 *Your Filter Settings* 🔍\n\n"
                 "You don't have any filters set up yet!\n\n"
@@ -351,6 +451,14 @@ class JobBot:
             for keyword in filters['keywords']:
                 filter_text += f"• 🔤 {keyword}\n"
         
+        if filters['expression']:
+            if filters['keywords']:
+                filter_text += "\n"
+            filter_text += "*Filter expression:*\n"
+            # Expressions saved before backticks were rejected would end the code span early
+            expression = filters['expression'].replace("`", "'")
+            filter_text += f"🧮 `{expression}`\n"
+        
         filter_text += f"\n{random.choice(MOTIVATIONAL_MESSAGES)}"
         
         await update.message.reply_text(filter_text, parse_mode="Markdown")
@@ -358,7 +466,7 @@ class JobBot:
     async def clear_filters_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /clearfilters command"""
         user_id = update.effective_user.id
-        success = self.db_manager.clear_user_filters(user_id)
+        success = await self.db.clear_user_filters(user_id)
         
         if success:
             await update.message.reply_text(
@@ -377,7 +485,7 @@ class JobBot:
     async def pause_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /pause command"""
         user_id = update.effective_user.id
-        success = self.db_manager.set_user_active(user_id, False)
+        success = await self.db.set_user_active(user_id, False)
         
         if success:
             await update.message.reply_text(
@@ -397,7 +505,7 @@ class JobBot:
     async def resume_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /resume command"""
         user_id = update.effective_user.id
-        success = self.db_manager.set_user_active(user_id, True)
+        success = await self.db.set_user_active(user_id, True)
         
         if success:
             await update.message.reply_text(
@@ -414,58 +522,162 @@ class JobBot:
                 parse_mode="Markdown"
             )
     
-    async def send_job_notification(self, user_id, job):
-        """Send a job notification to a user"""
-        try:
-            # Pick a random emoji for the notification
-            emoji = random.choice(JOB_EMOJIS)
-            
-            # Pick a random motivational message
-            motivation = random.choice(MOTIVATIONAL_MESSAGES)
+    async def digest_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /digest command: /digest <jobs per message> [hours between digests] or /digest off"""
+        user_id = update.effective_user.id
+        args = context.args or []
+        usage = (
+            "📬 *Digest mode* 📬\n\n"
+            "Bundle your new jobs into a few compact messages instead of one message per job.\n\n"
+            f"• /digest 10 - up to 10 jobs per message, every time I check for jobs\n"
+            f"• /digest 20 6 - up to 20 jobs per message, at most one digest every 6 hours\n"
+            f"• /digest off - back to one message per job\n\n"
+            f"Digests hold 1-{MAX_DIGEST_SIZE} jobs per message and can be up to {MAX_DIGEST_INTERVAL_HOURS} hours apart."
+        )
+        
+        if not args:
+            settings = await self.db.get_digest(user_id)
+            if settings and settings.size:
+                every = f"every {settings.interval_hours} hours" if settings.interval_hours else "every check"
+                current = f"Currently: up to {settings.size} jobs per message, {every}."
+            else:
+                current = "Currently: off, one message per job."
+            await update.message.reply_text(f"{usage}\n\n{current}", parse_mode="Markdown")
+            return
+        
+        if args[0].lower() == "off":
+            size, interval_hours = 0, 0
+        else:
+            try:
+                size = int(args[0])
+                interval_hours = int(args[1]) if len(args) > 1 else 0
+            except ValueError:
+                size, interval_hours = -1, -1
             
-            job_text = (
-                f"{emoji} *Exciting Job Alert!* {emoji}\n\n"
-                f"*{job.title}*\n\n"
-                f"*🏢 Company:* {job.company or 'Not specified'}\n"
-                f"*📍 Location:* {job.location or 'Not specified'}\n"
-                f"*🏷️ Category:* {job.category.name if job.category else 'Not specified'}\n"
-                f"*🔍 Source:* {job.source}\n\n"
-                f"[👉 View Full Job Details 👈]({job.url})\n\n"
-                f"{motivation}"
+            # Held-back jobs must still be inside the notification window when the digest goes out
+            if not 1 <= size <= MAX_DIGEST_SIZE or not 0 <= interval_hours <= MAX_DIGEST_INTERVAL_HOURS:
+                await update.message.reply_text(usage, parse_mode="Markdown")
+                return
+        
+        success = await self.db.set_digest(user_id, size, interval_hours)
+        
+        if not success:
+            await update.message.reply_text(
+                "😕 *Oops!* Something went wrong while saving your digest settings.\n\n"
+                "Please try again later or contact support if the problem persists.",
+                parse_mode="Markdown"
             )
-            
-            await self.application.bot.send_message(
-                chat_id=user_id,
-                text=job_text,
-                parse_mode="Markdown",
-                disable_web_page_preview=False
+        elif size:
+            every = f"at most every {interval_hours} hours" if interval_hours else "every time I check for jobs"
+            await update.message.reply_text(
+                f"📬 *Digest mode on!* 📬\n\n"
+                f"You'll get up to {size} jobs per message, {every}.",
+                parse_mode="Markdown"
+            )
+        else:
+            await update.message.reply_text(
+                "📨 *Digest mode off* 📨\n\n"
+                "Every new job will arrive as its own message again.",
+                parse_mode="Markdown"
             )
-            
-            logger.info(f"Sent job notification to user {user_id}: {job.title}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error sending job notification to user {user_id}: {e}")
-            return False
     
-    async def notify_users_about_new_jobs(self, jobs, since_timestamp=None):
-        """Notify users about new jobs matching their filters"""
-        active_users = self.db_manager.get_active_users()
+    async def notify_users_about_new_jobs(self):
+        """Notify users about matching jobs they have not received yet"""
+        # Planning runs on the database executor, so matching a large cycle never blocks the event loop
+        matches = await self.db.plan_notifications()
+        matched_at = datetime.utcnow()
+        
+        digest_settings = await self.db.get_digest_settings([subscription.user_id for subscription in matches])
+        now = datetime.utcnow()
+        
+        deliveries = []
+        digest_jobs = held_jobs = 0
+        for subscription, user_jobs in matches.items():
+            settings = digest_settings.get(subscription.user_id)
+            if settings is None:
+                deliveries.extend(Delivery(subscription.telegram_id, subscription.user_id, job) for job in user_jobs)
+            elif digest_due(settings, now):
+                digest_jobs += len(user_jobs)
+                deliveries.extend(
+                    Delivery(subscription.telegram_id, subscription.user_id, digest)
+                    for digest in build_digests(user_jobs, settings.size, line=self.renderer.digest_line)
+                )
+            else:
+                # Not due yet: the jobs stay out of the ledger and are matched again next cycle
+                held_jobs += len(user_jobs)
+        
+        if digest_jobs or held_jobs:
+            digest_messages = sum(isinstance(delivery.payload, Digest) for delivery in deliveries)
+            logger.info(
+                f"Digests: {digest_jobs} jobs in {digest_messages} messages "
+                f"({digest_jobs - digest_messages} API calls saved), {held_jobs} jobs held for later digests"
+            )
         
-        for user in active_users:
-            user_jobs = self.db_manager.get_new_jobs_for_user(user.telegram_id, since_timestamp)
-            
-            for job in user_jobs:
-                await self.send_job_notification(user.telegram_id, job)
+        # Queue everything durably first, then drain the outbox; anything a crash or a
+        # failed send leaves behind is picked up again by the next cycle
+        queued = await self.db.enqueue_notifications(deliveries, matched_at)
+        logger.info(f"Queued {queued} notifications in the outbox")
+        if DELIVERY_MODE == "workers":
+            # Delivery worker processes drain the outbox (python -m src.delivery_worker)
+            await self.log_delivery_stats()
+        else:
+            await self.deliver_outbox()
+    
+    async def deliver_outbox(self):
+        """Send due outbox entries in batches until none are left"""
+        await self.outbox.drain()
+        await self.log_delivery_stats()
+    
+    async def log_delivery_stats(self):
+        """Log outbox depth and age, how often rendered messages came from the cache and alert latency"""
+        stats = await self.db.get_outbox_stats()
+        logger.info(
+            f"Outbox: {stats['pending']} pending ({stats['due']} due, oldest {stats['oldest_pending_age'] / 60:.1f} min), "
+            f"{stats['dead']} dead-lettered"
+        )
+        
+        render_stats = self.renderer.stats()
+        logger.info(
+            f"Message rendering: {render_stats['renders']} renders so far, "
+            f"{render_stats['hit_rate']:.0%} served from cache"
+        )
+        
+        # Percentiles for the alerts this process sent since the last cycle
+        alert_latency.log_report()
     
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle errors in the bot"""
         logger.error(f"Update {update} caused error: {context.error}")
     
     def run(self):
-        """Run the bot"""
+        """Run the bot, receiving updates by long polling or by webhook depending on BOT_MODE"""
+        if BOT_MODE == "webhook":
+            self.run_webhook()
+            return
+        
         logger.info("Starting bot...")
         self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+    
+    def run_webhook(self):
+        """Serve updates from an embedded HTTP server and register its URL with Telegram
+        
+        Requests without the configured secret token are rejected with 403, so
+        only Telegram can post updates even though the port is public.
+        """
+        if not WEBHOOK_URL or not WEBHOOK_SECRET_TOKEN:
+            raise ValueError("Webhook mode needs WEBHOOK_URL and WEBHOOK_SECRET_TOKEN to be set")
+        
+        url_path = WEBHOOK_PATH.strip("/")
+        webhook_url = f"{WEBHOOK_URL.rstrip('/')}/{url_path}"
+        logger.info(f"Starting bot with a webhook on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{url_path} for {webhook_url}")
+        self.application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=url_path,
+            webhook_url=webhook_url,
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            allowed_updates=Update.ALL_TYPES
+        )
 
 
 def get_bot():
@@ -7,6 +7,21 @@ load_dotenv()
 # Telegram Bot Token
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
+# Bot API endpoint; point it at a local Bot API server (or a fake one in tests) if needed
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org/bot")
+
+# How the bot receives updates: "polling" (long polling) or "webhook" (Telegram posts updates
+# to an embedded HTTP server; put it behind a TLS-terminating reverse proxy or load balancer)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+
+# Webhook mode: public URL Telegram posts to (the path is appended), the local address and
+# port to listen on, and the secret Telegram sends in X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+
 # Database settings
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///data/jobbot.db")
 
@@ -53,4 +68,98 @@ JOB_WEBSITES = {
 SCRAPING_INTERVAL = int(os.getenv("SCRAPING_INTERVAL", "30"))
 
 # Maximum number of pages to scrape per site
-MAX_PAGES_PER_SITE = int(os.getenv("MAX_PAGES_PER_SITE", "3")) 
\ No newline at end of file
+MAX_PAGES_PER_SITE = int(os.getenv("MAX_PAGES_PER_SITE", "3"))
+
+# How far back (in hours) to look for matching jobs that have not been sent yet
+NOTIFICATION_LOOKBACK_HOURS = int(os.getenv("NOTIFICATION_LOOKBACK_HOURS", "24"))
+
+# Maximum number of threads running blocking database calls for the bot handlers
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+
+# Maximum number of sites scraped at once; each scraper runs on this thread pool
+SCRAPER_EXECUTOR_WORKERS = int(os.getenv("SCRAPER_EXECUTOR_WORKERS", "4"))
+
+# Threads for archiving, backups and index checks; one keeps them from competing with each other
+MAINTENANCE_EXECUTOR_WORKERS = int(os.getenv("MAINTENANCE_EXECUTOR_WORKERS", "1"))
+
+# How often (in seconds) the event loop lag monitor samples and reports
+LOOP_LAG_SAMPLE_INTERVAL = float(os.getenv("LOOP_LAG_SAMPLE_INTERVAL", "0.5"))
+LOOP_LAG_REPORT_INTERVAL = int(os.getenv("LOOP_LAG_REPORT_INTERVAL", "300"))
+
+# Job retention: jobs older than this many days are moved to the archive (0 disables)
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "90"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+RETENTION_INTERVAL_HOURS = int(os.getenv("RETENTION_INTERVAL_HOURS", "24"))
+
+# SQLite file for archived jobs (defaults to <database>_archive.db next to the main database)
+ARCHIVE_DATABASE_PATH = os.getenv("ARCHIVE_DATABASE_PATH")
+
+# Maximum number of users whose filters are kept in the in-process cache (0 disables it)
+USER_FILTER_CACHE_SIZE = int(os.getenv("USER_FILTER_CACHE_SIZE", "10000"))
+
+# Online database backups (SQLite backup API): WAL databases are copied in one step, others in
+# small page steps, given up after BACKUP_MAX_RESTARTS restarts caused by concurrent writes
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "10"))
+BACKUP_INTERVAL_HOURS = int(os.getenv("BACKUP_INTERVAL_HOURS", "24"))
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", "0.05"))
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "20"))
+BACKUP_COMPRESS = os.getenv("BACKUP_COMPRESS", "true").lower() in ("1", "true", "yes")
+
+# Per-method query timing and slow-query log (off by default; no overhead when disabled)
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE", "data/slow_queries.log")
+
+# How often (in minutes) the in-memory subscription index is checked against the database
+SUBSCRIPTION_CHECK_INTERVAL = int(os.getenv("SUBSCRIPTION_CHECK_INTERVAL", "60"))
+
+# Typo-tolerant keyword filters (entered as "~keyword"): minimum trigram similarity,
+# candidates scored per title word (bounds the work per job) and cached title words
+FUZZY_MATCH_THRESHOLD = float(os.getenv("FUZZY_MATCH_THRESHOLD", "0.45"))
+FUZZY_MAX_CANDIDATES = int(os.getenv("FUZZY_MAX_CANDIDATES", "50"))
+FUZZY_CACHE_SIZE = int(os.getenv("FUZZY_CACHE_SIZE", "50000"))
+
+# Per-user fuzzy matching (get_new_jobs_for_user) keeps a few small matchers instead, one
+# per distinct set of fuzzy keywords, so at most MATCHERS x WORD_CACHE title words are cached
+FUZZY_USER_MATCHERS = int(os.getenv("FUZZY_USER_MATCHERS", "256"))
+FUZZY_USER_WORD_CACHE_SIZE = int(os.getenv("FUZZY_USER_WORD_CACHE_SIZE", "1000"))
+
+# Notification dispatcher: concurrent senders, Telegram's global and per-chat limits
+# (messages per second / seconds between messages to one chat) and RetryAfter retries
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", "8"))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1.0"))
+DISPATCH_MAX_RETRIES = int(os.getenv("DISPATCH_MAX_RETRIES", "5"))
+DISPATCH_REPORT_INTERVAL = int(os.getenv("DISPATCH_REPORT_INTERVAL", "10"))
+
+# Notification outbox: entries sent per batch, attempts before dead-lettering and
+# exponential backoff between attempts (seconds)
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_SECONDS = int(os.getenv("OUTBOX_BACKOFF_SECONDS", "30"))
+OUTBOX_MAX_BACKOFF_SECONDS = int(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "3600"))
+
+# How long a sender keeps the outbox entries it loaded before others may take them over
+# (seconds); must outlast sending one batch at the global rate
+OUTBOX_CLAIM_SECONDS = int(os.getenv("OUTBOX_CLAIM_SECONDS", "300"))
+
+# Rendered job messages kept in memory (by job ID), shared by every send in a cycle
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "5000"))
+
+# Delivery mode: "inline" drains the outbox in the bot process after every cycle;
+# "workers" leaves it to separate delivery worker processes (python -m src.delivery_worker)
+DELIVERY_MODE = os.getenv("DELIVERY_MODE", "inline").lower()
+
+# Delivery workers split the outbox into hash partitions of telegram_id and own them
+# through database leases, renewed by a heartbeat; a dead worker's partitions are
+# taken over once its leases expire (seconds)
+DELIVERY_PARTITIONS = int(os.getenv("DELIVERY_PARTITIONS", "16"))
+DELIVERY_LEASE_SECONDS = int(os.getenv("DELIVERY_LEASE_SECONDS", "30"))
+DELIVERY_HEARTBEAT_SECONDS = int(os.getenv("DELIVERY_HEARTBEAT_SECONDS", "10"))
+DELIVERY_POLL_SECONDS = float(os.getenv("DELIVERY_POLL_SECONDS", "2"))
+
+# Minutes between alert latency reports (percentiles per stage and per source) from delivery workers;
+# the bot logs one after every cycle
+LATENCY_REPORT_INTERVAL = int(os.getenv("LATENCY_REPORT_INTERVAL", "15"))
@@ -1,7 +1,29 @@
 import logging
-from datetime import datetime
-from sqlalchemy import func
-from src.models import Job, Category, User, Keyword, get_session, init_db
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+import threading
+from typing import NamedTuple
+from sqlalchemy import func, literal_column, or_, select, exists, null, text, union_all, update
+from src.models import (
+    Job, ArchivedJob, Category, User, Keyword, SentNotification, OutboxEntry, DeliveryLease, WorkerHeartbeat, user_category,
+    user_keyword, get_session, init_db, fts_enabled, JOBS_FTS_TABLE, FTS_MIN_TERM_LENGTH
+)
+from src.cache import LRUCache
+from src.text import normalize_text
+from src.matching import SubscriptionIndex, subscription_key, job_matches_subscription
+from src.fuzzy import FuzzyKeywordMatcher
+from src.filter_expr import FilterExpressionError, compile_filter_expression
+from src.digest import Digest, DigestSettings
+from src.dispatcher import Delivery
+from src.outbox import backoff_delay, decode_job_ids, encode_job_ids
+from src.latency import AlertStamps
+from src.instrumentation import instrument_methods
+from src.config import (
+    USER_FILTER_CACHE_SIZE, NOTIFICATION_LOOKBACK_HOURS, FUZZY_USER_MATCHERS, FUZZY_USER_WORD_CACHE_SIZE, OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_CLAIM_SECONDS, DELIVERY_PARTITIONS
+)
 
 # Set up logging
 logging.basicConfig(
@@ -10,12 +32,163 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def notification_cutoff():
+    """Oldest scrape time a job can have and still be notified about"""
+    return datetime.utcnow() - timedelta(hours=NOTIFICATION_LOOKBACK_HOURS)
+
+def delivery_job_ids(delivery):
+    """IDs of the jobs a planned delivery covers"""
+    return delivery.payload.job_ids if isinstance(delivery.payload, Digest) else (delivery.payload.id,)
+
+def build_fts_query(keywords, column='title_normalized'):
+    """Build an FTS5 MATCH expression that is true if the column contains any of the keywords"""
+    phrases = ['"' + keyword.replace('"', '""') + '"' for keyword in keywords]
+    return f"{column} : ({' OR '.join(phrases)})"
+
+def keyword_filter_clause(keywords):
+    """SQL clause restricting jobs to titles containing any of the (normalized) keywords
+    
+    Same substring semantics as the subscription index, so both paths agree on what matches.
+    """
+    if not fts_enabled():
+        return or_(*[Job.title_normalized.contains(keyword, autoescape=True) for keyword in keywords])
+    
+    # Keywords too short for a trigram lookup are matched as plain substrings
+    indexed = [keyword for keyword in keywords if len(keyword) >= FTS_MIN_TERM_LENGTH]
+    clauses = [Job.title_normalized.contains(keyword, autoescape=True) for keyword in keywords if keyword not in indexed]
+    if indexed:
+        matching_ids = select(literal_column('rowid')).select_from(text(JOBS_FTS_TABLE)).where(
+            text(f"{JOBS_FTS_TABLE} MATCH :fts_match").bindparams(fts_match=build_fts_query(indexed))
+        )
+        clauses.append(Job.id.in_(matching_ids))
+    return or_(*clauses)
+
+class UserFilterSet(NamedTuple):
+    """Immutable snapshot of a user's filters, as stored in the filter cache"""
+    user_id: int
+    created_at: datetime
+    category_ids: tuple
+    categories: tuple
+    keywords: tuple
+    normalized_keywords: tuple
+    fuzzy_keywords: tuple
+    filter_expression: str
+
+class JobRecord(NamedTuple):
+    """Column-only view of a job for the notification path, safe to use after the session closes"""
+    id: int
+    title: str
+    title_normalized: str
+    company: str
+    location: str
+    url: str
+    source: str
+    category_id: int
+    category_name: str
+    scraped_date: datetime
+
+class Subscription(NamedTuple):
+    """An active user's filters, as loaded in bulk for one notification cycle"""
+    user_id: int
+    telegram_id: int
+    created_at: datetime
+    category_ids: frozenset
+    keywords: tuple
+    fuzzy_keywords: tuple = ()
+    filter_expression: str = None
+
+# Columns selected for JobRecord, in field order
+JOB_RECORD_COLUMNS = (
+    Job.id, Job.title, Job.title_normalized, Job.company, Job.location, Job.url, Job.source, Job.category_id, Category.name, Job.scraped_date
+)
+
+@instrument_methods
 class DatabaseManager:
     """Handles all database operations for the job bot"""
     
     def __init__(self):
         # Initialize the database if needed
         init_db()
+        
+        # Per-user filter sets keyed by telegram_id, invalidated by the filter write methods
+        self.filter_cache = LRUCache(USER_FILTER_CACHE_SIZE)
+        
+        # Fuzzy matchers keyed by a user's set of fuzzy keywords, so users sharing
+        # the same typo-tolerant filters also share the matcher's lookup cache
+        self.fuzzy_matchers = LRUCache(FUZZY_USER_MATCHERS)
+        
+        # Active subscriptions for the notification matcher, loaded on first use and then
+        # kept up to date by the write methods below
+        self.subscription_index = None
+        self._subscription_index_lock = threading.Lock()
+    
+    def _fuzzy_keyword_ids(self, session, user_id):
+        """IDs of the user's keywords that are matched fuzzily"""
+        return set(session.scalars(
+            select(user_keyword.c.keyword_id).where(user_keyword.c.user_id == user_id, user_keyword.c.fuzzy == True)
+        ))
+    
+    def _fuzzy_matcher(self, fuzzy_keywords):
+        """Shared FuzzyKeywordMatcher for a set of normalized fuzzy keywords"""
+        key = frozenset(fuzzy_keywords)
+        matcher = self.fuzzy_matchers.get(key)
+        if matcher is None:
+            matcher = FuzzyKeywordMatcher(key, cache_size=FUZZY_USER_WORD_CACHE_SIZE)
+            self.fuzzy_matchers.set(key, matcher)
+        return matcher
+    
+    def _sync_subscription(self, session, user):
+        """Apply a committed change to a user's filters or status to the subscription index"""
+        index = self.subscription_index
+        if index is None:
+            return
+        
+        if not user.is_active:
+            index.remove(user.id)
+            return
+        
+        fuzzy_ids = self._fuzzy_keyword_ids(session, user.id)
+        index.upsert(Subscription(
+            user_id=user.id,
+            telegram_id=user.telegram_id,
+            created_at=user.created_at,
+            category_ids=frozenset(category.id for category in user.categories),
+            keywords=tuple(keyword.normalized for keyword in user.keywords if keyword.id not in fuzzy_ids),
+            fuzzy_keywords=tuple(keyword.normalized for keyword in user.keywords if keyword.id in fuzzy_ids),
+            filter_expression=user.filter_expression
+        ))
+    
+    def _reset_delivery_health(self, user):
+        """Clear a user's failure count and backoff, e.g. when they come back"""
+        user.consecutive_failures = 0
+        user.backoff_until = None
+    
+    def _load_user_filters(self, session, telegram_id):
+        """Return the user's filter set from the cache, loading it on a miss (None if no such user)"""
+        filters = self.filter_cache.get(telegram_id)
+        if filters is not None:
+            return filters
+        
+        generation = self.filter_cache.generation
+        user = session.query(User).filter(User.telegram_id == telegram_id).first()
+        if not user:
+            return None
+        
+        categories = user.categories
+        fuzzy_ids = self._fuzzy_keyword_ids(session, user.id)
+        filters = UserFilterSet(
+            user_id=user.id,
+            created_at=user.created_at,
+            category_ids=tuple(category.id for category in categories),
+            categories=tuple(category.name for category in categories),
+            # Fuzzy filters are shown the way they are entered, with a leading "~"
+            keywords=tuple(f"~{keyword.word}" if keyword.id in fuzzy_ids else keyword.word for keyword in user.keywords),
+            normalized_keywords=tuple(keyword.normalized for keyword in user.keywords if keyword.id not in fuzzy_ids),
+            fuzzy_keywords=tuple(keyword.normalized for keyword in user.keywords if keyword.id in fuzzy_ids),
+            filter_expression=user.filter_expression
+        )
+        self.filter_cache.set(telegram_id, filters, generation)
+        return filters
     
     def add_jobs(self, jobs_data):
         """Add new jobs to the database, avoiding duplicates"""
@@ -24,17 +197,21 @@ class DatabaseManager:
         
         try:
             for job_data in jobs_data:
-                # Check if job already exists by URL or external ID
+                # Check if job already exists by URL or external ID, including archived jobs
                 existing_job = None
                 
-                if job_data.get('url'):
-                    existing_job = session.query(Job).filter(Job.url == job_data['url']).first()
-                
-                if not existing_job and job_data.get('external_id'):
-                    existing_job = session.query(Job).filter(
-                        Job.external_id == job_data['external_id'],
-                        Job.source == job_data['source']
-                    ).first()
+                for model in (Job, ArchivedJob):
+                    if job_data.get('url'):
+                        existing_job = session.query(model.id).filter(model.url == job_data['url']).first()
+                    
+                    if not existing_job and job_data.get('external_id'):
+                        existing_job = session.query(model.id).filter(
+                            model.external_id == job_data['external_id'],
+                            model.source == job_data['source']
+                        ).first()
+                    
+                    if existing_job:
+                        break
                 
                 if existing_job:
                     # Update existing job if needed
@@ -55,6 +232,7 @@ class DatabaseManager:
                 # Create new job
                 new_job = Job(
                     title=job_data['title'],
+                    title_normalized=normalize_text(job_data['title']),
                     company=job_data.get('company'),
                     location=job_data.get('location'),
                     description=job_data.get('description'),
@@ -62,7 +240,9 @@ class DatabaseManager:
                     source=job_data['source'],
                     external_id=job_data.get('external_id'),
                     posted_date=job_data.get('posted_date'),
-                    category_id=category.id if category else None
+                    category_id=category.id if category else None,
+                    fetched_at=job_data.get('fetched_at'),
+                    parsed_at=job_data.get('parsed_at')
                 )
                 
                 session.add(new_job)
@@ -80,45 +260,62 @@ class DatabaseManager:
             session.close()
     
     def get_new_jobs_for_user(self, user_id, since_timestamp=None):
-        """Get new jobs matching user's filters since the given timestamp"""
+        """Get matching jobs that have not been sent to the user yet
+        
+        Only jobs scraped after the user registered and within the notification
+        lookback window (or since the given timestamp, if later) are considered.
+        """
         session = get_session()
         
         try:
-            user = session.query(User).filter(User.telegram_id == user_id).first()
-            if not user:
+            filters = self._load_user_filters(session, user_id)
+            if filters is None:
                 logger.warning(f"User {user_id} not found")
                 return []
             
-            # Base query for jobs
-            query = session.query(Job)
+            # Base query for jobs, projected straight into lightweight records
+            query = session.query(*JOB_RECORD_COLUMNS).outerjoin(Category, Job.category_id == Category.id)
             
-            # Filter by timestamp if provided
+            # Only jobs inside the lookback window that were scraped after the user signed up
+            cutoff = max(notification_cutoff(), filters.created_at or datetime.min)
             if since_timestamp:
-                query = query.filter(Job.scraped_date >= since_timestamp)
+                cutoff = max(cutoff, since_timestamp)
+            query = query.filter(Job.scraped_date >= cutoff)
             
-            # Get user's category filters
-            category_filters = [category.id for category in user.categories]
+            # Anti-join against the ledger so already delivered jobs are skipped
+            query = query.filter(~exists().where(
+                SentNotification.user_id == filters.user_id,
+                SentNotification.job_id == Job.id
+            ))
             
-            # Get user's keyword filters
-            keyword_filters = [keyword.word.lower() for keyword in user.keywords]
+            # Get user's category and keyword filters
+            category_filters = list(filters.category_ids)
+            keyword_filters = list(filters.normalized_keywords)
             
             # Apply filters if they exist
             if category_filters:
                 query = query.filter(Job.category_id.in_(category_filters))
             
-            # Get all jobs that match the category filter
-            matching_jobs = query.all()
+            # Normalized keywords are matched as substrings of the normalized title inside the database
+            if keyword_filters and not filters.fuzzy_keywords:
+                query = query.filter(keyword_filter_clause(keyword_filters))
+            
+            jobs = [JobRecord(*row) for row in query]
             
-            # Further filter by keywords if needed
-            if keyword_filters:
-                filtered_jobs = []
-                for job in matching_jobs:
-                    job_title_lower = job.title.lower() if job.title else ""
-                    if any(keyword in job_title_lower for keyword in keyword_filters):
-                        filtered_jobs.append(job)
-                matching_jobs = filtered_jobs
+            # Fuzzy keywords need trigram similarity and expressions a compiled predicate,
+            # so those users' filters are checked here
+            if filters.fuzzy_keywords or filters.filter_expression:
+                subscription = Subscription(
+                    filters.user_id, user_id, filters.created_at, frozenset(filters.category_ids),
+                    filters.normalized_keywords, filters.fuzzy_keywords, filters.filter_expression
+                )
+                matcher = self._fuzzy_matcher(filters.fuzzy_keywords)
+                jobs = [
+                    job for job in jobs
+                    if job_matches_subscription(subscription, job, job.title_normalized or "", matcher.search(job.title_normalized))
+                ]
             
-            return matching_jobs
+            return jobs
             
         except Exception as e:
             logger.error(f"Error getting new jobs for user {user_id}: {e}")
@@ -142,6 +339,14 @@ class DatabaseManager:
                 if last_name:
                     user.last_name = last_name
                 
+                # Deactivated because the chat was unreachable (not paused with /pause): the
+                # user reaching us again means the chat works, e.g. after unblocking the bot
+                if not user.is_active and user.deactivated_reason == 'unreachable':
+                    user.is_active = True
+                    user.deactivated_reason = None
+                    self._reset_delivery_health(user)
+                    logger.info(f"Reactivated unreachable user {telegram_id}")
+                
                 logger.info(f"Updated user: {telegram_id}")
             else:
                 # Create new user
@@ -155,6 +360,7 @@ class DatabaseManager:
                 logger.info(f"Registered new user: {telegram_id}")
             
             session.commit()
+            self._sync_subscription(session, user)
             return user.id
             
         except Exception as e:
@@ -192,6 +398,8 @@ class DatabaseManager:
             # Add category to user's filters
             user.categories.append(category)
             session.commit()
+            self.filter_cache.invalidate(telegram_id)
+            self._sync_subscription(session, user)
             logger.info(f"Added category filter '{category_name}' for user {telegram_id}")
             return True
             
@@ -202,8 +410,8 @@ class DatabaseManager:
         finally:
             session.close()
     
-    def add_keyword_filter(self, telegram_id, keyword):
-        """Add a keyword filter for a user"""
+    def add_keyword_filter(self, telegram_id, keyword, fuzzy=False):
+        """Add a keyword filter for a user, optionally matched with typo tolerance"""
         session = get_session()
         
         try:
@@ -212,25 +420,38 @@ class DatabaseManager:
                 logger.warning(f"User {telegram_id} not found")
                 return False
             
+            # Keywords are matched in normalized form, so "Mühasib" and "muhasib" are the same filter
+            normalized = normalize_text(keyword)
+            if not normalized:
+                logger.info(f"Ignoring keyword filter without any letters or digits: {keyword}")
+                return False
+            
             # Get or create keyword
-            keyword_obj = session.query(Keyword).filter(
-                func.lower(Keyword.word) == func.lower(keyword)
-            ).first()
+            keyword_obj = session.query(Keyword).filter(Keyword.normalized == normalized).first()
             
             if not keyword_obj:
-                keyword_obj = Keyword(word=keyword)
+                keyword_obj = Keyword(word=keyword, normalized=normalized)
                 session.add(keyword_obj)
                 session.flush()
             
-            # Check if user already has this keyword
+            # Check if user already has this keyword; re-adding it only switches fuzzy matching on or off
             if keyword_obj in user.keywords:
-                logger.info(f"User {telegram_id} already has keyword filter: {keyword}")
-                return False
+                if (keyword_obj.id in self._fuzzy_keyword_ids(session, user.id)) == fuzzy:
+                    logger.info(f"User {telegram_id} already has keyword filter: {keyword}")
+                    return False
+                session.execute(
+                    update(user_keyword)
+                    .where(user_keyword.c.user_id == user.id, user_keyword.c.keyword_id == keyword_obj.id)
+                    .values(fuzzy=fuzzy)
+                )
+            else:
+                session.execute(user_keyword.insert().values(user_id=user.id, keyword_id=keyword_obj.id, fuzzy=fuzzy))
+                session.expire(user, ['keywords'])
             
-            # Add keyword to user's filters
-            user.keywords.append(keyword_obj)
             session.commit()
-            logger.info(f"Added keyword filter '{keyword}' for user {telegram_id}")
+            self.filter_cache.invalidate(telegram_id)
+            self._sync_subscription(session, user)
+            logger.info(f"Added {'fuzzy ' if fuzzy else ''}keyword filter '{keyword}' for user {telegram_id}")
             return True
             
         except Exception as e:
@@ -240,19 +461,54 @@ class DatabaseManager:
         finally:
             session.close()
     
-    def get_user_filters(self, telegram_id):
-        """Get all filters for a user"""
+    def set_filter_expression(self, telegram_id, expression):
+        """Set a user's filter expression, or remove it when empty
+        
+        Returns False if the user does not exist or the expression does not parse.
+        """
         session = get_session()
         
         try:
             user = session.query(User).filter(User.telegram_id == telegram_id).first()
             if not user:
+                logger.warning(f"User {telegram_id} not found")
+                return False
+            
+            expression = (expression or "").strip() or None
+            if expression:
+                compile_filter_expression(expression)
+            
+            user.filter_expression = expression
+            session.commit()
+            self.filter_cache.invalidate(telegram_id)
+            self._sync_subscription(session, user)
+            logger.info(f"Set filter expression for user {telegram_id}: {expression}")
+            return True
+            
+        except FilterExpressionError as e:
+            logger.info(f"Rejected filter expression for user {telegram_id}: {e}")
+            return False
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error setting filter expression for user {telegram_id}: {e}")
+            return False
+        finally:
+            session.close()
+    
+    def get_user_filters(self, telegram_id):
+        """Get all filters for a user"""
+        session = get_session()
+        
+        try:
+            filters = self._load_user_filters(session, telegram_id)
+            if filters is None:
                 logger.warning(f"User {telegram_id} not found")
                 return None
             
             return {
-                'categories': [category.name for category in user.categories],
-                'keywords': [keyword.word for keyword in user.keywords]
+                'categories': list(filters.categories),
+                'keywords': list(filters.keywords),
+                'expression': filters.filter_expression
             }
             
         except Exception as e:
@@ -274,8 +530,11 @@ class DatabaseManager:
             # Clear all filters
             user.categories = []
             user.keywords = []
+            user.filter_expression = None
             
             session.commit()
+            self.filter_cache.invalidate(telegram_id)
+            self._sync_subscription(session, user)
             logger.info(f"Cleared all filters for user {telegram_id}")
             return True
             
@@ -308,6 +567,8 @@ class DatabaseManager:
             # Remove category from user's filters
             user.categories.remove(category)
             session.commit()
+            self.filter_cache.invalidate(telegram_id)
+            self._sync_subscription(session, user)
             logger.info(f"Removed category filter '{category_name}' for user {telegram_id}")
             return True
             
@@ -329,9 +590,7 @@ class DatabaseManager:
                 return False
             
             # Find the keyword
-            keyword_obj = session.query(Keyword).filter(
-                func.lower(Keyword.word) == func.lower(keyword)
-            ).first()
+            keyword_obj = session.query(Keyword).filter(Keyword.normalized == normalize_text(keyword)).first()
             
             if not keyword_obj or keyword_obj not in user.keywords:
                 logger.info(f"User {telegram_id} does not have keyword filter: {keyword}")
@@ -340,6 +599,8 @@ class DatabaseManager:
             # Remove keyword from user's filters
             user.keywords.remove(keyword_obj)
             session.commit()
+            self.filter_cache.invalidate(telegram_id)
+            self._sync_subscription(session, user)
             logger.info(f"Removed keyword filter '{keyword}' for user {telegram_id}")
             return True
             
@@ -361,7 +622,11 @@ class DatabaseManager:
                 return False
             
             user.is_active = is_active
+            user.deactivated_reason = None if is_active else 'paused'
+            # Failures from before a pause or resume say nothing about the chat afterwards
+            self._reset_delivery_health(user)
             session.commit()
+            self._sync_subscription(session, user)
             
             status = "active" if is_active else "inactive"
             logger.info(f"Set user {telegram_id} to {status}")
@@ -374,6 +639,67 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def set_digest(self, telegram_id, size, interval_hours=0):
+        """Set a user's digest size and frequency; size 0 goes back to one message per job"""
+        session = get_session()
+        
+        try:
+            user = session.query(User).filter(User.telegram_id == telegram_id).first()
+            if not user:
+                logger.warning(f"User {telegram_id} not found")
+                return False
+            
+            user.digest_size = size
+            user.digest_interval_hours = interval_hours if size else 0
+            session.commit()
+            logger.info(f"Set digest for user {telegram_id}: {size} jobs per message every {interval_hours} hours")
+            return True
+            
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error setting digest for user {telegram_id}: {e}")
+            return False
+        finally:
+            session.close()
+    
+    def get_digest(self, telegram_id):
+        """Get a user's DigestSettings, or None if the user does not exist"""
+        session = get_session()
+        
+        try:
+            row = session.query(User.digest_size, User.digest_interval_hours, User.last_digest_at).filter(
+                User.telegram_id == telegram_id
+            ).first()
+            return DigestSettings(*row) if row else None
+            
+        except Exception as e:
+            logger.error(f"Error getting digest settings for user {telegram_id}: {e}")
+            return None
+        finally:
+            session.close()
+    
+    def get_digest_settings(self, user_ids):
+        """Get DigestSettings keyed by user ID for those of the given users who use digests"""
+        session = get_session()
+        
+        try:
+            settings = {}
+            user_ids = list(user_ids)
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(user_ids), 500):
+                rows = session.query(
+                    User.id, User.digest_size, User.digest_interval_hours, User.last_digest_at
+                ).filter(User.id.in_(user_ids[start:start + 500]), User.digest_size > 0)
+                for user_id, size, interval_hours, last_digest_at in rows:
+                    settings[user_id] = DigestSettings(size, interval_hours, last_digest_at)
+            return settings
+            
+        except Exception as e:
+            logger.error(f"Error getting digest settings: {e}")
+            return {}
+        finally:
+            session.close()
+    
     def get_all_categories(self):
         """Get all available categories"""
         session = get_session()
@@ -388,16 +714,552 @@ class DatabaseManager:
         finally:
             session.close()
     
-    def get_active_users(self):
-        """Get all active users"""
+    def get_active_subscriptions(self):
+        """Get every active user together with their category IDs and keywords in a single query"""
+        session = get_session()
+        
+        try:
+            # One row per (user, filter): categories and keywords unioned, outer-joined so
+            # that users without any filters still come back with a NULL filter row
+            filter_rows = union_all(
+                select(
+                    user_category.c.user_id.label('user_id'),
+                    user_category.c.category_id.label('category_id'),
+                    null().label('word'),
+                    null().label('fuzzy')
+                ),
+                select(
+                    user_keyword.c.user_id.label('user_id'),
+                    null().label('category_id'),
+                    Keyword.normalized.label('word'),
+                    user_keyword.c.fuzzy.label('fuzzy')
+                ).join(Keyword, Keyword.id == user_keyword.c.keyword_id)
+            ).subquery()
+            
+            rows = session.execute(
+                select(
+                    User.id, User.telegram_id, User.created_at, User.filter_expression,
+                    filter_rows.c.category_id, filter_rows.c.word, filter_rows.c.fuzzy
+                )
+                .outerjoin(filter_rows, filter_rows.c.user_id == User.id)
+                .where(User.is_active == True)
+            )
+            
+            users = {}
+            for user_id, telegram_id, created_at, expression, category_id, word, fuzzy in rows:
+                _, _, _, category_ids, keywords, fuzzy_keywords = users.setdefault(
+                    user_id, (telegram_id, created_at, expression, set(), [], [])
+                )
+                if category_id is not None:
+                    category_ids.add(category_id)
+                if word is not None:
+                    (fuzzy_keywords if fuzzy else keywords).append(word)
+            
+            return [
+                Subscription(
+                    user_id, telegram_id, created_at, frozenset(category_ids), tuple(keywords), tuple(fuzzy_keywords), expression
+                )
+                for user_id, (telegram_id, created_at, expression, category_ids, keywords, fuzzy_keywords) in users.items()
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error getting active subscriptions: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def get_subscription_index(self):
+        """Get the in-memory subscription index, loading it from the database on first use"""
+        if self.subscription_index is None:
+            with self._subscription_index_lock:
+                if self.subscription_index is None:
+                    index = SubscriptionIndex(self.get_active_subscriptions())
+                    self.subscription_index = index
+                    logger.info(f"Loaded subscription index with {len(index)} active users")
+        return self.subscription_index
+    
+    def verify_subscription_index(self):
+        """Compare the subscription index with the database and rebuild it if they drifted apart
+        
+        Returns True if the index was consistent (or not loaded yet).
+        """
+        index = self.subscription_index
+        if index is None:
+            return True
+        
+        version = index.version
+        subscriptions = self.get_active_subscriptions()
+        expected = {subscription_key(subscription) for subscription in subscriptions}
+        actual = index.snapshot()
+        
+        # A write landed while we were reading; the comparison would be meaningless
+        if index.version != version:
+            logger.info("Subscription index changed during consistency check, will retry next time")
+            return True
+        
+        if expected == actual:
+            return True
+        
+        logger.warning(
+            f"Subscription index drifted from the database "
+            f"({len(expected - actual)} missing, {len(actual - expected)} stale), rebuilding"
+        )
+        index.load(subscriptions)
+        return False
+    
+    def get_new_jobs(self, since_timestamp=None):
+        """Get all jobs scraped since the given timestamp as JobRecords"""
+        session = get_session()
+        
+        try:
+            query = session.query(*JOB_RECORD_COLUMNS).outerjoin(Category, Job.category_id == Category.id)
+            if since_timestamp:
+                query = query.filter(Job.scraped_date >= since_timestamp)
+            
+            return [JobRecord(*row) for row in query]
+            
+        except Exception as e:
+            logger.error(f"Error getting new jobs: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def get_sent_pairs(self, since_timestamp):
+        """Get (user_id, job_id) ledger entries for jobs scraped since the given timestamp"""
+        session = get_session()
+        
+        try:
+            rows = session.query(SentNotification.user_id, SentNotification.job_id).join(
+                Job, Job.id == SentNotification.job_id
+            ).filter(Job.scraped_date >= since_timestamp)
+            return {(user_id, job_id) for user_id, job_id in rows}
+            
+        except Exception as e:
+            logger.error(f"Error getting sent notifications: {e}")
+            return set()
+        finally:
+            session.close()
+    
+    def plan_notifications(self):
+        """Decide which undelivered jobs go to which user in this cycle
+        
+        Subscriptions come from the in-memory index; the candidate jobs and the ledger are
+        loaded up front, so the number of queries per cycle does not grow with the number
+        of users. Returns a dict of Subscription -> list of JobRecords.
+        """
+        cutoff = notification_cutoff()
+        subscription_index = self.get_subscription_index()
+        candidate_jobs = self.get_new_jobs(cutoff)
+        sent_pairs = self.get_sent_pairs(cutoff)
+        
+        matches = subscription_index.match(candidate_jobs, sent_pairs)
+        logger.info(f"Matched {len(candidate_jobs)} candidate jobs against {len(subscription_index)} active users")
+        
+        # Delivery workers deactivate unreachable users in their own process, so this
+        # index only learns about it from the database
+        inactive = self.get_inactive_user_ids()
+        if inactive:
+            stale = [subscription for subscription in matches if subscription.user_id in inactive]
+            for subscription in stale:
+                del matches[subscription]
+                subscription_index.remove(subscription.user_id)
+            if stale:
+                logger.info(f"Dropped {len(stale)} users deactivated elsewhere from the subscription index")
+        
+        # Users backing off after failed sends stay in the index; their jobs are left
+        # out of the ledger and planned again once the backoff is over
+        backing_off = self.get_backing_off_user_ids()
+        if backing_off:
+            held = [subscription for subscription in matches if subscription.user_id in backing_off]
+            for subscription in held:
+                del matches[subscription]
+            if held:
+                logger.info(f"Held notifications for {len(held)} users backing off after failed sends")
+        return matches
+    
+    def get_inactive_user_ids(self):
+        """IDs of users who paused or were deactivated"""
+        session = get_session()
+        
+        try:
+            return set(session.scalars(select(User.id).where(User.is_active == False)))
+            
+        except Exception as e:
+            logger.error(f"Error getting inactive users: {e}")
+            return set()
+        finally:
+            session.close()
+    
+    def get_backing_off_user_ids(self):
+        """IDs of active users whose sends are paused after transient failures"""
+        session = get_session()
+        
+        try:
+            return set(session.scalars(
+                select(User.id).where(User.is_active == True, User.backoff_until > datetime.utcnow())
+            ))
+            
+        except Exception as e:
+            logger.error(f"Error getting users backing off: {e}")
+            return set()
+        finally:
+            session.close()
+    
+    def enqueue_notifications(self, deliveries, matched_at=None):
+        """Write planned deliveries to the outbox together with their ledger rows
+        
+        Deliveries are Delivery tuples whose payload is a JobRecord or a Digest. Both
+        tables are written in one transaction, so a planned notification is either
+        queued and recorded or left for the next cycle to plan again. matched_at is
+        when planning ran, kept for the latency metrics. Returns the number of outbox
+        entries written.
+        """
+        session = get_session()
+        
+        try:
+            # Another cycle may have queued some of these jobs since they were planned
+            job_ids = list({job_id for delivery in deliveries for job_id in delivery_job_ids(delivery)})
+            queued = set()
+            for start in range(0, len(job_ids), 500):
+                queued.update(session.execute(
+                    select(SentNotification.user_id, SentNotification.job_id)
+                    .where(SentNotification.job_id.in_(job_ids[start:start + 500]))
+                ).all())
+            
+            now = datetime.utcnow()
+            entries, ledger, digest_users = [], [], set()
+            for delivery in deliveries:
+                delivery_ids = delivery_job_ids(delivery)
+                if any((delivery.user_id, job_id) in queued for job_id in delivery_ids):
+                    continue
+                
+                is_digest = isinstance(delivery.payload, Digest)
+                entries.append({
+                    'user_id': delivery.user_id,
+                    'chat_id': delivery.chat_id,
+                    'kind': 'digest' if is_digest else 'job',
+                    'job_ids': encode_job_ids(delivery_ids),
+                    'text': delivery.payload.text if is_digest else None,
+                    'status': 'pending',
+                    'attempts': 0,
+                    'created_at': now,
+                    'matched_at': matched_at,
+                    'next_attempt_at': now
+                })
+                ledger.extend({'user_id': delivery.user_id, 'job_id': job_id, 'sent_at': now} for job_id in delivery_ids)
+                if is_digest:
+                    digest_users.add(delivery.user_id)
+            
+            if entries:
+                session.execute(OutboxEntry.__table__.insert(), entries)
+                session.execute(SentNotification.__table__.insert(), ledger)
+            if digest_users:
+                session.query(User).filter(User.id.in_(digest_users)).update(
+                    {User.last_digest_at: now}, synchronize_session=False
+                )
+            session.commit()
+            return len(entries)
+            
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error enqueueing notifications: {e}")
+            return 0
+        finally:
+            session.close()
+    
+    def get_due_outbox(self, limit, now=None, partitions=None, claimer=None, claim_seconds=OUTBOX_CLAIM_SECONDS):
+        """Claim up to `limit` pending outbox entries that are due and return them as Delivery tuples
+        
+        With `partitions`, only entries for chats in those partitions (see
+        delivery_partition) are returned. Entries are claimed in one UPDATE for
+        `claim_seconds`, so concurrent senders never load the same entry; a claim
+        ends when the entry is completed or rescheduled, or when it expires.
+        
+        Entries are taken round-robin across chats (each chat's oldest first), so a
+        batch spreads over as many chats as possible rather than queueing one
+        chat's jobs behind its per-chat rate limit.
+        """
         session = get_session()
+        now = now or datetime.utcnow()
+        claimed_at = datetime.utcnow()
+        claim = f"{claimer or f'{socket.gethostname()}-{os.getpid()}'}/{uuid.uuid4().hex[:8]}"
         
         try:
-            users = session.query(User).filter(User.is_active == True).all()
-            return users
+            claimable = [
+                OutboxEntry.status == 'pending',
+                OutboxEntry.next_attempt_at <= now,
+                or_(OutboxEntry.claimed_until.is_(None), OutboxEntry.claimed_until <= claimed_at),
+            ]
+            if partitions is not None:
+                if not partitions:
+                    return []
+                claimable.append((func.abs(OutboxEntry.chat_id) % DELIVERY_PARTITIONS).in_(list(partitions)))
+            ranked = select(
+                OutboxEntry.id, OutboxEntry.next_attempt_at,
+                func.row_number().over(
+                    partition_by=OutboxEntry.chat_id, order_by=(OutboxEntry.next_attempt_at, OutboxEntry.id)
+                ).label('turn')
+            ).where(*claimable).subquery()
+            due = select(ranked.c.id).order_by(ranked.c.turn, ranked.c.next_attempt_at, ranked.c.id).limit(limit)
+            session.execute(
+                update(OutboxEntry).where(OutboxEntry.id.in_(due), *claimable)
+                .values(claimed_by=claim, claimed_until=claimed_at + timedelta(seconds=claim_seconds))
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+            entries = (
+                session.query(OutboxEntry).filter(OutboxEntry.claimed_by == claim)
+                .order_by(OutboxEntry.next_attempt_at, OutboxEntry.id).all()
+            )
+            
+            job_ids = {job_id for entry in entries if entry.kind == 'job' for job_id in decode_job_ids(entry.job_ids)}
+            jobs, job_stamps = {}, {}
+            if job_ids:
+                query = session.query(*JOB_RECORD_COLUMNS, Job.posted_date, Job.fetched_at, Job.parsed_at).outerjoin(
+                    Category, Job.category_id == Category.id
+                )
+                for row in query.filter(Job.id.in_(job_ids)):
+                    jobs[row.id] = JobRecord(*row[:len(JOB_RECORD_COLUMNS)])
+                    job_stamps[row.id] = (row.posted_date, row.fetched_at, row.parsed_at, row.scraped_date)
+            
+            deliveries = []
+            for entry in entries:
+                if entry.kind == 'digest':
+                    digest = Digest(tuple(decode_job_ids(entry.job_ids)), entry.text)
+                    deliveries.append(Delivery(entry.chat_id, entry.user_id, digest, entry.id))
+                    continue
+                
+                job = jobs.get(decode_job_ids(entry.job_ids)[0])
+                if job is None:
+                    # The job was archived while the entry waited; there is nothing left to send
+                    session.delete(entry)
+                    continue
+                # Digests are held back on purpose, so only single-job alerts are stamped for the latency metrics
+                stamps = AlertStamps(job.source, *job_stamps[job.id], entry.matched_at, entry.created_at)
+                deliveries.append(Delivery(entry.chat_id, entry.user_id, job, entry.id, stamps))
+            
+            session.commit()
+            return deliveries
             
         except Exception as e:
-            logger.error(f"Error getting active users: {e}")
+            session.rollback()
+            logger.error(f"Error loading the outbox: {e}")
             return []
         finally:
-            session.close() 
\ No newline at end of file
+            session.close()
+    
+    def complete_outbox_entry(self, entry_id, user_id=None):
+        """Remove a sent entry from the outbox, stamp its ledger rows as delivered and record the user's successful send"""
+        session = get_session()
+        now = datetime.utcnow()
+        
+        try:
+            entry = session.get(OutboxEntry, entry_id)
+            if entry is not None:
+                session.execute(
+                    update(SentNotification)
+                    .where(SentNotification.user_id == entry.user_id, SentNotification.job_id.in_(decode_job_ids(entry.job_ids)))
+                    .values(delivered_at=now)
+                )
+                session.delete(entry)
+            if user_id is not None:
+                session.execute(
+                    update(User).where(User.id == user_id)
+                    .values(consecutive_failures=0, backoff_until=None, last_success_at=now)
+                )
+            session.commit()
+            return True
+            
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error completing outbox entry {entry_id}: {e}")
+            return False
+        finally:
+            session.close()
+    
+    def fail_outbox_entry(self, entry_id, error, transient=True, unreachable=False, error_class=None):
+        """Record a failed attempt: schedule a retry with backoff, or dead-letter the entry
+        
+        Entries are dead-lettered on permanent errors and after OUTBOX_MAX_ATTEMPTS
+        attempts. The user's delivery health is updated in the same transaction: an
+        unreachable chat (bot blocked, chat deleted) deactivates the user and
+        dead-letters their other pending entries, and a transient failure backs the
+        user off exponentially in the number of failures in a row. Returns the
+        entry's new status, or None on error.
+        """
+        session = get_session()
+        
+        try:
+            entry = session.query(OutboxEntry).filter(OutboxEntry.id == entry_id).first()
+            if not entry:
+                return None
+            
+            now = datetime.utcnow()
+            entry.attempts += 1
+            entry.last_error = error
+            if not transient or entry.attempts >= OUTBOX_MAX_ATTEMPTS:
+                entry.status = 'dead'
+                logger.warning(f"Dead-lettered outbox entry {entry_id} for user {entry.user_id} after {entry.attempts} attempts: {error}")
+            else:
+                entry.next_attempt_at = now + timedelta(seconds=backoff_delay(entry.attempts))
+            entry.claimed_by = None
+            entry.claimed_until = None
+            
+            user = session.query(User).filter(User.id == entry.user_id).first()
+            if user:
+                user.consecutive_failures += 1
+                user.last_error_class = error_class
+                if unreachable:
+                    user.is_active = False
+                    user.deactivated_reason = 'unreachable'
+                    session.query(OutboxEntry).filter(
+                        OutboxEntry.user_id == user.id, OutboxEntry.status == 'pending'
+                    ).update({'status': 'dead', 'last_error': f"User unreachable: {error}"}, synchronize_session=False)
+                    logger.warning(f"Deactivated user {user.telegram_id}: chat unreachable ({error})")
+                elif transient:
+                    user.backoff_until = now + timedelta(seconds=backoff_delay(user.consecutive_failures))
+            
+            status = entry.status
+            session.commit()
+            if user and unreachable:
+                self._sync_subscription(session, user)
+            return status
+            
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error recording failure of outbox entry {entry_id}: {e}")
+            return None
+        finally:
+            session.close()
+    
+    def heartbeat_delivery_worker(self, worker_id, lease_seconds, rebalance=True):
+        """Record a delivery worker's heartbeat, renew its leases and return the partitions it owns
+        
+        With rebalance, the worker also moves towards its fair share of the
+        DELIVERY_PARTITIONS partitions among the live workers: it releases
+        partitions above its share and claims free or expired ones below it.
+        Claims are conditional updates, so two workers never take the same
+        partition. Returns None on error, in which case the worker should
+        treat its leases as lost.
+        """
+        session = get_session()
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=lease_seconds)
+        
+        try:
+            worker = session.get(WorkerHeartbeat, worker_id)
+            if worker is None:
+                session.add(WorkerHeartbeat(worker_id=worker_id, started_at=now, heartbeat_at=now))
+            else:
+                worker.heartbeat_at = now
+            
+            existing = set(session.scalars(select(DeliveryLease.partition)))
+            missing = [{'partition': partition} for partition in range(DELIVERY_PARTITIONS) if partition not in existing]
+            if missing:
+                session.execute(DeliveryLease.__table__.insert().prefix_with("OR IGNORE", dialect="sqlite"), missing)
+            
+            # Renew only leases still held: one that expired may already belong to someone else
+            session.execute(
+                update(DeliveryLease).where(DeliveryLease.worker_id == worker_id).values(expires_at=expires_at)
+            )
+            owned = sorted(session.scalars(
+                select(DeliveryLease.partition)
+                .where(DeliveryLease.worker_id == worker_id, DeliveryLease.partition < DELIVERY_PARTITIONS)
+            ))
+            
+            if rebalance:
+                # Workers that stopped without releasing are forgotten once they have long been silent
+                session.query(WorkerHeartbeat).filter(
+                    WorkerHeartbeat.heartbeat_at < now - timedelta(seconds=lease_seconds * 10)
+                ).delete()
+                live_workers = session.query(func.count()).select_from(WorkerHeartbeat).filter(
+                    WorkerHeartbeat.heartbeat_at > now - timedelta(seconds=lease_seconds)
+                ).scalar()
+                share = -(-DELIVERY_PARTITIONS // max(1, live_workers))
+                
+                if len(owned) > share:
+                    released = owned[share:]
+                    session.execute(
+                        update(DeliveryLease).where(DeliveryLease.partition.in_(released), DeliveryLease.worker_id == worker_id)
+                        .values(worker_id=None, expires_at=None)
+                    )
+                    owned = owned[:share]
+                    logger.info(f"Delivery worker {worker_id} released partitions {released}")
+                
+                elif len(owned) < share:
+                    free = session.scalars(
+                        select(DeliveryLease.partition).where(
+                            DeliveryLease.partition < DELIVERY_PARTITIONS,
+                            or_(DeliveryLease.worker_id.is_(None), DeliveryLease.expires_at <= now)
+                        ).order_by(DeliveryLease.partition)
+                    ).all()
+                    claimed = []
+                    for partition in free:
+                        if len(owned) + len(claimed) >= share:
+                            break
+                        result = session.execute(
+                            update(DeliveryLease).where(
+                                DeliveryLease.partition == partition,
+                                or_(DeliveryLease.worker_id.is_(None), DeliveryLease.expires_at <= now)
+                            ).values(worker_id=worker_id, expires_at=expires_at)
+                        )
+                        if result.rowcount:
+                            claimed.append(partition)
+                    if claimed:
+                        owned = sorted(owned + claimed)
+                        logger.info(f"Delivery worker {worker_id} claimed partitions {claimed}")
+            
+            session.commit()
+            return owned
+            
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error renewing leases of delivery worker {worker_id}: {e}")
+            return None
+        finally:
+            session.close()
+    
+    def release_delivery_worker(self, worker_id):
+        """Give up a stopping worker's partitions right away instead of letting its leases expire"""
+        session = get_session()
+        
+        try:
+            session.execute(
+                update(DeliveryLease).where(DeliveryLease.worker_id == worker_id).values(worker_id=None, expires_at=None)
+            )
+            session.query(WorkerHeartbeat).filter(WorkerHeartbeat.worker_id == worker_id).delete()
+            session.commit()
+            logger.info(f"Delivery worker {worker_id} released its partitions")
+            return True
+            
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error releasing delivery worker {worker_id}: {e}")
+            return False
+        finally:
+            session.close()
+    
+    def get_outbox_stats(self):
+        """Outbox depth and age: pending, due now and dead entries, and the oldest pending entry's age in seconds"""
+        session = get_session()
+        now = datetime.utcnow()
+        
+        try:
+            counts = dict(session.query(OutboxEntry.status, func.count()).group_by(OutboxEntry.status).all())
+            due = session.query(func.count()).select_from(OutboxEntry).filter(
+                OutboxEntry.status == 'pending', OutboxEntry.next_attempt_at <= now
+            ).scalar()
+            oldest = session.query(func.min(OutboxEntry.created_at)).filter(OutboxEntry.status == 'pending').scalar()
+            
+            return {
+                'pending': counts.get('pending', 0),
+                'due': due,
+                'dead': counts.get('dead', 0),
+                'oldest_pending_age': (now - oldest).total_seconds() if oldest else 0.0
+            }
+            
+        except Exception as e:
+            logger.error(f"Error getting outbox stats: {e}")
+            return {'pending': 0, 'due': 0, 'dead': 0, 'oldest_pending_age': 0.0}
+        finally:
+            session.close()
@@ -0,0 +1,112 @@
+import logging
+import random
+from datetime import datetime
+
+from src.dispatcher import NotificationDispatcher
+from src.digest import Digest
+from src.outbox import is_transient_error, is_unreachable_chat
+from src.latency import alert_latency
+from src.rendering import JOB_EMOJIS, MOTIVATIONAL_MESSAGES, JobMessageRenderer
+from src.config import OUTBOX_BATCH_SIZE, TELEGRAM_GLOBAL_RATE
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class JobSender:
+    """Sends outbox deliveries through a Telegram bot
+    
+    Used by the bot process and by delivery workers alike. Errors propagate to
+    the dispatcher, which waits out RetryAfter and lets the outbox decide
+    whether other failures are retried or dead-lettered.
+    """
+    
+    def __init__(self, bot, renderer=None):
+        self.bot = bot
+        # Shared by every send, so each job is rendered once however many users receive it
+        self.renderer = renderer or JobMessageRenderer()
+    
+    async def send_job_notification(self, user_id, job):
+        """Send a job notification to a user"""
+        # The escaped job body is rendered once per job; only the emoji and motivation vary per user
+        job_text = self.renderer.render(job, random.choice(JOB_EMOJIS), random.choice(MOTIVATIONAL_MESSAGES))
+        
+        await self.bot.send_message(
+            chat_id=user_id,
+            text=job_text,
+            parse_mode="Markdown",
+            disable_web_page_preview=False
+        )
+        
+        logger.info(f"Sent job notification to user {user_id}: {job.title}")
+        return True
+    
+    async def send_job_digest(self, user_id, digest):
+        """Send one digest message"""
+        await self.bot.send_message(
+            chat_id=user_id,
+            text=digest.text,
+            parse_mode="Markdown",
+            disable_web_page_preview=True
+        )
+        
+        logger.info(f"Sent digest of {len(digest.job_ids)} jobs to user {user_id}")
+        return True
+    
+    async def send(self, delivery):
+        """Send one outbox entry: a job notification or a digest"""
+        if isinstance(delivery.payload, Digest):
+            return await self.send_job_digest(delivery.chat_id, delivery.payload)
+        return await self.send_job_notification(delivery.chat_id, delivery.payload)
+
+class OutboxDrainer:
+    """Sends due outbox entries through the dispatcher and records every outcome in the database"""
+    
+    def __init__(self, db, send):
+        self.db = db
+        self.send = send
+        # Per-chat pacing outlives each batch's dispatcher
+        self.chat_ready = {}
+    
+    async def complete(self, delivery):
+        """Remove a sent entry from the outbox and record how long the alert took"""
+        if delivery.stamps is not None:
+            alert_latency.observe(delivery.stamps, datetime.utcnow())
+        await self.db.complete_outbox_entry(delivery.outbox_id, delivery.user_id)
+    
+    async def fail(self, delivery, error):
+        """Schedule a retry of a failed entry, or dead-letter it; unreachable chats deactivate the user"""
+        description = f"{type(error).__name__}: {error}" if error else "send returned False"
+        await self.db.fail_outbox_entry(
+            delivery.outbox_id, description, is_transient_error(error), is_unreachable_chat(error),
+            type(error).__name__ if error else None
+        )
+    
+    async def send_batch(self, deliveries, rate=TELEGRAM_GLOBAL_RATE):
+        """Send one batch of deliveries at up to `rate` messages per second and return the dispatcher stats"""
+        dispatcher = NotificationDispatcher(
+            self.send, on_sent=self.complete, on_failed=self.fail, rate=rate, chat_ready=self.chat_ready
+        )
+        return await dispatcher.dispatch(deliveries)
+    
+    async def drain(self, partitions=None, rate=TELEGRAM_GLOBAL_RATE, batch_size=OUTBOX_BATCH_SIZE):
+        """Send due entries in batches until none are left; returns the number sent"""
+        started = datetime.utcnow()
+        attempted = set()
+        sent = 0
+        
+        while True:
+            # Failed entries are rescheduled after `started`, so each entry is tried once per drain
+            batch = [
+                delivery for delivery in await self.db.get_due_outbox(batch_size, started, partitions)
+                if delivery.outbox_id not in attempted
+            ]
+            if not batch:
+                return sent
+            attempted.update(delivery.outbox_id for delivery in batch)
+            
+            stats = await self.send_batch(batch, rate)
+            sent += stats['sent']
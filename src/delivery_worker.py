@@ -0,0 +1,165 @@
+"""
+Delivery worker: drains the notification outbox for a share of its partitions
+
+Run one or more of these next to the bot (with DELIVERY_MODE=workers in the
+bot's environment) to spread sends over several processes or machines:
+
+    python -m src.delivery_worker
+
+Each worker owns a set of hash partitions of telegram_id through leases in
+the database and renews them with a heartbeat. When a worker joins or stops,
+the others rebalance on their next heartbeat; when one dies, its partitions
+are taken over once its leases expire. Every worker sends at its share of
+TELEGRAM_GLOBAL_RATE, in proportion to the partitions it owns, and every
+message to one chat goes through the same worker, so both of Telegram's
+limits hold across the whole fleet.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+
+from telegram import Bot
+
+from src.async_db import AsyncDatabaseManager
+from src.db_manager import DatabaseManager
+from src.delivery import JobSender, OutboxDrainer
+from src.latency import alert_latency
+from src.config import (
+    TELEGRAM_BOT_TOKEN, TELEGRAM_API_BASE_URL, TELEGRAM_GLOBAL_RATE, OUTBOX_BATCH_SIZE, DELIVERY_MODE, DELIVERY_PARTITIONS,
+    DELIVERY_LEASE_SECONDS, DELIVERY_HEARTBEAT_SECONDS, DELIVERY_POLL_SECONDS, LATENCY_REPORT_INTERVAL
+)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def default_worker_id():
+    """Unique per process and readable in the leases table"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class DeliveryWorker:
+    """Sends due outbox entries for the partitions this worker holds leases on"""
+    
+    def __init__(self, db, send, worker_id=None, global_rate=TELEGRAM_GLOBAL_RATE, batch_size=OUTBOX_BATCH_SIZE,
+                 lease_seconds=DELIVERY_LEASE_SECONDS, heartbeat_seconds=DELIVERY_HEARTBEAT_SECONDS,
+                 poll_seconds=DELIVERY_POLL_SECONDS):
+        self.db = db
+        self.outbox = OutboxDrainer(db, send)
+        self.worker_id = worker_id or default_worker_id()
+        self.global_rate = global_rate
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_seconds = poll_seconds
+        
+        self.partitions = []
+        self.sent = 0
+        self._rebalanced_at = None
+        self._stopped = None
+    
+    @property
+    def rate(self):
+        """This worker's share of the global send rate"""
+        return self.global_rate * len(self.partitions) / DELIVERY_PARTITIONS
+    
+    async def heartbeat(self, rebalance=False):
+        """Renew the leases, optionally rebalancing, and update the partitions owned"""
+        owned = await self.db.heartbeat_delivery_worker(self.worker_id, self.lease_seconds, rebalance)
+        if owned is None:
+            # Without a confirmed renewal the leases may have gone to another worker
+            owned = []
+        if owned != self.partitions:
+            logger.info(f"Delivery worker {self.worker_id} owns {len(owned)} partitions: {owned}")
+        self.partitions = owned
+        if rebalance:
+            self._rebalanced_at = time.monotonic()
+    
+    async def _keep_leases(self):
+        """Renew the leases in the background, so they outlive a long batch"""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            await self.heartbeat()
+    
+    async def _report_latency(self):
+        """Log alert latency percentiles every LATENCY_REPORT_INTERVAL minutes"""
+        while True:
+            await asyncio.sleep(LATENCY_REPORT_INTERVAL * 60)
+            alert_latency.log_report()
+    
+    def stop(self):
+        """Finish the current batch, release the partitions and return from run()"""
+        if self._stopped is not None:
+            self._stopped.set()
+    
+    async def run(self):
+        """Claim partitions and send their due entries until stopped"""
+        if DELIVERY_MODE != "workers":
+            # The bot would drain the same outbox inline, ignoring partitions and the rate split
+            raise ValueError("Delivery workers need DELIVERY_MODE=workers, for the bot as well as the workers")
+        
+        self._stopped = asyncio.Event()
+        logger.info(f"Starting delivery worker {self.worker_id}")
+        keeper = asyncio.create_task(self._keep_leases())
+        reporter = asyncio.create_task(self._report_latency())
+        
+        try:
+            while not self._stopped.is_set():
+                # Partitions only change hands between batches, never while their entries are in flight
+                if self._rebalanced_at is None or time.monotonic() - self._rebalanced_at >= self.heartbeat_seconds:
+                    await self.heartbeat(rebalance=True)
+                
+                # Read once: a failed heartbeat may drop the partitions (and the rate) while the claim is awaited
+                partitions, rate = self.partitions, self.rate
+                batch = []
+                if rate > 0:
+                    # Claims outlast the batch at this worker's rate, and expire about as soon as its leases if it dies
+                    batch = await self.db.get_due_outbox(
+                        self.batch_size, partitions=partitions, claimer=self.worker_id,
+                        claim_seconds=self.lease_seconds + self.batch_size / rate
+                    )
+                if batch:
+                    stats = await self.outbox.send_batch(batch, rate)
+                    self.sent += stats['sent']
+                    continue
+                
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            keeper.cancel()
+            reporter.cancel()
+            alert_latency.log_report()
+            await self.db.release_delivery_worker(self.worker_id)
+            logger.info(f"Delivery worker {self.worker_id} stopped after sending {self.sent} messages")
+
+async def run_worker(worker_id=None):
+    """Run a delivery worker against the real Bot API until SIGINT or SIGTERM"""
+    db_manager = DatabaseManager()
+    db = AsyncDatabaseManager(db_manager)
+    
+    async with Bot(TELEGRAM_BOT_TOKEN, base_url=TELEGRAM_API_BASE_URL) as bot:
+        worker = DeliveryWorker(db, JobSender(bot).send, worker_id)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+    
+    db.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="Send queued job notifications for a share of the outbox")
+    parser.add_argument("--worker-id", help="name in the leases table (default: hostname-pid)")
+    args = parser.parse_args()
+    asyncio.run(run_worker(args.worker_id))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+from typing import NamedTuple
+
+from telegram.helpers import escape_markdown
+
+from src.config import NOTIFICATION_LOOKBACK_HOURS, SCRAPING_INTERVAL
+
+# Telegram rejects messages longer than this many characters
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Largest number of jobs a user can ask for in one digest message
+MAX_DIGEST_SIZE = 50
+
+# Longest gap between digests whose held-back jobs are still inside the notification lookback
+# window when the digest goes out: a due digest waits up to one scraping interval for the next
+# cycle, and that cycle's scrape may take up to another before planning runs
+MAX_DIGEST_INTERVAL_HOURS = max(0, (NOTIFICATION_LOOKBACK_HOURS * 60 - 2 * SCRAPING_INTERVAL) // 60)
+
+# Titles are cut to this length so one long posting cannot crowd out the rest
+MAX_DIGEST_TITLE_LENGTH = 120
+
+# Characters that would start an entity or close the link text early, dropped from link text
+LINK_TEXT_TRANSLATION = str.maketrans("", "", "*_`[]")
+
+class DigestSettings(NamedTuple):
+    """A user's digest preferences; size 0 means one message per job"""
+    size: int
+    interval_hours: int
+    last_digest_at: object
+
+class Digest(NamedTuple):
+    """One digest message and the IDs of the jobs it lists"""
+    job_ids: tuple
+    text: str
+
+def digest_due(settings, now):
+    """Whether a digest may be sent now, given how often the user wants them"""
+    # Intervals saved under a longer lookback window would let held jobs fall out of it
+    interval_hours = min(settings.interval_hours, MAX_DIGEST_INTERVAL_HOURS)
+    if not interval_hours or settings.last_digest_at is None:
+        return True
+    return (now - settings.last_digest_at).total_seconds() >= interval_hours * 3600
+
+def markdown_link_text(text):
+    """Text for inside [...]: legacy Markdown has no escapes within an entity, so entity characters are dropped"""
+    return text.translate(LINK_TEXT_TRANSLATION)
+
+def digest_line(job):
+    """Compact one-line Markdown entry for a job: linked title, company and location"""
+    title = job.title if len(job.title) <= MAX_DIGEST_TITLE_LENGTH else job.title[:MAX_DIGEST_TITLE_LENGTH - 1] + "…"
+    title = markdown_link_text(title)
+    details = " · ".join(escape_markdown(value) for value in (job.company, job.location) if value)
+    return f"• [{title}]({job.url.replace(')', '%29')})" + (f" — {details}" if details else "")
+
+def digest_header(page, pages, count):
+    """First line of a digest message"""
+    jobs = "job" if count == 1 else "jobs"
+    part = f" ({page}/{pages})" if pages > 1 else ""
+    return f"📬 *Your job digest{part}:* {count} new {jobs}\n\n"
+
+def build_digests(jobs, size, limit=TELEGRAM_MESSAGE_LIMIT, line=digest_line):
+    """Pack jobs into as few digest messages as possible
+    
+    Each message lists at most `size` jobs and stays under `limit` characters,
+    header included. `line` renders one job's entry (pass a cached renderer's).
+    """
+    # Room for the longest header, e.g. "(12/12)" and a three-digit count
+    budget = limit - len(digest_header(999, 999, 999))
+    
+    chunks = []
+    chunk, lines, length = [], [], 0
+    for job in jobs:
+        text = line(job)
+        if chunk and (len(chunk) >= size or length + len(text) + 1 > budget):
+            chunks.append((chunk, lines))
+            chunk, lines, length = [], [], 0
+        chunk.append(job)
+        lines.append(text)
+        length += len(text) + 1
+    if chunk:
+        chunks.append((chunk, lines))
+    
+    return [
+        Digest(tuple(job.id for job in chunk), digest_header(page, len(chunks), len(chunk)) + "\n".join(lines))
+        for page, (chunk, lines) in enumerate(chunks, start=1)
+    ]
@@ -0,0 +1,239 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, NamedTuple
+
+from telegram.error import RetryAfter
+
+from src.config import (
+    DISPATCH_WORKERS, TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_INTERVAL, DISPATCH_MAX_RETRIES, DISPATCH_REPORT_INTERVAL
+)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class Delivery(NamedTuple):
+    """One message to send: the chat, the user it is for, what to send, its outbox entry and stage stamps"""
+    chat_id: int
+    user_id: int
+    payload: Any
+    outbox_id: int = None
+    stamps: Any = None
+
+def retry_after_seconds(error):
+    """Seconds to wait from a RetryAfter error (an int, or a timedelta in newer library versions)"""
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+class TokenBucket:
+    """Async token bucket allowing `rate` acquisitions per second with bursts of up to `capacity`"""
+    
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError(f"A token bucket needs a positive rate, got {rate}")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class NotificationDispatcher:
+    """Sends a batch of deliveries with a pool of sender tasks within Telegram's rate limits
+    
+    A global token bucket caps messages per second, and each chat is paced to
+    one message per TELEGRAM_CHAT_INTERVAL. Chats wait in a heap ordered by
+    when they may be sent to next, so a busy chat never holds up the others.
+    A RetryAfter from Telegram pauses all sending for the requested time and
+    the message is retried, up to DISPATCH_MAX_RETRIES times.
+    
+    Pass the same `chat_ready` dict (chat_id -> monotonic time the chat may be
+    sent to next) to successive dispatchers to keep the per-chat pacing across
+    batches.
+    
+    send(delivery) returns True on success and raises (or returns False) on
+    failure. on_sent(delivery) is awaited after every successful send and
+    on_failed(delivery, error) after every failure, with error None when send
+    returned False.
+    """
+    
+    def __init__(self, send, on_sent=None, on_failed=None, workers=DISPATCH_WORKERS, rate=TELEGRAM_GLOBAL_RATE,
+                 chat_interval=TELEGRAM_CHAT_INTERVAL, max_retries=DISPATCH_MAX_RETRIES,
+                 report_interval=DISPATCH_REPORT_INTERVAL, chat_ready=None):
+        self.send = send
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self.workers = workers
+        self.bucket = TokenBucket(rate)
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self.report_interval = report_interval
+        self.chat_ready = chat_ready if chat_ready is not None else {}
+        
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.started = None
+        self.paused_until = 0.0
+        
+        self._chats = {}            # chat_id -> deque of pending deliveries
+        self._ready = []            # heap of (time the chat may be sent to, sequence, chat_id)
+        self._sequence = itertools.count()
+        self._attempts = {}         # chat_id -> RetryAfter count for the chat's first delivery
+        self._remaining = 0         # deliveries not yet sent or given up on
+        self._condition = None
+    
+    @property
+    def queue_depth(self):
+        """Deliveries still waiting to be sent"""
+        return self._remaining
+    
+    def stats(self):
+        """Counters and throughput so far"""
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'retries': self.retries,
+            'queue_depth': self.queue_depth,
+            'elapsed': elapsed,
+            'sends_per_second': self.sent / elapsed if elapsed else 0.0
+        }
+    
+    def log_report(self, label="Dispatcher"):
+        """Log progress: sends per second and queue depth"""
+        stats = self.stats()
+        logger.info(
+            f"{label}: {stats['sent']} sent, {stats['failed']} failed, {stats['retries']} RetryAfter retries, "
+            f"{stats['sends_per_second']:.1f} sends/s, queue depth {stats['queue_depth']} after {stats['elapsed']:.1f} s"
+        )
+    
+    async def dispatch(self, deliveries):
+        """Send all deliveries and return the stats once every one has been sent or given up on"""
+        self.started = time.monotonic()
+        self._condition = asyncio.Condition()
+        
+        # Chats whose pacing interval has passed may be sent to right away
+        for chat_id in [chat_id for chat_id, ready_at in self.chat_ready.items() if ready_at <= self.started]:
+            del self.chat_ready[chat_id]
+        
+        for delivery in deliveries:
+            queue = self._chats.get(delivery.chat_id)
+            if queue is None:
+                queue = self._chats[delivery.chat_id] = deque()
+                ready_at = self.chat_ready.get(delivery.chat_id, 0.0)
+                heapq.heappush(self._ready, (ready_at, next(self._sequence), delivery.chat_id))
+            queue.append(delivery)
+            self._remaining += 1
+        
+        if self._remaining:
+            reporter = asyncio.create_task(self._report())
+            try:
+                await asyncio.gather(*(self._worker() for _ in range(min(self.workers, len(self._chats)))))
+            finally:
+                reporter.cancel()
+            self.log_report("Dispatch finished")
+        
+        return self.stats()
+    
+    async def _report(self):
+        """Log progress every report interval while dispatching"""
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self.log_report()
+    
+    async def _next_chat(self):
+        """Take the chat that may be sent to soonest, or None once everything is done"""
+        async with self._condition:
+            while not self._ready:
+                if not self._remaining:
+                    return None
+                # Other workers are sending to the remaining chats; they may come back
+                await self._condition.wait()
+            ready_at, _, chat_id = heapq.heappop(self._ready)
+        
+        delay = max(ready_at, self.paused_until) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return chat_id
+    
+    async def _release_chat(self, chat_id, ready_at):
+        """Put a chat back in the heap if it still has deliveries, and wake idle workers"""
+        async with self._condition:
+            if self._chats[chat_id]:
+                heapq.heappush(self._ready, (ready_at, next(self._sequence), chat_id))
+            else:
+                del self._chats[chat_id]
+            self._condition.notify_all()
+    
+    async def _worker(self):
+        """Send deliveries until none are left"""
+        while True:
+            chat_id = await self._next_chat()
+            if chat_id is None:
+                return
+            
+            queue = self._chats[chat_id]
+            delivery = queue[0]
+            
+            # A RetryAfter seen by another worker while this one waited pauses everyone
+            while self.paused_until > time.monotonic():
+                await asyncio.sleep(self.paused_until - time.monotonic())
+            await self.bucket.acquire()
+            
+            error = None
+            try:
+                success = await self.send(delivery)
+            except RetryAfter as e:
+                wait = retry_after_seconds(e)
+                self.retries += 1
+                self.paused_until = max(self.paused_until, time.monotonic() + wait)
+                attempts = self._attempts.get(chat_id, 0) + 1
+                
+                if attempts <= self.max_retries:
+                    logger.warning(f"Telegram asked to retry after {wait:.0f} s (chat {chat_id}, attempt {attempts})")
+                    self._attempts[chat_id] = attempts
+                    await self._release_chat(chat_id, self.paused_until)
+                    continue
+                
+                logger.error(f"Giving up on a message to chat {chat_id} after {attempts} RetryAfter responses")
+                success, error = False, e
+            except Exception as e:
+                logger.error(f"Error sending to chat {chat_id}: {e}")
+                success, error = False, e
+            
+            queue.popleft()
+            self._attempts.pop(chat_id, None)
+            self._remaining -= 1
+            
+            callback = self.on_sent if success else self.on_failed
+            if success:
+                self.sent += 1
+            else:
+                self.failed += 1
+            if callback is not None:
+                try:
+                    await (callback(delivery) if success else callback(delivery, error))
+                except Exception as e:
+                    logger.error(f"Error handling the result of a send to chat {chat_id}: {e}")
+            
+            ready_at = self.chat_ready[chat_id] = time.monotonic() + self.chat_interval
+            await self._release_chat(chat_id, ready_at)
@@ -0,0 +1,172 @@
+import functools
+import re
+from typing import NamedTuple
+
+from src.text import normalize_text
+
+# Fields a term can be restricted to with "field:term"; a bare term searches title, company and location
+FILTER_FIELDS = ("title", "company", "location", "source", "category")
+MAX_EXPRESSION_LENGTH = 500
+
+# Backticks are never part of a term, so expressions can be echoed back inside Markdown code spans
+TOKEN_PATTERN = re.compile(r'\s*(?:(\()|(\))|(?:(\w+):)?(?:"([^"`]*)"|([^\s()"`]+)))')
+FIELD_WITHOUT_TERM = re.compile(r'(\w+):')
+OPERATORS = {"AND", "OR", "NOT"}
+
+class FilterExpressionError(ValueError):
+    """Raised for filter expressions that cannot be parsed"""
+
+class JobFields(NamedTuple):
+    """Normalized job fields a compiled filter expression is evaluated against"""
+    title: str
+    company: str
+    location: str
+    source: str
+    category: str
+    text: str
+
+def job_fields(job):
+    """Normalize a JobRecord's searchable fields once, for any number of expressions"""
+    title = job.title_normalized or normalize_text(job.title)
+    company = normalize_text(job.company)
+    location = normalize_text(job.location)
+    return JobFields(
+        title=title,
+        company=company,
+        location=location,
+        source=normalize_text(job.source),
+        category=normalize_text(job.category_name),
+        text=f"{title} | {company} | {location}"
+    )
+
+def tokenize(expression):
+    """Split an expression into ("(" | ")" | "op" | "term", value, field) tokens"""
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    
+    while position < len(expression):
+        match = TOKEN_PATTERN.match(expression, position)
+        if not match or match.end() == position:
+            position += len(expression[position:]) - len(expression[position:].lstrip())
+            raise FilterExpressionError(f"Unexpected character at position {position + 1}: {expression[position]!r}")
+        position = match.end()
+        
+        open_paren, close_paren, field, phrase, word = match.groups()
+        if open_paren:
+            tokens.append(("(", None, None))
+        elif close_paren:
+            tokens.append((")", None, None))
+        elif field is None and phrase is None and word.upper() in OPERATORS:
+            tokens.append(("op", word.upper(), None))
+        elif field is None and phrase is None and FIELD_WITHOUT_TERM.fullmatch(word):
+            # "title:" followed by a space or a group would otherwise be read as the word "title"
+            raise FilterExpressionError(
+                f"'{word}' needs a term right after it, e.g. {word}python; "
+                f"to search a field for several terms, repeat it: {word}a OR {word}b"
+            )
+        else:
+            if field is not None and field.lower() not in FILTER_FIELDS:
+                raise FilterExpressionError(
+                    f"Unknown field '{field}'. Supported fields: {', '.join(FILTER_FIELDS)}"
+                )
+            tokens.append(("term", phrase if phrase is not None else word, field.lower() if field else None))
+    
+    return tokens
+
+class _Parser:
+    """Recursive-descent parser; NOT binds tighter than AND, AND tighter than OR
+    
+    Adjacent terms are ANDed, so "python NOT senior" means python AND NOT senior.
+    """
+    
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+    
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None, None)
+    
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+    
+    def parse(self):
+        if not self.tokens:
+            raise FilterExpressionError("The expression is empty")
+        node = self.parse_or()
+        if self.position < len(self.tokens):
+            raise FilterExpressionError("Unbalanced ')' in the expression")
+        return node
+    
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek()[:2] == ("op", "OR"):
+            self.take()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+    
+    def parse_and(self):
+        nodes = [self.parse_not()]
+        while True:
+            kind, value, _ = self.peek()
+            if kind == "op" and value == "AND":
+                self.take()
+            elif kind is None or kind == ")" or (kind == "op" and value == "OR"):
+                break
+            nodes.append(self.parse_not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+    
+    def parse_not(self):
+        if self.peek()[:2] == ("op", "NOT"):
+            self.take()
+            return ("not", self.parse_not())
+        return self.parse_primary()
+    
+    def parse_primary(self):
+        kind, value, field = self.take()
+        if kind == "(":
+            node = self.parse_or()
+            if self.take()[0] != ")":
+                raise FilterExpressionError("Missing ')' in the expression")
+            return node
+        if kind == "term":
+            needle = normalize_text(value)
+            if not needle:
+                raise FilterExpressionError(f"'{value}' has no letters or digits to match")
+            return ("term", needle, field or "text")
+        if kind is None:
+            raise FilterExpressionError("The expression ends unexpectedly")
+        raise FilterExpressionError(f"Unexpected '{value or kind}' in the expression")
+
+def parse_filter_expression(expression):
+    """Parse an expression into a tree of ("and"|"or", [nodes]), ("not", node) and ("term", needle, field)"""
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise FilterExpressionError(f"The expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    return _Parser(tokenize(expression)).parse()
+
+def _compile(node):
+    """Turn a parse tree into nested closures over JobFields"""
+    kind = node[0]
+    if kind == "term":
+        _, needle, field = node
+        index = JobFields._fields.index(field)
+        return lambda fields: needle in fields[index]
+    if kind == "not":
+        inner = _compile(node[1])
+        return lambda fields: not inner(fields)
+    
+    predicates = tuple(_compile(child) for child in node[1])
+    if kind == "and":
+        return lambda fields: all(predicate(fields) for predicate in predicates)
+    return lambda fields: any(predicate(fields) for predicate in predicates)
+
+@functools.lru_cache(maxsize=4096)
+def compile_filter_expression(expression):
+    """Compile an expression to a predicate taking JobFields
+    
+    Compiled predicates are cached by expression text, so users sharing an
+    expression share one predicate and it is only recompiled when edited.
+    """
+    return _compile(parse_filter_expression(expression))
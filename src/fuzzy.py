@@ -0,0 +1,84 @@
+from collections import Counter, defaultdict
+
+from src.cache import LRUCache
+from src.config import FUZZY_MATCH_THRESHOLD, FUZZY_MAX_CANDIDATES, FUZZY_CACHE_SIZE
+
+# Only this many words of a title are looked at, so the cost per job is bounded
+MAX_TITLE_WORDS = 32
+
+def trigrams(word):
+    """Trigrams of a word, padded like pg_trgm so short words and word starts count"""
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def similarity(left, right):
+    """Trigram similarity (shared / total distinct trigrams) of two trigram sets"""
+    if not left or not right:
+        return 0.0
+    shared = len(left & right)
+    return shared / (len(left) + len(right) - shared)
+
+class FuzzyKeywordMatcher:
+    """Typo-tolerant matching of keywords against normalized job titles
+    
+    Keyword words are held in a trigram index. Each title word probes it,
+    takes the FUZZY_MAX_CANDIDATES keyword words sharing the most trigrams,
+    and keeps those whose similarity reaches the threshold. Results are
+    cached per title word, since titles repeat the same vocabulary.
+    """
+    
+    def __init__(self, keywords=(), threshold=FUZZY_MATCH_THRESHOLD, max_candidates=FUZZY_MAX_CANDIDATES,
+                 cache_size=FUZZY_CACHE_SIZE):
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        self.word_cache = LRUCache(cache_size)
+        
+        self.keyword_words = {keyword: tuple(keyword.split()) for keyword in keywords}
+        self.word_trigrams = {}
+        self.trigram_words = defaultdict(set)
+        for words in self.keyword_words.values():
+            for word in words:
+                if word not in self.word_trigrams:
+                    self.word_trigrams[word] = trigrams(word)
+                    for trigram in self.word_trigrams[word]:
+                        self.trigram_words[trigram].add(word)
+    
+    def rank(self, title_word):
+        """Keyword words similar to a title word, best first, as (word, similarity) pairs"""
+        title_trigrams = trigrams(title_word)
+        shared = Counter()
+        for trigram in title_trigrams:
+            shared.update(self.trigram_words.get(trigram, ()))
+        
+        ranked = []
+        for word, _ in shared.most_common(self.max_candidates):
+            score = similarity(title_trigrams, self.word_trigrams[word])
+            if score >= self.threshold:
+                ranked.append((word, score))
+        
+        ranked.sort(key=lambda pair: pair[1], reverse=True)
+        return ranked
+    
+    def similar_words(self, title_word):
+        """Cached set of keyword words that a title word fuzzily matches"""
+        words = self.word_cache.get(title_word)
+        if words is None:
+            words = frozenset(word for word, _ in self.rank(title_word))
+            self.word_cache.set(title_word, words)
+        return words
+    
+    def search(self, title_normalized):
+        """Return the keywords all of whose words fuzzily occur in the title"""
+        if not self.keyword_words or not title_normalized:
+            return set()
+        
+        matched_words = set()
+        for title_word in title_normalized.split()[:MAX_TITLE_WORDS]:
+            matched_words.update(self.similar_words(title_word))
+        
+        if not matched_words:
+            return set()
+        return {
+            keyword for keyword, words in self.keyword_words.items()
+            if all(word in matched_words for word in words)
+        }
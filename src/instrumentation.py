@@ -0,0 +1,159 @@
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import event
+
+from src.config import QUERY_STATS_ENABLED, SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_LOG_FILE
+from src.metrics import Histogram
+from src.models import engine
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("jobbot.slow_queries")
+
+# Name of the instrumented method currently running in this thread/task
+current_method = contextvars.ContextVar("current_method", default=None)
+
+class MethodStats:
+    """Statement latency and row counts attributed to one DatabaseManager method
+    
+    Rows only count statements whose driver reports a row count (sqlite gives
+    -1 for SELECTs), so `rows` stays None for a method that only reads.
+    """
+    
+    def __init__(self):
+        self.latency = Histogram()
+        self.statements = 0
+        self.failed = 0
+        self.rows = None
+
+class QueryStats:
+    """Collects per-method statement timings and writes slow statements to the slow-query log"""
+    
+    def __init__(self, slow_threshold_ms=SLOW_QUERY_THRESHOLD_MS):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.methods = defaultdict(MethodStats)
+        self._lock = threading.Lock()
+        self._installed = False
+    
+    def install(self, engine):
+        """Attach the timing hooks to an engine (once)"""
+        if self._installed:
+            return
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+        self._installed = True
+        
+        if SLOW_QUERY_LOG_FILE:
+            # The file is only created once a slow query is actually logged
+            log_dir = os.path.dirname(SLOW_QUERY_LOG_FILE)
+            if log_dir:
+                os.makedirs(log_dir, exist_ok=True)
+            handler = logging.FileHandler(SLOW_QUERY_LOG_FILE, delay=True)
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+            slow_query_logger.addHandler(handler)
+    
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+    
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_start_time"].pop()) * 1000
+        method = current_method.get() or "<unattributed>"
+        
+        with self._lock:
+            stats = self.methods[method]
+            stats.statements += 1
+            if cursor.rowcount >= 0:
+                stats.rows = (stats.rows or 0) + cursor.rowcount
+        stats.latency.observe(elapsed_ms)
+        
+        if elapsed_ms >= self.slow_threshold_ms:
+            self._log_slow_query(conn, method, statement, parameters, executemany, elapsed_ms)
+    
+    def _handle_error(self, exception_context):
+        """Drop the start time of a statement that failed, so it is not left behind on the connection"""
+        conn = exception_context.connection
+        if conn is None or not conn.info.get("query_start_time"):
+            return
+        conn.info["query_start_time"].pop()
+        method = current_method.get() or "<unattributed>"
+        with self._lock:
+            self.methods[method].failed += 1
+    
+    def _log_slow_query(self, conn, method, statement, parameters, executemany, elapsed_ms):
+        """Write a slow statement and its query plan to the slow-query log"""
+        plan = ""
+        if conn.dialect.name == 'sqlite' and not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT")):
+            try:
+                rows = conn.connection.driver_connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+                plan = "\n".join(f"    {row[-1]}" for row in rows)
+            except Exception as e:
+                plan = f"    (query plan unavailable: {e})"
+        
+        slow_query_logger.warning(
+            f"Slow query in {method}: {elapsed_ms:.1f} ms\n{statement}\nParameters: {parameters}\n{plan}"
+        )
+    
+    def report(self, reset=False):
+        """Return per-method statistics, slowest p95 first"""
+        with self._lock:
+            methods = dict(self.methods)
+            if reset:
+                self.methods = defaultdict(MethodStats)
+        
+        report = []
+        for method, stats in methods.items():
+            summary = stats.latency.summary()
+            summary.update(method=method, statements=stats.statements, failed=stats.failed, rows=stats.rows)
+            report.append(summary)
+        return sorted(report, key=lambda entry: entry['p95'], reverse=True)
+    
+    def log_report(self, reset=False):
+        """Log per-method query statistics"""
+        for entry in self.report(reset=reset):
+            rows = f", {entry['rows']} rows" if entry['rows'] is not None else ""
+            failed = f", {entry['failed']} failed" if entry['failed'] else ""
+            logger.info(
+                f"DB {entry['method']}: {entry['statements']} statements{failed}{rows}, "
+                f"mean {entry['mean']:.1f} ms, p50 {entry['p50']:.1f} ms, p95 {entry['p95']:.1f} ms, "
+                f"p99 {entry['p99']:.1f} ms, max {entry['max']:.1f} ms"
+            )
+
+query_stats = QueryStats()
+
+def instrument_methods(cls):
+    """Class decorator attributing every statement run by a public method to that method
+    
+    When QUERY_STATS_ENABLED is off the class is returned untouched, so the
+    feature costs nothing in production.
+    """
+    if not QUERY_STATS_ENABLED:
+        return cls
+    
+    query_stats.install(engine)
+    
+    for name, attribute in list(vars(cls).items()):
+        if name.startswith('_') or not callable(attribute):
+            continue
+        setattr(cls, name, _attributed(f"{cls.__name__}.{name}", attribute))
+    return cls
+
+def _attributed(method_name, method):
+    """Wrap a method so statements it runs are attributed to it"""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        token = current_method.set(method_name)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            current_method.reset(token)
+    return wrapper
@@ -0,0 +1,96 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import NamedTuple
+
+from src.metrics import Histogram
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Stages a job alert passes through, in order; "posted" is the site's own posting
+# date, where the scraper found one
+STAGES = ("posted", "fetched", "parsed", "stored", "matched", "enqueued", "sent")
+
+# Alert latencies run from milliseconds for one stage to hours for a job waiting out
+# a user's backoff, so these buckets are in seconds
+LATENCY_BUCKETS_S = (
+    0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 21600, 86400
+)
+
+class AlertStamps(NamedTuple):
+    """When a notification's job passed each stage before sending; None where unknown"""
+    source: str
+    posted_at: object
+    fetched_at: object
+    parsed_at: object
+    stored_at: object
+    matched_at: object
+    enqueued_at: object
+
+def _histogram():
+    return Histogram(LATENCY_BUCKETS_S)
+
+class AlertLatency:
+    """Latency histograms for sent notifications, per stage transition and per source end to end
+    
+    A stage missing from the stamps (jobs stored before stamping existed) is
+    skipped, so the transition is measured from the last stage that is known.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = defaultdict(_histogram)
+        self.sources = defaultdict(_histogram)
+    
+    def observe(self, stamps, sent_at):
+        """Record one sent notification"""
+        times = [(stage, at) for stage, at in zip(STAGES, (*stamps[1:], sent_at)) if at is not None]
+        if len(times) < 2:
+            return
+        
+        with self._lock:
+            for (start_stage, start), (end_stage, end) in zip(times, times[1:]):
+                self.stages[f"{start_stage} → {end_stage}"].observe(max(0.0, (end - start).total_seconds()))
+            total = max(0.0, (sent_at - times[0][1]).total_seconds())
+            self.sources[stamps.source].observe(total)
+            self.sources["all sources"].observe(total)
+    
+    def report(self, reset=False):
+        """Return percentile summaries per stage transition (in pipeline order) and per source"""
+        with self._lock:
+            stages, sources = self.stages, self.sources
+            if reset:
+                self.stages = defaultdict(_histogram)
+                self.sources = defaultdict(_histogram)
+        
+        order = {stage: index for index, stage in enumerate(STAGES)}
+        return {
+            'stages': {
+                name: histogram.summary()
+                for name, histogram in sorted(stages.items(), key=lambda item: order[item[0].split(" → ")[0]])
+            },
+            'sources': {name: histogram.summary() for name, histogram in sorted(sources.items())}
+        }
+    
+    def log_report(self, reset=True):
+        """Log p50/p95/p99 per stage and per source; by default each report covers the time since the last"""
+        report = self.report(reset)
+        if not report['sources']:
+            return
+        
+        lines = ["Alert latency in seconds (p50 / p95 / p99, max):"]
+        for section in ('stages', 'sources'):
+            for name, summary in report[section].items():
+                lines.append(
+                    f"  {name:22} {summary['count']:6} alerts  "
+                    f"{summary['p50']:7g} / {summary['p95']:7g} / {summary['p99']:7g}, max {summary['max']:.1f}"
+                )
+        logger.info("\n".join(lines))
+
+# Shared by everything that sends notifications in this process
+alert_latency = AlertLatency()
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import time
+
+from src.config import LOOP_LAG_SAMPLE_INTERVAL, LOOP_LAG_REPORT_INTERVAL
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class EventLoopLagMonitor:
+    """Measures how late the event loop wakes up a sleeping task
+    
+    Any handler that blocks the loop delays the wake-up, so the lag is a direct
+    measure of how long other users had to wait.
+    """
+    
+    def __init__(self, sample_interval=LOOP_LAG_SAMPLE_INTERVAL, report_interval=LOOP_LAG_REPORT_INTERVAL):
+        self.sample_interval = sample_interval
+        self.report_interval = report_interval
+        self.samples = []
+        self._task = None
+    
+    def start(self):
+        """Start sampling on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        """Stop sampling"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        """Sample loop lag until cancelled, logging a summary every report interval"""
+        last_report = time.monotonic()
+        
+        while True:
+            expected = time.monotonic() + self.sample_interval
+            await asyncio.sleep(self.sample_interval)
+            self.samples.append(max(0.0, time.monotonic() - expected))
+            
+            if time.monotonic() - last_report >= self.report_interval:
+                self.log_report()
+                last_report = time.monotonic()
+    
+    def summary(self, reset=False):
+        """Return lag statistics in milliseconds"""
+        samples = sorted(self.samples)
+        if reset:
+            self.samples = []
+        
+        if not samples:
+            return {'samples': 0, 'avg_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+        
+        return {
+            'samples': len(samples),
+            'avg_ms': sum(samples) / len(samples) * 1000,
+            'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+            'max_ms': samples[-1] * 1000
+        }
+    
+    def log_report(self):
+        """Log and reset the lag statistics"""
+        stats = self.summary(reset=True)
+        logger.info(
+            f"Event loop lag over {stats['samples']} samples: "
+            f"avg {stats['avg_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms, max {stats['max_ms']:.1f} ms"
+        )
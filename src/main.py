@@ -1,14 +1,20 @@
 import asyncio
+import functools
 import logging
-import schedule
-import time
-import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-from src.scrapers import get_all_jobs
-from src.db_manager import DatabaseManager
+from telegram.ext import ContextTypes
+
+from src.scrapers import get_scrapers, run_scraper
+from src.retention import RetentionManager
+from src.backup import BackupManager
 from src.bot import get_bot
-from src.config import SCRAPING_INTERVAL
+from src.instrumentation import query_stats
+from src.config import (
+    QUERY_STATS_ENABLED, SCRAPING_INTERVAL, JOB_RETENTION_DAYS, RETENTION_INTERVAL_HOURS, BACKUP_INTERVAL_HOURS,
+    SUBSCRIPTION_CHECK_INTERVAL, SCRAPER_EXECUTOR_WORKERS, MAINTENANCE_EXECUTOR_WORKERS
+)
 
 # Set up logging
 logging.basicConfig(
@@ -18,67 +24,105 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Global variables
-db_manager = DatabaseManager()
 bot = get_bot()
-last_scrape_time = None
+db_manager = bot.db_manager  # Shared with the bot so both see one filter cache
+retention_manager = RetentionManager()
+backup_manager = BackupManager()
+
+# Blocking work runs on bounded pools, never on the event loop; database calls from
+# handlers and scheduled jobs alike go through the bot's own database executor
+scrape_executor = ThreadPoolExecutor(max_workers=SCRAPER_EXECUTOR_WORKERS, thread_name_prefix="scrape")
+maintenance_executor = ThreadPoolExecutor(max_workers=MAINTENANCE_EXECUTOR_WORKERS, thread_name_prefix="maintenance")
+
+async def run_blocking(executor, function, *args):
+    """Run a blocking function on one of the executors"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(function, *args))
 
-async def scrape_and_notify():
+async def scrape_jobs():
+    """Scrape all websites, up to SCRAPER_EXECUTOR_WORKERS at a time"""
+    results = await asyncio.gather(*(run_blocking(scrape_executor, run_scraper, scraper) for scraper in get_scrapers()))
+    jobs = [job for site_jobs in results for job in site_jobs]
+    logger.info(f"Total jobs scraped: {len(jobs)}")
+    return jobs
+
+async def scrape_and_notify(context: ContextTypes.DEFAULT_TYPE = None):
     """Scrape jobs and notify users about new ones"""
-    global last_scrape_time
-    
     current_time = datetime.utcnow()
     logger.info(f"Starting job scraping at {current_time}")
     
     # Scrape jobs from all websites
-    jobs = get_all_jobs()
+    jobs = await scrape_jobs()
     
     # Add jobs to database
-    new_jobs_count = db_manager.add_jobs(jobs)
+    new_jobs_count = await bot.db.add_jobs(jobs)
     logger.info(f"Added {new_jobs_count} new jobs to database")
     
-    # Notify users about new jobs
-    if new_jobs_count > 0:
-        await bot.notify_users_about_new_jobs(jobs, last_scrape_time)
+    # Notify users about new jobs; this runs every cycle so deliveries interrupted by a
+    # failure or restart are picked up again from the notification ledger
+    await bot.notify_users_about_new_jobs()
     
-    # Update last scrape time
-    last_scrape_time = current_time
+    cache_stats = db_manager.filter_cache.stats()
+    logger.info(
+        f"Filter cache: {cache_stats['size']}/{cache_stats['maxsize']} users, "
+        f"{cache_stats['hits']} hits, {cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%} hit rate)"
+    )
+    if QUERY_STATS_ENABLED:
+        query_stats.log_report()
     logger.info(f"Job scraping completed at {datetime.utcnow()}")
 
-def run_scraper():
-    """Run the scraper in the event loop"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(scrape_and_notify())
-    loop.close()
+async def verify_subscriptions(context: ContextTypes.DEFAULT_TYPE):
+    """Catch any drift between the in-memory subscription index and the database"""
+    await run_blocking(maintenance_executor, db_manager.verify_subscription_index)
 
-def schedule_scraper():
-    """Schedule the scraper to run at regular intervals"""
-    # Run immediately on startup
-    threading.Thread(target=run_scraper).start()
+async def archive_old_jobs(context: ContextTypes.DEFAULT_TYPE):
+    """Archive old jobs so the jobs table stays small"""
+    await run_blocking(maintenance_executor, retention_manager.run)
+
+async def back_up_database(context: ContextTypes.DEFAULT_TYPE):
+    """Take an online backup without stopping the bot"""
+    await run_blocking(maintenance_executor, backup_manager.run)
+
+def schedule_jobs(application):
+    """Schedule scraping and maintenance on the bot application's job queue
+    
+    Every job runs on the application's event loop; a job still running when
+    its next run is due is skipped rather than started twice.
+    """
+    job_queue = application.job_queue
+    # Run right after startup, then every SCRAPING_INTERVAL minutes; a first run time that has
+    # already passed when the scheduler starts would be pushed back a whole interval
+    job_queue.run_repeating(scrape_and_notify, interval=SCRAPING_INTERVAL * 60, first=1, name="scrape_and_notify")
+    logger.info(f"Scheduled job scraping every {SCRAPING_INTERVAL} minutes")
     
-    # Schedule to run every SCRAPING_INTERVAL minutes
-    schedule.every(SCRAPING_INTERVAL).minutes.do(
-        lambda: threading.Thread(target=run_scraper).start()
+    job_queue.run_repeating(
+        verify_subscriptions, interval=SUBSCRIPTION_CHECK_INTERVAL * 60, name="verify_subscriptions"
     )
     
-    logger.info(f"Scheduled job scraping every {SCRAPING_INTERVAL} minutes")
+    if JOB_RETENTION_DAYS > 0:
+        job_queue.run_repeating(archive_old_jobs, interval=RETENTION_INTERVAL_HOURS * 3600, name="archive_old_jobs")
+        logger.info(f"Scheduled job archiving every {RETENTION_INTERVAL_HOURS} hours (retention {JOB_RETENTION_DAYS} days)")
     
-    # Run the scheduler in a loop
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    if BACKUP_INTERVAL_HOURS > 0:
+        job_queue.run_repeating(back_up_database, interval=BACKUP_INTERVAL_HOURS * 3600, name="back_up_database")
+        logger.info(f"Scheduled database backups every {BACKUP_INTERVAL_HOURS} hours")
 
 def main():
-    """Main function to run the bot and scheduler"""
+    """Main function to run the bot and its scheduled jobs on one event loop"""
     logger.info("Starting Job Posting Bot")
     
-    # Start the scheduler in a separate thread
-    scheduler_thread = threading.Thread(target=schedule_scraper)
-    scheduler_thread.daemon = True
-    scheduler_thread.start()
+    # Load the subscription index once; filter changes keep it up to date from here on
+    db_manager.get_subscription_index()
+    
+    # Scheduled as the application starts, so the first scrape runs right away
+    bot.on_startup(schedule_jobs)
     
-    # Run the bot
-    bot.run()
+    # Run the bot; the job queue starts and stops with the application
+    try:
+        bot.run()
+    finally:
+        scrape_executor.shutdown(wait=False, cancel_futures=True)
+        maintenance_executor.shutdown(wait=True)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,318 @@
+import logging
+import threading
+from collections import defaultdict, deque
+
+from src.filter_expr import FilterExpressionError, compile_filter_expression, job_fields
+from src.fuzzy import FuzzyKeywordMatcher
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton finding every keyword occurring in a text in one pass"""
+    
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        
+        for index, keyword in enumerate(self.keywords):
+            self._add(keyword, index)
+        self._build_failure_links()
+    
+    def _add(self, keyword, index):
+        """Insert a keyword into the trie"""
+        state = 0
+        for char in keyword:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(index)
+    
+    def _build_failure_links(self):
+        """Breadth-first pass linking each state to its longest proper suffix state"""
+        queue = deque(self.goto[0].values())
+        
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                
+                # Inherit matches that end at the suffix state
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+    
+    def search(self, text):
+        """Return the indexes of all keywords that occur in text"""
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        
+        return found
+
+class SubscriptionIndex:
+    """Incrementally maintained index of active subscriptions for job-centric matching
+    
+    Keeps the user -> subscription map and the filter -> users maps
+    (keyword -> users, category -> users without keywords, unfiltered users)
+    up to date one user at a time. The keyword automaton and the fuzzy
+    keyword matcher are rebuilt lazily, only when the set of distinct
+    keywords changes, so each job title is still scanned once per cycle.
+    Fuzzy keywords are indexed in both, since an exact occurrence always
+    counts as a match. Filter expressions are compiled when a subscription is
+    indexed and applied on top of the other filters, each distinct
+    expression evaluated at most once per job.
+    
+    Category-only subscribers are looked up per job in the category -> users
+    dict on purpose: a NumPy bitset matrix was slower at every size
+    benchmarks/bench_category_matching.py tried, because turning the match
+    matrix back into (user, job) pairs costs more than the lookups it saves.
+    """
+    
+    def __init__(self, subscriptions=()):
+        self._lock = threading.RLock()
+        self.load(subscriptions)
+    
+    def load(self, subscriptions):
+        """Replace the whole index with a fresh snapshot"""
+        with self._lock:
+            self.subscriptions = {}         # user_id -> Subscription
+            self.keyword_users = {}         # keyword -> user_ids (exact and fuzzy)
+            self.fuzzy_keyword_users = {}   # fuzzy keyword -> user_ids
+            self.category_only_users = {}   # category_id -> user_ids without keywords
+            self.unfiltered_users = set()   # users without any filters get every job
+            self.expressions = {}           # user_id -> compiled filter expression
+            self._automaton = None
+            self._automaton_keywords = []
+            self._fuzzy_matcher = None
+            self.version = 0                # Bumped by every change, see DatabaseManager.verify_subscription_index
+            
+            for subscription in subscriptions:
+                self._add(subscription)
+    
+    def _add(self, subscription):
+        """Index a subscription"""
+        user_id = subscription.user_id
+        self.subscriptions[user_id] = subscription
+        
+        if subscription.filter_expression:
+            try:
+                self.expressions[user_id] = compile_filter_expression(subscription.filter_expression)
+            except FilterExpressionError as e:
+                logger.error(f"Ignoring invalid filter expression of user {user_id}: {e}")
+        
+        if subscription.keywords or subscription.fuzzy_keywords:
+            for keyword in subscription.keywords + subscription.fuzzy_keywords:
+                if keyword not in self.keyword_users:
+                    self.keyword_users[keyword] = set()
+                    self._automaton = None
+                self.keyword_users[keyword].add(user_id)
+            for keyword in subscription.fuzzy_keywords:
+                if keyword not in self.fuzzy_keyword_users:
+                    self.fuzzy_keyword_users[keyword] = set()
+                    self._fuzzy_matcher = None
+                self.fuzzy_keyword_users[keyword].add(user_id)
+        elif subscription.category_ids:
+            for category_id in subscription.category_ids:
+                self.category_only_users.setdefault(category_id, set()).add(user_id)
+        else:
+            self.unfiltered_users.add(user_id)
+    
+    def _remove(self, user_id):
+        """Drop a user's subscription from every map"""
+        subscription = self.subscriptions.pop(user_id, None)
+        if subscription is None:
+            return
+        
+        for keyword in subscription.keywords + subscription.fuzzy_keywords:
+            users = self.keyword_users.get(keyword)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self.keyword_users[keyword]
+                    self._automaton = None
+        for keyword in subscription.fuzzy_keywords:
+            users = self.fuzzy_keyword_users.get(keyword)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self.fuzzy_keyword_users[keyword]
+                    self._fuzzy_matcher = None
+        for category_id in subscription.category_ids:
+            users = self.category_only_users.get(category_id)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self.category_only_users[category_id]
+        self.unfiltered_users.discard(user_id)
+        self.expressions.pop(user_id, None)
+    
+    def upsert(self, subscription):
+        """Add or replace a user's subscription"""
+        with self._lock:
+            self._remove(subscription.user_id)
+            self._add(subscription)
+            self.version += 1
+    
+    def remove(self, user_id):
+        """Remove a user, e.g. when they pause notifications"""
+        with self._lock:
+            self._remove(user_id)
+            self.version += 1
+    
+    def snapshot(self):
+        """Comparable view of the indexed subscriptions, for consistency checks"""
+        with self._lock:
+            return {subscription_key(subscription) for subscription in self.subscriptions.values()}
+    
+    def __len__(self):
+        return len(self.subscriptions)
+    
+    @property
+    def automaton(self):
+        """Keyword automaton over the current distinct keywords, rebuilt only after they change"""
+        if self._automaton is None:
+            self._automaton_keywords = list(self.keyword_users)
+            self._automaton = KeywordAutomaton(self._automaton_keywords)
+        return self._automaton
+    
+    @property
+    def fuzzy_matcher(self):
+        """Trigram matcher over the current distinct fuzzy keywords, rebuilt only after they change"""
+        if self._fuzzy_matcher is None:
+            self._fuzzy_matcher = FuzzyKeywordMatcher(self.fuzzy_keyword_users)
+        return self._fuzzy_matcher
+    
+    def _keyword_users_for_job(self, job):
+        """Return the users with at least one keyword who match the job"""
+        subscriptions = self.subscriptions
+        title = job.title_normalized or ""
+        candidates = set()
+        
+        for keyword_index in self.automaton.search(title):
+            candidates.update(self.keyword_users[self._automaton_keywords[keyword_index]])
+        if self.fuzzy_keyword_users:
+            for keyword in self.fuzzy_matcher.search(title):
+                candidates.update(self.fuzzy_keyword_users[keyword])
+        
+        matched = set()
+        for user_id in candidates:
+            category_ids = subscriptions[user_id].category_ids
+            if not category_ids or job.category_id in category_ids:
+                matched.add(user_id)
+        
+        return matched
+    
+    def _apply_expressions(self, job, user_ids):
+        """Drop users whose filter expression rejects the job"""
+        expressions = self.expressions
+        if not expressions:
+            return user_ids
+        
+        fields = None
+        results = {}    # Users sharing an expression share its compiled predicate
+        accepted = set()
+        for user_id in user_ids:
+            predicate = expressions.get(user_id)
+            if predicate is not None:
+                result = results.get(predicate)
+                if result is None:
+                    if fields is None:
+                        fields = job_fields(job)
+                    result = results[predicate] = predicate(fields)
+                if not result:
+                    continue
+            accepted.add(user_id)
+        return accepted
+    
+    def users_for_job(self, job):
+        """Return the user IDs whose subscriptions the job matches"""
+        matched = self._keyword_users_for_job(job)
+        matched.update(self.unfiltered_users)
+        matched.update(self.category_only_users.get(job.category_id, ()))
+        return self._apply_expressions(job, matched)
+    
+    def match(self, jobs, sent_pairs=frozenset()):
+        """Return a dict of Subscription -> list of matching, undelivered jobs"""
+        matches = defaultdict(list)
+        
+        with self._lock:
+            for job in jobs:
+                for user_id in self.users_for_job(job):
+                    subscription = self.subscriptions[user_id]
+                    if is_deliverable(subscription, job, sent_pairs):
+                        matches[subscription].append(job)
+        
+        return matches
+
+def subscription_key(subscription):
+    """Order-insensitive identity of a subscription's filters"""
+    return (
+        subscription.user_id,
+        subscription.telegram_id,
+        subscription.category_ids,
+        frozenset(subscription.keywords),
+        frozenset(subscription.fuzzy_keywords),
+        subscription.filter_expression
+    )
+
+def job_matches_subscription(subscription, job, title_normalized, fuzzy_matches=frozenset()):
+    """Whether a job passes a subscription's category and keyword filters
+    
+    fuzzy_matches holds the fuzzy keywords a FuzzyKeywordMatcher found in the title.
+    """
+    if subscription.category_ids and job.category_id not in subscription.category_ids:
+        return False
+    keywords = subscription.keywords + subscription.fuzzy_keywords
+    if keywords and not (
+        any(keyword in title_normalized for keyword in keywords)
+        or any(keyword in fuzzy_matches for keyword in subscription.fuzzy_keywords)
+    ):
+        return False
+    if subscription.filter_expression:
+        try:
+            return compile_filter_expression(subscription.filter_expression)(job_fields(job))
+        except FilterExpressionError:
+            return True
+    return True
+
+def is_deliverable(subscription, job, sent_pairs):
+    """Whether a job is new to the user: scraped after they signed up and not in the ledger"""
+    if subscription.created_at and job.scraped_date and job.scraped_date < subscription.created_at:
+        return False
+    return (subscription.user_id, job.id) not in sent_pairs
+
+def match_jobs_per_user(subscriptions, jobs, sent_pairs=frozenset()):
+    """Reference user-centric matcher: test every job against every user's filters"""
+    fuzzy_matcher = FuzzyKeywordMatcher({keyword for subscription in subscriptions for keyword in subscription.fuzzy_keywords})
+    titles = [(job, job.title_normalized or "") for job in jobs]
+    titles = [(job, title_normalized, fuzzy_matcher.search(title_normalized)) for job, title_normalized in titles]
+    matches = defaultdict(list)
+    
+    for subscription in subscriptions:
+        for job, title_normalized, fuzzy_matches in titles:
+            if job_matches_subscription(subscription, job, title_normalized, fuzzy_matches) and is_deliverable(subscription, job, sent_pairs):
+                matches[subscription].append(job)
+    
+    return matches
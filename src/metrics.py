@@ -0,0 +1,57 @@
+import bisect
+import threading
+
+# Default latency bucket upper bounds in milliseconds
+DEFAULT_BUCKETS_MS = (
+    0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000
+)
+
+class Histogram:
+    """Fixed-bucket histogram with approximate percentiles and constant memory"""
+    
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot counts values above the largest bucket
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, value):
+        """Record one value"""
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+    
+    def percentile(self, fraction):
+        """Upper bound of the bucket containing the given percentile (0-1)"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            
+            rank = fraction * self.count
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                seen += bucket_count
+                if seen >= rank:
+                    # A bucket's upper bound can overshoot the largest value actually seen
+                    return min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+            return self.max
+    
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+    
+    def summary(self):
+        """Return count, mean, p50/p95/p99 and max"""
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': self.max
+        }
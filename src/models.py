@@ -1,11 +1,29 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Table, create_engine
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index, Table, UniqueConstraint, bindparam, create_engine, event, inspect, select, text, update
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import relationship, sessionmaker
 import datetime
-from src.config import DATABASE_URL
+import os
+from src.config import DATABASE_URL, ARCHIVE_DATABASE_PATH
+from src.text import normalize_text
 
 Base = declarative_base()
 
+def _archive_database_path():
+    """Location of the SQLite file that holds archived jobs, or None to keep them in the main database"""
+    url = make_url(DATABASE_URL)
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        return None
+    if ARCHIVE_DATABASE_PATH:
+        return ARCHIVE_DATABASE_PATH
+    
+    root, ext = os.path.splitext(url.database)
+    return f"{root}_archive{ext or '.db'}"
+
+# On SQLite the archive lives in its own file, attached to every connection as "archive"
+ARCHIVE_DB_PATH = _archive_database_path()
+ARCHIVE_SCHEMA = 'archive' if ARCHIVE_DB_PATH else None
+
 # Association table for many-to-many relationship between users and categories
 user_category = Table(
     'user_category', 
@@ -19,7 +37,9 @@ user_keyword = Table(
     'user_keyword',
     Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id')),
-    Column('keyword_id', Integer, ForeignKey('keywords.id'))
+    Column('keyword_id', Integer, ForeignKey('keywords.id')),
+    # Typo-tolerant filters match titles by trigram similarity instead of substring
+    Column('fuzzy', Boolean, nullable=False, default=False, server_default=text('false'))
 )
 
 class User(Base):
@@ -32,6 +52,21 @@ class User(Base):
     last_name = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Optional filter expression (see src/filter_expr.py), ANDed with the category and keyword filters
+    filter_expression = Column(String, nullable=True)
+    # Digest mode: up to digest_size jobs per message (0 sends one message per job),
+    # at most one digest every digest_interval_hours (0 means every cycle)
+    digest_size = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    digest_interval_hours = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    last_digest_at = Column(DateTime, nullable=True)
+    # Delivery health: failed sends in a row, the last error's class, the last successful
+    # send, and until when planning skips the user after transient failures
+    consecutive_failures = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    last_error_class = Column(String, nullable=True)
+    last_success_at = Column(DateTime, nullable=True)
+    backoff_until = Column(DateTime, nullable=True)
+    # Why an inactive user stopped receiving jobs: 'paused' (/pause) or 'unreachable' (the chat is gone)
+    deactivated_reason = Column(String, nullable=True)
     
     # Relationships
     categories = relationship("Category", secondary=user_category, back_populates="users")
@@ -58,6 +93,7 @@ class Keyword(Base):
     
     id = Column(Integer, primary_key=True)
     word = Column(String, unique=True, nullable=False)
+    normalized = Column(String, nullable=True, index=True)  # normalize_text(word), used for matching
     
     # Relationships
     users = relationship("User", secondary=user_keyword, back_populates="keywords")
@@ -70,15 +106,19 @@ class Job(Base):
     
     id = Column(Integer, primary_key=True)
     title = Column(String, nullable=False)
+    title_normalized = Column(String, nullable=True, index=True)  # normalize_text(title), used for matching
     company = Column(String, nullable=True)
     location = Column(String, nullable=True)
     description = Column(String, nullable=True)
-    url = Column(String, nullable=False)
+    url = Column(String, nullable=False, index=True)
     source = Column(String, nullable=False)  # Which website the job was scraped from
-    external_id = Column(String, nullable=True)  # ID from the original website if available
+    external_id = Column(String, nullable=True, index=True)  # ID from the original website if available
     posted_date = Column(DateTime, nullable=True)
-    scraped_date = Column(DateTime, default=datetime.datetime.utcnow)
+    scraped_date = Column(DateTime, default=datetime.datetime.utcnow, index=True)
     category_id = Column(Integer, ForeignKey('categories.id'), nullable=True)
+    # When the listing page was fetched and parsed; scraped_date is when the job was stored
+    fetched_at = Column(DateTime, nullable=True)
+    parsed_at = Column(DateTime, nullable=True)
     
     # Relationships
     category = relationship("Category", back_populates="jobs")
@@ -86,13 +126,238 @@ class Job(Base):
     def __repr__(self):
         return f"<Job(title={self.title}, company={self.company}, source={self.source})>"
 
+class SentNotification(Base):
+    """Ledger of jobs handed to a user's outbox, so each pair is queued (and sent) at most once"""
+    __tablename__ = 'sent_notifications'
+    __table_args__ = (
+        UniqueConstraint('user_id', 'job_id', name='uq_sent_notifications_user_job'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    job_id = Column(Integer, ForeignKey('jobs.id'), nullable=False, index=True)
+    sent_at = Column(DateTime, default=datetime.datetime.utcnow)  # When the job was matched and queued
+    delivered_at = Column(DateTime, nullable=True)                # When Telegram accepted the message
+    
+    def __repr__(self):
+        return f"<SentNotification(user_id={self.user_id}, job_id={self.job_id})>"
+
+class OutboxEntry(Base):
+    """A notification waiting to be sent: one job, or a digest of several
+    
+    Entries are written together with their ledger rows and deleted once sent,
+    so the table only holds pending and dead-lettered notifications.
+    """
+    __tablename__ = 'outbox'
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    chat_id = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)               # 'job' or 'digest'
+    job_ids = Column(String, nullable=False)            # Comma-separated job IDs
+    text = Column(String, nullable=True)                # Digest text, rendered when enqueued
+    status = Column(String, nullable=False, default='pending')  # 'pending' or 'dead'
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)   # When the entry was enqueued
+    matched_at = Column(DateTime, nullable=True)                      # When planning matched the jobs
+    next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow)
+    claimed_by = Column(String, nullable=True)          # Sender that loaded the entry, until claimed_until
+    claimed_until = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index('ix_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    def __repr__(self):
+        return f"<OutboxEntry(user_id={self.user_id}, kind={self.kind}, status={self.status})>"
+
+class DeliveryLease(Base):
+    """Which delivery worker owns an outbox partition, and until when"""
+    __tablename__ = 'delivery_leases'
+    
+    partition = Column(Integer, primary_key=True)
+    worker_id = Column(String, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<DeliveryLease(partition={self.partition}, worker_id={self.worker_id})>"
+
+class WorkerHeartbeat(Base):
+    """A delivery worker process and its last heartbeat"""
+    __tablename__ = 'delivery_workers'
+    
+    worker_id = Column(String, primary_key=True)
+    started_at = Column(DateTime, default=datetime.datetime.utcnow)
+    heartbeat_at = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<WorkerHeartbeat(worker_id={self.worker_id})>"
+
+class ArchivedJob(Base):
+    """Job posting moved out of the jobs table by the retention policy"""
+    __tablename__ = 'jobs_archive'
+    __table_args__ = {'schema': ARCHIVE_SCHEMA}
+    
+    id = Column(Integer, primary_key=True)  # Same ID the job had in the jobs table
+    title = Column(String, nullable=False)
+    company = Column(String, nullable=True)
+    location = Column(String, nullable=True)
+    description = Column(String, nullable=True)
+    url = Column(String, nullable=False, index=True)
+    source = Column(String, nullable=False)
+    external_id = Column(String, nullable=True, index=True)
+    posted_date = Column(DateTime, nullable=True)
+    scraped_date = Column(DateTime, nullable=True)
+    category_id = Column(Integer, nullable=True)
+    archived_at = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<ArchivedJob(title={self.title}, company={self.company}, source={self.source})>"
+
 # Create engine and session
 engine = create_engine(DATABASE_URL)
 Session = sessionmaker(bind=engine)
 
+if engine.dialect.name == 'sqlite':
+    @event.listens_for(engine, "connect")
+    def _configure_sqlite_connection(dbapi_connection, connection_record):
+        """Let readers and the writer work concurrently from the handler thread pool"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        if ARCHIVE_DB_PATH:
+            cursor.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_DB_PATH,))
+        cursor.close()
+
+# Full-text index that older versions kept on the jobs table; keyword matching is a
+# substring match on the normalized title, so the index only slowed down job writes
+# Full-text index over job postings (SQLite FTS5, external content on the jobs table). The
+# trigram tokenizer matches any substring of three or more characters, so indexed lookups
+# agree with the substring matching of the in-memory subscription index
+JOBS_FTS_TABLE = 'jobs_fts'
+JOBS_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE {JOBS_FTS_TABLE} USING fts5(
+        title_normalized, company, description,
+        content='jobs', content_rowid='id',
+        tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER jobs_fts_ai AFTER INSERT ON jobs BEGIN
+        INSERT INTO {JOBS_FTS_TABLE}(rowid, title_normalized, company, description)
+        VALUES (new.id, new.title_normalized, new.company, new.description);
+    END""",
+    f"""CREATE TRIGGER jobs_fts_ad AFTER DELETE ON jobs BEGIN
+        INSERT INTO {JOBS_FTS_TABLE}({JOBS_FTS_TABLE}, rowid, title_normalized, company, description)
+        VALUES ('delete', old.id, old.title_normalized, old.company, old.description);
+    END""",
+    f"""CREATE TRIGGER jobs_fts_au AFTER UPDATE ON jobs BEGIN
+        INSERT INTO {JOBS_FTS_TABLE}({JOBS_FTS_TABLE}, rowid, title_normalized, company, description)
+        VALUES ('delete', old.id, old.title_normalized, old.company, old.description);
+        INSERT INTO {JOBS_FTS_TABLE}(rowid, title_normalized, company, description)
+        VALUES (new.id, new.title_normalized, new.company, new.description);
+    END""",
+]
+
+JOBS_FTS_TRIGGERS = ['jobs_fts_ai', 'jobs_fts_ad', 'jobs_fts_au']
+
+# Shortest substring the trigram tokenizer can look up
+FTS_MIN_TERM_LENGTH = 3
+
+def fts_enabled():
+    """Whether the database supports the FTS5 job index (the trigram tokenizer needs SQLite 3.34)"""
+    return engine.dialect.name == 'sqlite' and engine.dialect.dbapi.sqlite_version_info >= (3, 34)
+
+def init_fts():
+    """Create the FTS5 job index and its sync triggers, (re)building it when its definition changed"""
+    if not fts_enabled():
+        return
+    
+    with engine.begin() as conn:
+        existing = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': JOBS_FTS_TABLE}
+        ).first()
+        
+        if existing and existing[0] == JOBS_FTS_DDL[0]:
+            return
+        
+        # Missing or created by an older version: recreate the table and triggers
+        for trigger in JOBS_FTS_TRIGGERS:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {JOBS_FTS_TABLE}"))
+        for ddl in JOBS_FTS_DDL:
+            conn.execute(text(ddl))
+        
+        # Index jobs that were stored before the FTS table existed
+        conn.execute(text(f"INSERT INTO {JOBS_FTS_TABLE}({JOBS_FTS_TABLE}) VALUES ('rebuild')"))
+
+def optimize_fts():
+    """Merge the FTS5 index segments, dropping the entries of deleted jobs"""
+    if not fts_enabled():
+        return
+    
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {JOBS_FTS_TABLE}({JOBS_FTS_TABLE}) VALUES ('optimize')"))
+
+def backfill_normalized_text(batch_size=1000):
+    """Fill normalized title/keyword columns for rows stored before they existed"""
+    for table, source, target in (
+        (Job.__table__, 'title', 'title_normalized'),
+        (Keyword.__table__, 'word', 'normalized'),
+    ):
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(
+                    select(table.c.id, table.c[source]).where(table.c[target].is_(None)).limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                conn.execute(
+                    update(table).where(table.c.id == bindparam('row_id')).values({target: bindparam('value')}),
+                    [{'row_id': row_id, 'value': normalize_text(value)} for row_id, value in rows]
+                )
+
+def init_auto_vacuum():
+    """Switch SQLite to incremental auto-vacuum so archived jobs actually shrink the file"""
+    if engine.dialect.name != 'sqlite':
+        return
+    
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.exec_driver_sql("PRAGMA main.auto_vacuum").scalar() == 2:
+            return
+        
+        # Once the file exists (opening it in WAL mode already writes the header) the new
+        # mode only takes effect through a VACUUM, which is instant on a new database
+        conn.exec_driver_sql("PRAGMA main.auto_vacuum = INCREMENTAL")
+        conn.exec_driver_sql("VACUUM main")
+
+def upgrade_schema():
+    """Add columns and indexes that are missing from tables created by older versions"""
+    inspector = inspect(engine)
+    
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ""
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}'))
+            
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
 def init_db():
     """Initialize the database by creating all tables"""
     Base.metadata.create_all(engine)
+    init_auto_vacuum()
+    upgrade_schema()
+    backfill_normalized_text()
+    init_fts()
 
 def get_session():
     """Get a new database session"""
@@ -0,0 +1,35 @@
+import random
+
+from telegram.error import BadRequest, Forbidden, InvalidToken
+
+from src.config import OUTBOX_BACKOFF_SECONDS, OUTBOX_MAX_BACKOFF_SECONDS, DELIVERY_PARTITIONS
+
+def is_transient_error(error):
+    """Whether a failed send is worth retrying
+    
+    Blocked bots, deleted chats and malformed messages fail the same way every
+    time; timeouts, connection errors and flood control usually pass. Unknown
+    errors (including a send that just returned False) are retried.
+    """
+    return not isinstance(error, (Forbidden, BadRequest, InvalidToken))
+
+def is_unreachable_chat(error):
+    """Whether a failed send means the chat is gone: the bot was blocked, or the user or chat deleted"""
+    if isinstance(error, Forbidden):
+        return True
+    return isinstance(error, BadRequest) and "chat not found" in str(error).lower()
+
+def backoff_delay(attempts, base=OUTBOX_BACKOFF_SECONDS, maximum=OUTBOX_MAX_BACKOFF_SECONDS):
+    """Seconds to wait before the next attempt: doubling per attempt, capped, with jitter"""
+    delay = min(maximum, base * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def encode_job_ids(job_ids):
+    return ",".join(str(job_id) for job_id in job_ids)
+
+def decode_job_ids(value):
+    return [int(job_id) for job_id in value.split(",") if job_id]
+
+def delivery_partition(chat_id, partitions=DELIVERY_PARTITIONS):
+    """Outbox partition a chat belongs to; every message to one chat goes through one worker"""
+    return abs(chat_id) % partitions
@@ -0,0 +1,91 @@
+from telegram.helpers import escape_markdown
+
+from src.cache import LRUCache
+from src.config import RENDER_CACHE_SIZE
+from src.digest import digest_line
+
+# Fun job-related emojis
+JOB_EMOJIS = ["💼", "👔", "🏢", "💻", "📊", "📈", "🔍", "🚀", "💡", "🌟", "✨", "🎯", "🏆"]
+
+# Fun motivational messages
+MOTIVATIONAL_MESSAGES = [
+    "Your dream job is just around the corner! 🌈",
+    "Success is loading... ⌛",
+    "You're going to crush that interview! 💪",
+    "Your skills are in high demand! 📈",
+    "The perfect job is searching for YOU! 🔍",
+    "Your career journey is about to level up! 🚀",
+    "Exciting opportunities await! ✨",
+    "Your professional adventure continues! 🌟",
+    "New job, new possibilities! 🎉",
+    "Your talent deserves recognition! 🏆"
+]
+
+def markdown_value(value, default="Not specified"):
+    """Escape scraped text shown outside any entity (legacy Markdown)"""
+    return escape_markdown(value, version=1) if value else default
+
+def markdown_bold(text):
+    """Text for inside *...*: legacy Markdown has no escapes within an entity, so "*" is dropped"""
+    return text.replace("*", "")
+
+def markdown_url(url):
+    """A URL for (...) in an inline link; a ")" would end the link early"""
+    return url.replace(")", "%29")
+
+def render_job_body(job):
+    """The part of a job notification that is the same for every recipient"""
+    return (
+        f"*{markdown_bold(job.title)}*\n\n"
+        f"*🏢 Company:* {markdown_value(job.company)}\n"
+        f"*📍 Location:* {markdown_value(job.location)}\n"
+        f"*🏷️ Category:* {markdown_value(job.category_name)}\n"
+        f"*🔍 Source:* {markdown_value(job.source)}\n\n"
+        f"[👉 View Full Job Details 👈]({markdown_url(job.url)})"
+    )
+
+class JobMessageRenderer:
+    """Renders and escapes each job's message body once and caches it by job ID
+    
+    Jobs are never edited after they are stored, so a cached body stays valid;
+    the cache is bounded so a long-running bot does not keep every job ever
+    sent. Per-recipient parts (the greeting emoji and closing line) are spliced
+    around the cached body.
+    """
+    
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        self.bodies = LRUCache(maxsize)
+        self.digest_lines = LRUCache(maxsize)
+        self.renders = 0
+    
+    def body(self, job):
+        """Cached message body for a job"""
+        body = self.bodies.get(job.id)
+        if body is None:
+            body = render_job_body(job)
+            self.renders += 1
+            self.bodies.set(job.id, body)
+        return body
+    
+    def render(self, job, emoji, motivation):
+        """Full notification text for one recipient"""
+        return f"{emoji} *Exciting Job Alert!* {emoji}\n\n{self.body(job)}\n\n{motivation}"
+    
+    def digest_line(self, job):
+        """Cached digest line for a job"""
+        line = self.digest_lines.get(job.id)
+        if line is None:
+            line = digest_line(job)
+            self.renders += 1
+            self.digest_lines.set(job.id, line)
+        return line
+    
+    def stats(self):
+        """Renders done and cache hit rate"""
+        hits = self.bodies.hits + self.digest_lines.hits
+        lookups = hits + self.bodies.misses + self.digest_lines.misses
+        return {
+            'renders': self.renders,
+            'cache_hits': hits,
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,134 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert, delete, select
+
+from src.models import Job, ArchivedJob, SentNotification, OutboxEntry, engine, get_session, optimize_fts
+from src.config import JOB_RETENTION_DAYS, RETENTION_BATCH_SIZE
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Columns copied verbatim from jobs into jobs_archive
+ARCHIVED_COLUMNS = [
+    'id', 'title', 'company', 'location', 'description', 'url', 'source',
+    'external_id', 'posted_date', 'scraped_date', 'category_id'
+]
+
+class RetentionManager:
+    """Moves jobs past the retention window into the archive table"""
+    
+    def __init__(self, retention_days=JOB_RETENTION_DAYS, batch_size=RETENTION_BATCH_SIZE, batch_pause=0.05):
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+    
+    def archive_batch(self, cutoff):
+        """Archive up to one batch of jobs scraped before the cutoff, returning how many were moved"""
+        session = get_session()
+        
+        try:
+            job_ids = [row[0] for row in session.execute(
+                select(Job.id)
+                .where(Job.scraped_date < cutoff)
+                .order_by(Job.id)
+                .limit(self.batch_size)
+            )]
+            
+            if not job_ids:
+                return 0
+            
+            # Ignore rows a previously interrupted batch already copied; the archive is a
+            # separate SQLite file, so the copy and delete are not atomic as a pair
+            job_columns = [getattr(Job, column) for column in ARCHIVED_COLUMNS]
+            session.execute(
+                insert(ArchivedJob).prefix_with("OR IGNORE", dialect="sqlite").from_select(
+                    ARCHIVED_COLUMNS,
+                    select(*job_columns).where(Job.id.in_(job_ids))
+                )
+            )
+            # Archived jobs are never re-added (add_jobs checks the archive) and are far outside
+            # the notification lookback window, so their ledger entries can go with them
+            session.execute(delete(SentNotification).where(SentNotification.job_id.in_(job_ids)))
+            session.execute(delete(Job).where(Job.id.in_(job_ids)))
+            session.commit()
+            return len(job_ids)
+            
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error archiving jobs: {e}")
+            return 0
+        finally:
+            session.close()
+    
+    def prune_dead_letters(self, cutoff):
+        """Delete dead-lettered outbox entries created before the cutoff"""
+        session = get_session()
+        
+        try:
+            deleted = session.execute(
+                delete(OutboxEntry).where(OutboxEntry.status == 'dead', OutboxEntry.created_at < cutoff)
+            ).rowcount
+            session.commit()
+            return deleted
+            
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error pruning dead-lettered notifications: {e}")
+            return 0
+        finally:
+            session.close()
+    
+    def incremental_vacuum(self):
+        """Return pages freed by archiving to the filesystem"""
+        if engine.dialect.name != 'sqlite':
+            return
+        
+        # The pragma frees a single page per step and the sqlite3 module only steps
+        # once per execute(), so run it through executescript() to completion
+        connection = engine.raw_connection()
+        try:
+            connection.driver_connection.executescript(
+                "PRAGMA main.incremental_vacuum; PRAGMA main.wal_checkpoint(TRUNCATE);"
+            )
+        finally:
+            connection.close()
+    
+    def run(self):
+        """Archive every job past the retention window in bounded batches"""
+        if self.retention_days <= 0:
+            return 0
+        
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        logger.info(f"Archiving jobs scraped before {cutoff}")
+        total_archived = 0
+        
+        while True:
+            archived = self.archive_batch(cutoff)
+            if not archived:
+                break
+            
+            total_archived += archived
+            self.incremental_vacuum()
+            
+            # Give the bot and the scraper a chance at the write lock between batches
+            time.sleep(self.batch_pause)
+        
+        logger.info(f"Archived {total_archived} jobs older than {self.retention_days} days")
+        
+        # Deleted jobs stay in the full-text index until its segments are merged
+        if total_archived:
+            try:
+                optimize_fts()
+                self.incremental_vacuum()
+            except Exception as e:
+                logger.error(f"Error optimizing the full-text index: {e}")
+        
+        pruned = self.prune_dead_letters(cutoff)
+        if pruned:
+            logger.info(f"Deleted {pruned} dead-lettered notifications older than {self.retention_days} days")
+        return total_archived
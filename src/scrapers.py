@@ -53,6 +53,8 @@ class BaseScraper:
             page_url = f"{self.main_url}?page={page}" if page > 1 else self.main_url
             logger.info(f"Scraping {self.name} page {page}: {page_url}")
             
+            # Stamped before the request, so the fetch itself counts towards alert latency
+            fetched_at = datetime.datetime.utcnow()
             html = self.get_page(page_url)
             if not html:
                 logger.warning(f"Failed to get page {page} from {self.name}")
@@ -63,6 +65,12 @@ class BaseScraper:
                 logger.info(f"No jobs found on page {page} from {self.name}")
                 break
             
+            # Stage stamps for the alert latency metrics
+            parsed_at = datetime.datetime.utcnow()
+            for job in jobs:
+                job['fetched_at'] = fetched_at
+                job['parsed_at'] = parsed_at
+            
             all_jobs.extend(jobs)
             
             # If we got fewer jobs than expected, we've reached the end
@@ -761,11 +769,9 @@ class GlorriScraper(BaseScraper):
             return None
 
 
-def get_all_jobs():
-    """Scrape jobs from all configured websites"""
-    all_jobs = []
-    
-    scrapers = [
+def get_scrapers():
+    """One scraper per configured website"""
+    return [
         JobSearchScraper(),
         HelloJobScraper(),
         SmartJobScraper(),
@@ -774,14 +780,21 @@ def get_all_jobs():
         BusyScraper(),
         GlorriScraper()
     ]
-    
-    for scraper in scrapers:
-        try:
-            logger.info(f"Starting scraper for {scraper.name}")
-            jobs = scraper.scrape()
-            all_jobs.extend(jobs)
-        except Exception as e:
-            logger.error(f"Error with scraper {scraper.name}: {e}")
+
+def run_scraper(scraper):
+    """Scrape one website, returning an empty list if it fails"""
+    try:
+        logger.info(f"Starting scraper for {scraper.name}")
+        return scraper.scrape()
+    except Exception as e:
+        logger.error(f"Error with scraper {scraper.name}: {e}")
+        return []
+
+def get_all_jobs():
+    """Scrape jobs from all configured websites"""
+    all_jobs = []
+    for scraper in get_scrapers():
+        all_jobs.extend(run_scraper(scraper))
     
     logger.info(f"Total jobs scraped: {len(all_jobs)}")
     return all_jobs 
\ No newline at end of file
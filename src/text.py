@@ -0,0 +1,27 @@
+import re
+import unicodedata
+
+# Azerbaijani (Turkic) casing: dotted capital İ lowers to i, dotless capital I lowers to ı.
+# str.lower() would turn İ into "i" + combining dot and I into a plain i.
+TURKIC_CASE = str.maketrans({'İ': 'i', 'I': 'ı'})
+
+# Letters folded to their plain Latin counterparts so "mühasib" matches "muhasib"
+AZERBAIJANI_FOLD = str.maketrans({
+    'ə': 'e', 'ı': 'i', 'ş': 's', 'ç': 'c', 'ğ': 'g', 'ö': 'o', 'ü': 'u'
+})
+
+# Anything that is not a word character, or the # and + of names like C# and C++
+SEPARATORS = re.compile(r'[^\w#+]+')
+
+def normalize_text(text):
+    """Normalize text for matching: Turkic case folding, diacritic folding and punctuation cleanup"""
+    if not text:
+        return ""
+    
+    text = text.translate(TURKIC_CASE).lower().translate(AZERBAIJANI_FOLD)
+    
+    # Drop any remaining combining marks (é -> e, and so on)
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    
+    return SEPARATORS.sub(' ', text.replace('_', ' ')).strip()
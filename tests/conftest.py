@@ -0,0 +1,30 @@
+"""
+Shared test setup: the whole session runs against a throwaway SQLite database
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Add the repository root to the path so we can import the src package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Must be set before the src package creates its engine
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_PATH}"
+
+@pytest.fixture
+def db_manager():
+    """A DatabaseManager over empty tables"""
+    from src.db_manager import DatabaseManager
+    from src.models import Base, get_session
+    
+    manager = DatabaseManager()
+    session = get_session()
+    for table in reversed(Base.metadata.sorted_tables):
+        session.execute(table.delete())
+    session.commit()
+    session.close()
+    return manager
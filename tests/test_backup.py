@@ -0,0 +1,74 @@
+"""
+Test that online backups finish while other connections keep writing
+"""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from src.backup import BackupError, BackupManager
+
+def make_database(path, journal_mode, rows=5000):
+    """A database of a few megabytes in the given journal mode"""
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    conn.execute("CREATE TABLE jobs (description TEXT)")
+    conn.executemany("INSERT INTO jobs VALUES (?)", [("Job description. " * 60,)] * rows)
+    conn.commit()
+    conn.close()
+
+class Writer(threading.Thread):
+    """Inserts a row every few milliseconds until stopped, like the scraper and handlers"""
+    
+    def __init__(self, path):
+        super().__init__(daemon=True)
+        self.path = path
+        self.writes = 0
+        self.stopped = threading.Event()
+    
+    def run(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        while not self.stopped.is_set():
+            conn.execute("INSERT INTO jobs VALUES ('new')")
+            conn.commit()
+            self.writes += 1
+            time.sleep(0.005)
+        conn.close()
+
+def back_up_while_writing(source_path, target_path, manager):
+    """Run copy_database with a concurrent writer, returning the writes made during the backup"""
+    writer = Writer(source_path)
+    writer.start()
+    while not writer.writes:
+        time.sleep(0.001)
+    try:
+        manager.copy_database(source_path, target_path)
+    finally:
+        writer.stopped.set()
+        writer.join()
+    return writer.writes
+
+def test_wal_backup_finishes_under_concurrent_writes(tmp_path):
+    """A WAL database is copied in one step that writers cannot restart"""
+    source_path, target_path = str(tmp_path / "jobs.db"), str(tmp_path / "backup.db")
+    make_database(source_path, "wal")
+    
+    # Small, slow steps would never finish under these writes
+    started = time.monotonic()
+    writes = back_up_while_writing(source_path, target_path, BackupManager(pages_per_step=1, step_sleep=0.01))
+    
+    assert writes > 0
+    assert time.monotonic() - started < 10
+    conn = sqlite3.connect(target_path)
+    assert conn.execute("SELECT count(*) FROM jobs WHERE description != 'new'").fetchone()[0] == 5000
+    conn.close()
+
+def test_stepped_backup_gives_up_after_max_restarts(tmp_path):
+    """Outside WAL mode, a backup that writers keep restarting fails instead of running forever"""
+    source_path, target_path = str(tmp_path / "jobs.db"), str(tmp_path / "backup.db")
+    make_database(source_path, "delete")
+    
+    with pytest.raises(BackupError, match="restarted"):
+        back_up_while_writing(source_path, target_path, BackupManager(pages_per_step=1, step_sleep=0.01, max_restarts=3))
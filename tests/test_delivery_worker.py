@@ -0,0 +1,113 @@
+"""
+Test delivery workers: pacing, partition ownership and lease rebalancing
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+import src.delivery_worker
+from src.config import DELIVERY_PARTITIONS
+from src.delivery_worker import DeliveryWorker
+from src.dispatcher import Delivery, TokenBucket
+from src.models import DeliveryLease, WorkerHeartbeat, get_session
+
+ALL_PARTITIONS = list(range(DELIVERY_PARTITIONS))
+
+class LosingLeasesDatabase:
+    """Fake database whose heartbeat fails while the worker's first claim is in flight"""
+    
+    def __init__(self):
+        self.worker = None
+        self.completed = []
+        self.claims = 0
+    
+    async def heartbeat_delivery_worker(self, worker_id, lease_seconds, rebalance):
+        return list(range(DELIVERY_PARTITIONS)) if not self.claims else None
+    
+    async def get_due_outbox(self, limit, partitions=None, claimer=None, claim_seconds=None):
+        self.claims += 1
+        # The background heartbeat fails while this claim is awaited
+        await self.worker.heartbeat()
+        return [Delivery(1000 + n, n, f"job {n}", outbox_id=n) for n in range(3)]
+    
+    async def complete_outbox_entry(self, entry_id, user_id=None):
+        self.completed.append(entry_id)
+        if len(self.completed) == 3:
+            self.worker.stop()
+    
+    async def release_delivery_worker(self, worker_id):
+        pass
+
+def test_token_bucket_rejects_non_positive_rates():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+    with pytest.raises(ValueError):
+        TokenBucket(-1)
+
+def test_worker_finishes_a_claimed_batch_after_losing_its_partitions(monkeypatch):
+    """The batch is sent at the rate read before the claim, not at the zero rate of no partitions"""
+    monkeypatch.setattr(src.delivery_worker, "DELIVERY_MODE", "workers")
+    db = LosingLeasesDatabase()
+    
+    async def send(delivery):
+        return True
+    
+    worker = db.worker = DeliveryWorker(db, send, "worker-0", heartbeat_seconds=60, poll_seconds=0.01)
+    asyncio.run(asyncio.wait_for(worker.run(), 10))
+    
+    assert worker.partitions == []
+    assert sorted(db.completed) == [0, 1, 2]
+
+def test_worker_refuses_to_start_outside_workers_mode(monkeypatch):
+    monkeypatch.setattr(src.delivery_worker, "DELIVERY_MODE", "inline")
+    worker = DeliveryWorker(LosingLeasesDatabase(), None, "worker-0")
+    with pytest.raises(ValueError, match="DELIVERY_MODE=workers"):
+        asyncio.run(worker.run())
+
+def expire_worker(worker_id, seconds_ago):
+    """Make a worker look like it died: its leases expired and it stopped sending heartbeats"""
+    past = datetime.utcnow() - timedelta(seconds=seconds_ago)
+    session = get_session()
+    session.execute(update(DeliveryLease).where(DeliveryLease.worker_id == worker_id).values(expires_at=past))
+    session.execute(update(WorkerHeartbeat).where(WorkerHeartbeat.worker_id == worker_id).values(heartbeat_at=past))
+    session.commit()
+    session.close()
+
+def test_a_lone_worker_owns_every_partition(db_manager):
+    assert db_manager.heartbeat_delivery_worker("a", 30) == ALL_PARTITIONS
+    # Renewing without rebalancing keeps what it has
+    assert db_manager.heartbeat_delivery_worker("a", 30, rebalance=False) == ALL_PARTITIONS
+
+def test_workers_split_the_partitions_when_one_joins(db_manager):
+    db_manager.heartbeat_delivery_worker("a", 30)
+    
+    # The newcomer finds nothing free until the owner gives up its surplus
+    assert db_manager.heartbeat_delivery_worker("b", 30) == []
+    owned_a = db_manager.heartbeat_delivery_worker("a", 30)
+    owned_b = db_manager.heartbeat_delivery_worker("b", 30)
+    
+    assert len(owned_a) == len(owned_b) == DELIVERY_PARTITIONS // 2
+    assert sorted(owned_a + owned_b) == ALL_PARTITIONS
+
+def test_a_dead_workers_partitions_are_taken_over_once_its_leases_expire(db_manager):
+    db_manager.heartbeat_delivery_worker("a", 30)
+    db_manager.heartbeat_delivery_worker("b", 30)
+    db_manager.heartbeat_delivery_worker("a", 30)
+    db_manager.heartbeat_delivery_worker("b", 30)
+    
+    expire_worker("a", seconds_ago=60)
+    assert db_manager.heartbeat_delivery_worker("b", 30) == ALL_PARTITIONS
+
+def test_a_stopping_worker_releases_its_partitions_right_away(db_manager):
+    db_manager.heartbeat_delivery_worker("a", 30)
+    db_manager.release_delivery_worker("a")
+    assert db_manager.heartbeat_delivery_worker("b", 30) == ALL_PARTITIONS
+
+def test_a_worker_that_lost_its_lease_does_not_renew_it(db_manager):
+    db_manager.heartbeat_delivery_worker("a", 30)
+    expire_worker("a", seconds_ago=60)
+    assert db_manager.heartbeat_delivery_worker("b", 30) == ALL_PARTITIONS
+    assert db_manager.heartbeat_delivery_worker("a", 30, rebalance=False) == []
@@ -0,0 +1,55 @@
+"""
+Test digest packing and the window held-back digest jobs must stay inside
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from src.config import NOTIFICATION_LOOKBACK_HOURS, SCRAPING_INTERVAL
+from src.digest import MAX_DIGEST_INTERVAL_HOURS, DigestSettings, build_digests, digest_due, digest_line
+
+def jobs(count, title="Python Developer"):
+    return [
+        SimpleNamespace(id=n, title=f"{title} {n}", company="ABB", location="Bakı", url=f"https://example.az/{n}")
+        for n in range(count)
+    ]
+
+def test_digests_hold_at_most_size_jobs_in_order():
+    digests = build_digests(jobs(25), size=10)
+    assert [len(digest.job_ids) for digest in digests] == [10, 10, 5]
+    assert [job_id for digest in digests for job_id in digest.job_ids] == list(range(25))
+    assert digests[0].text.startswith("📬 *Your job digest (1/3):* 10 new jobs")
+
+def test_digests_stay_under_the_message_limit():
+    digests = build_digests(jobs(50, title="Senior " * 15), size=50, limit=1000)
+    assert len(digests) > 1
+    assert all(len(digest.text) <= 1000 for digest in digests)
+    assert sum(len(digest.job_ids) for digest in digests) == 50
+
+def test_link_text_cannot_break_the_markdown():
+    line = digest_line(SimpleNamespace(
+        title="C++ [Senior] *_dev_*`", company="A_B", location=None, url="https://example.az/x_(1)"
+    ))
+    assert line == "• [C++ Senior dev](https://example.az/x_(1%29) — A\\_B"
+
+def test_held_jobs_are_still_in_the_lookback_window_when_the_digest_goes_out():
+    """A job scraped right after a digest goes out in the next one, before it is older than the lookback"""
+    assert MAX_DIGEST_INTERVAL_HOURS > 0
+    last_digest_at = datetime(2024, 1, 1)
+    settings = DigestSettings(size=10, interval_hours=MAX_DIGEST_INTERVAL_HOURS, last_digest_at=last_digest_at)
+    scraped_at = last_digest_at + timedelta(minutes=1)
+    
+    # Cycles start every SCRAPING_INTERVAL minutes, out of step with the digest, and plan
+    # after a scrape that takes up to another interval
+    cycle = last_digest_at + timedelta(minutes=SCRAPING_INTERVAL - 1)
+    planned_at = cycle + timedelta(minutes=SCRAPING_INTERVAL)
+    while not digest_due(settings, planned_at):
+        cycle += timedelta(minutes=SCRAPING_INTERVAL)
+        planned_at = cycle + timedelta(minutes=SCRAPING_INTERVAL)
+    
+    assert planned_at - scraped_at <= timedelta(hours=NOTIFICATION_LOOKBACK_HOURS)
+
+def test_intervals_saved_under_a_longer_lookback_are_capped():
+    last_digest_at = datetime(2024, 1, 1)
+    settings = DigestSettings(size=10, interval_hours=NOTIFICATION_LOOKBACK_HOURS * 2, last_digest_at=last_digest_at)
+    assert digest_due(settings, last_digest_at + timedelta(hours=MAX_DIGEST_INTERVAL_HOURS))
@@ -0,0 +1,32 @@
+"""
+Test that notification sending keeps Telegram's per-chat pacing
+"""
+
+import asyncio
+import time
+
+from src.config import TELEGRAM_CHAT_INTERVAL
+from src.delivery import OutboxDrainer
+from src.dispatcher import Delivery
+
+class CompletingDatabase:
+    """Fake database that accepts every completed entry"""
+    
+    async def complete_outbox_entry(self, entry_id, user_id=None):
+        pass
+
+def test_chat_pacing_carries_over_between_batches():
+    """A chat's first message in a batch waits out the interval after its last one in the previous batch"""
+    sent_at = []
+    
+    async def send(delivery):
+        sent_at.append(time.monotonic())
+        return True
+    
+    async def run():
+        drainer = OutboxDrainer(CompletingDatabase(), send)
+        for outbox_id in range(2):
+            await drainer.send_batch([Delivery(1, 1, "job", outbox_id)], rate=1000)
+    
+    asyncio.run(run())
+    assert sent_at[1] - sent_at[0] >= TELEGRAM_CHAT_INTERVAL * 0.99
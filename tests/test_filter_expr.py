@@ -0,0 +1,73 @@
+"""
+Test parsing and evaluation of filter expressions
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from src.filter_expr import FilterExpressionError, compile_filter_expression, job_fields, parse_filter_expression
+
+def job(title, company="ABB", location="Bakı", source="Busy", category="IT"):
+    return job_fields(SimpleNamespace(
+        title=title, title_normalized=None, company=company, location=location, source=source, category_name=category
+    ))
+
+def matches(expression, **fields):
+    return compile_filter_expression(expression)(job(**fields))
+
+def test_and_binds_tighter_than_or():
+    assert parse_filter_expression("python AND django OR golang") == (
+        "or", [("and", [("term", "python", "text"), ("term", "django", "text")]), ("term", "golang", "text")]
+    )
+    assert matches("python AND django OR golang", title="Golang developer")
+    assert not matches("python AND (django OR golang)", title="Golang developer")
+
+def test_adjacent_terms_are_anded():
+    assert parse_filter_expression("python senior") == parse_filter_expression("python AND senior")
+
+def test_not_binds_tightest():
+    assert parse_filter_expression("python NOT senior") == (
+        "and", [("term", "python", "text"), ("not", ("term", "senior", "text"))]
+    )
+    assert matches("python NOT senior", title="Python developer")
+    assert not matches("python NOT senior", title="Senior Python developer")
+    assert matches("NOT NOT python", title="Python developer")
+
+def test_quoted_phrases_match_as_a_whole():
+    assert matches('"data analyst"', title="Senior Data Analyst")
+    assert not matches('"data analyst"', title="Data engineer and analyst")
+
+def test_terms_are_normalized_like_titles():
+    assert matches("mühasib", title="Baş Muhasib")
+    assert matches("MUHASIB", title="Baş mühasib")
+
+def test_fields_scope_terms():
+    assert matches("company:abb", title="Python developer", company="ABB")
+    assert not matches("company:abb", title="ABB Python developer", company="Kapital Bank")
+    assert matches('source:busy AND title:"python developer"', title="Python developer", source="Busy")
+    assert not matches("location:baki", title="Python developer", location="Gəncə")
+    # Bare terms search title, company and location, but not the source
+    assert matches("kapital", title="Analyst", company="Kapital Bank")
+    assert not matches("busy", title="Analyst", source="Busy")
+
+@pytest.mark.parametrize("expression", [
+    "",
+    "   ",
+    "python AND",
+    "OR python",
+    "(python",
+    "python)",
+    "()",
+    '"unterminated',
+    "salary:1000",
+    "title:",
+    "title: python",
+    "source:(linkedin OR boss)",
+    "python `rm`",
+    "!!!",
+    "x" * 501,
+])
+def test_malformed_expressions_are_rejected(expression):
+    with pytest.raises(FilterExpressionError):
+        parse_filter_expression(expression)
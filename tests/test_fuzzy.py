@@ -0,0 +1,47 @@
+"""
+Test typo-tolerant keyword matching with the trigram index
+"""
+
+from src.fuzzy import MAX_TITLE_WORDS, FuzzyKeywordMatcher, similarity, trigrams
+
+def test_similarity_of_identical_and_unrelated_words():
+    assert similarity(trigrams("python"), trigrams("python")) == 1.0
+    assert similarity(trigrams("python"), trigrams("mühasib")) == 0.0
+    assert similarity(trigrams(""), frozenset()) == 0.0
+
+def test_typos_match_and_unrelated_words_do_not():
+    matcher = FuzzyKeywordMatcher(["developer", "muhasib"])
+    assert matcher.search("senior developr") == {"developer"}
+    assert matcher.search("bas muhasb") == {"muhasib"}
+    assert matcher.search("data analyst") == set()
+    assert matcher.search("") == set()
+
+def test_every_word_of_a_keyword_must_occur():
+    matcher = FuzzyKeywordMatcher(["python developer"])
+    assert matcher.search("pythonn developr remote") == {"python developer"}
+    assert matcher.search("python analyst") == set()
+
+def test_threshold_decides_what_counts_as_a_typo():
+    assert FuzzyKeywordMatcher(["developer"], threshold=0.2).search("devops") == {"developer"}
+    assert FuzzyKeywordMatcher(["developer"], threshold=0.9).search("developr") == set()
+
+def test_title_words_are_cached_and_bounded():
+    matcher = FuzzyKeywordMatcher(["developer"], cache_size=10)
+    matcher.search("senior developr")
+    assert matcher.word_cache.get("developr") == frozenset({"developer"})
+    
+    # Only the first MAX_TITLE_WORDS words of a title are looked at
+    assert matcher.search(" ".join(["filler"] * MAX_TITLE_WORDS + ["developer"])) == set()
+
+def test_fuzzy_filters_match_in_both_matchers(db_manager):
+    """A fuzzy keyword filter finds a misspelt title through get_new_jobs_for_user and the subscription index"""
+    db_manager.register_user(1)
+    db_manager.add_keyword_filter(1, "Mühasib", fuzzy=True)
+    db_manager.add_jobs([
+        dict(title=title, url=f"https://example.az/fuzzy/{n}", source="Test")
+        for n, title in enumerate(["Baş muhasb", "Data analyst"])
+    ])
+    
+    assert [job.title for job in db_manager.get_new_jobs_for_user(1)] == ["Baş muhasb"]
+    matches = db_manager.get_subscription_index().match(db_manager.get_new_jobs())
+    assert [job.title for jobs in matches.values() for job in jobs] == ["Baş muhasb"]
@@ -0,0 +1,51 @@
+"""
+Test per-method query statistics
+"""
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from src.instrumentation import QueryStats, current_method
+
+@pytest.fixture
+def instrumented():
+    engine = create_engine("sqlite://")
+    stats = QueryStats(slow_threshold_ms=float("inf"))
+    stats.install(engine)
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY)"))
+        stats.report(reset=True)
+        yield stats, conn
+
+def run_as(method, conn, statement):
+    token = current_method.set(method)
+    try:
+        return conn.execute(text(statement))
+    finally:
+        current_method.reset(token)
+
+def method_report(stats, method):
+    return next(entry for entry in stats.report() if entry['method'] == method)
+
+def test_failing_statements_do_not_leak_start_times(instrumented):
+    stats, conn = instrumented
+    for _ in range(3):
+        with pytest.raises(OperationalError):
+            run_as("broken", conn, "SELECT * FROM missing")
+        conn.rollback()
+    
+    assert conn.info["query_start_time"] == []
+    run_as("reader", conn, "SELECT 1")
+    assert conn.info["query_start_time"] == []
+    assert method_report(stats, "broken")['failed'] == 3
+
+def test_row_counts_cover_writes_but_not_selects(instrumented):
+    stats, conn = instrumented
+    run_as("writer", conn, "INSERT INTO items (id) VALUES (1), (2), (3)")
+    run_as("writer", conn, "DELETE FROM items WHERE id = 1")
+    run_as("reader", conn, "SELECT * FROM items").fetchall()
+    
+    assert method_report(stats, "writer")['rows'] == 4
+    assert method_report(stats, "reader")['rows'] is None
+    assert method_report(stats, "reader")['statements'] == 1
@@ -0,0 +1,67 @@
+"""
+Test that keyword filters match the same jobs in SQL (through the FTS5 index) and in memory
+"""
+
+from src.db_manager import keyword_filter_clause
+from src.models import fts_enabled
+
+TITLES = [
+    "Senior Python Developer",
+    "Python/Django developer (remote)",
+    "Baş mühasib",
+    "Mühasibat uçotu üzrə mütəxəssis",
+    "C# .NET Developer",
+    "C++ proqramçı",
+    "Data Analyst",
+    "Business Analyst - Banking",
+    "İnsan resursları meneceri",
+    "Satış təmsilçisi",
+    "QA Engineer",
+    "Frontend developer (React)",
+]
+
+KEYWORD_SETS = [
+    ["python"],
+    ["Developer"],
+    ["mühasib"],
+    ["muhasib", "analyst"],
+    ["c#"],
+    ["c++"],
+    ["qa"],
+    ["data analyst"],
+    ["pyth"],
+    ["insan resurslari"],
+    ["satis", "react"],
+    ["nothing like this"],
+]
+
+def test_sql_and_in_memory_matchers_agree(db_manager):
+    """Every user gets the same jobs from get_new_jobs_for_user as from the subscription index"""
+    for telegram_id, keywords in enumerate(KEYWORD_SETS, start=1):
+        db_manager.register_user(telegram_id)
+        for keyword in keywords:
+            db_manager.add_keyword_filter(telegram_id, keyword)
+    db_manager.add_jobs([
+        dict(title=title, company="ABB", description="Python is a plus", url=f"https://example.az/fts/{n}", source="Test")
+        for n, title in enumerate(TITLES)
+    ])
+    
+    index = db_manager.get_subscription_index()
+    in_memory = {
+        subscription.telegram_id: sorted(job.title for job in jobs)
+        for subscription, jobs in index.match(db_manager.get_new_jobs()).items()
+    }
+    
+    for telegram_id, keywords in enumerate(KEYWORD_SETS, start=1):
+        in_sql = sorted(job.title for job in db_manager.get_new_jobs_for_user(telegram_id))
+        assert in_sql == in_memory.get(telegram_id, []), keywords
+    
+    # Substrings, phrases, prefixes and diacritic-insensitive keywords all match something
+    assert in_memory[1] == ["Python/Django developer (remote)", "Senior Python Developer"]
+    assert in_memory[4] == ["Baş mühasib", "Business Analyst - Banking", "Data Analyst", "Mühasibat uçotu üzrə mütəxəssis"]
+    assert in_memory[9] == in_memory[1]
+    assert 12 not in in_memory
+
+def test_keyword_filters_use_the_fts_index():
+    assert fts_enabled()
+    assert "jobs_fts MATCH" in str(keyword_filter_clause(["python"]))
@@ -0,0 +1,85 @@
+"""
+Test the Aho-Corasick keyword automaton and the job-centric subscription index
+"""
+
+import random
+from datetime import datetime
+
+from src.db_manager import JobRecord, Subscription
+from src.matching import KeywordAutomaton, SubscriptionIndex, match_jobs_per_user
+from src.text import normalize_text
+
+def found(automaton, text):
+    return {automaton.keywords[index] for index in automaton.search(text)}
+
+def record(job_id, title, category_id=None):
+    return JobRecord(job_id, title, normalize_text(title), "ABB", "Bakı", f"https://example.az/{job_id}", "Test",
+                     category_id, None, datetime(2024, 1, 2))
+
+def subscription(user_id, categories=(), keywords=(), expression=None):
+    """A subscription with its keywords normalized, as the database stores them"""
+    keywords = tuple(normalize_text(keyword) for keyword in keywords)
+    return Subscription(user_id, user_id, datetime(2024, 1, 1), frozenset(categories), keywords, (), expression)
+
+def test_automaton_finds_overlapping_keywords():
+    automaton = KeywordAutomaton(["he", "she", "his", "hers"])
+    assert found(automaton, "ushers") == {"he", "she", "hers"}
+    assert found(automaton, "this") == {"his"}
+    assert found(automaton, "") == set()
+
+def test_automaton_follows_failure_links_into_other_keywords():
+    automaton = KeywordAutomaton(["python developer", "developer", "per", "c#", "c++"])
+    assert found(automaton, "senior python developer") == {"python developer", "developer", "per"}
+    assert found(automaton, "pythondeveloper") == {"developer", "per"}
+    assert found(automaton, "c# and c++") == {"c#", "c++"}
+
+def test_automaton_agrees_with_substring_search():
+    rng = random.Random(35)
+    for _ in range(200):
+        keywords = {"".join(rng.choice("abc ") for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 8))}
+        text = "".join(rng.choice("abc ") for _ in range(rng.randint(0, 30)))
+        assert found(KeywordAutomaton(sorted(keywords)), text) == {keyword for keyword in keywords if keyword in text}
+
+def test_index_routes_jobs_by_keyword_category_and_no_filters():
+    index = SubscriptionIndex([
+        subscription(1, keywords=["python"]),
+        subscription(2, categories=[7], keywords=["python"]),
+        subscription(3, categories=[7]),
+        subscription(4),
+        subscription(5, keywords=["mühasib"]),
+    ])
+    assert index.users_for_job(record(1, "Senior Python Developer", category_id=7)) == {1, 2, 3, 4}
+    assert index.users_for_job(record(2, "Python Developer", category_id=8)) == {1, 4}
+    assert index.users_for_job(record(3, "Baş Muhasib", category_id=8)) == {4, 5}
+
+def test_index_updates_one_user_at_a_time():
+    index = SubscriptionIndex([subscription(1, keywords=["python"]), subscription(2, keywords=["golang"])])
+    job = record(1, "Python Developer")
+    
+    index.upsert(subscription(2, keywords=["python", "golang"]))
+    assert index.users_for_job(job) == {1, 2}
+    index.remove(1)
+    assert index.users_for_job(job) == {2}
+    index.upsert(subscription(2, keywords=["golang"]))
+    assert index.users_for_job(job) == set()
+    assert "python" not in index.keyword_users
+
+def test_index_agrees_with_the_per_user_matcher():
+    rng = random.Random(36)
+    words = ["python", "java", "developer", "analyst", "mühasib", "satış", "c#", "data"]
+    subscriptions = [
+        subscription(
+            user_id,
+            categories=rng.sample(range(1, 6), rng.randint(0, 2)),
+            keywords=rng.sample(words, rng.randint(0, 2)),
+            expression=rng.choice([None, None, "NOT senior", "company:abb"])
+        )
+        for user_id in range(1, 301)
+    ]
+    jobs = [
+        record(job_id, " ".join(rng.sample(words + ["senior", "junior", "baş"], 3)), category_id=rng.randint(1, 6))
+        for job_id in range(1, 101)
+    ]
+    sent_pairs = {(rng.randint(1, 300), rng.randint(1, 100)) for _ in range(500)}
+    
+    assert SubscriptionIndex(subscriptions).match(jobs, sent_pairs) == match_jobs_per_user(subscriptions, jobs, sent_pairs)
@@ -0,0 +1,174 @@
+"""
+Test the notification outbox: claiming, retries with backoff and deactivation of unreachable users
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from src.config import OUTBOX_MAX_ATTEMPTS
+from src.dispatcher import Delivery
+from src.models import OutboxEntry, SentNotification, User, get_session
+from src.outbox import backoff_delay
+
+def queue_jobs(db_manager, chats, jobs_per_chat):
+    """Register `chats` users and queue the same `jobs_per_chat` jobs for each, returning their user IDs"""
+    db_manager.add_jobs([
+        dict(title=f"Python Developer {n}", company="ABB", url=f"https://example.az/outbox/{n}", source="Test")
+        for n in range(jobs_per_chat)
+    ])
+    jobs = db_manager.get_new_jobs()
+    user_ids = {}
+    deliveries = []
+    for chat_id in range(1, chats + 1):
+        user_ids[chat_id] = db_manager.register_user(chat_id)
+        deliveries.extend(Delivery(chat_id, user_ids[chat_id], job) for job in jobs)
+    db_manager.enqueue_notifications(deliveries)
+    return user_ids
+
+def test_batches_interleave_chats(db_manager):
+    """Each chat's jobs are queued together, but a batch takes them round-robin across chats"""
+    queue_jobs(db_manager, chats=4, jobs_per_chat=20)
+    
+    batches = []
+    while True:
+        batch = db_manager.get_due_outbox(20)
+        if not batch:
+            break
+        batches.append(sorted(delivery.chat_id for delivery in batch))
+        for delivery in batch:
+            db_manager.complete_outbox_entry(delivery.outbox_id, delivery.user_id)
+    
+    assert batches == [[1] * 5 + [2] * 5 + [3] * 5 + [4] * 5] * 4
+
+def outbox_entry(entry_id):
+    """The entry as stored, or None once it has been removed"""
+    session = get_session()
+    try:
+        return session.get(OutboxEntry, entry_id)
+    finally:
+        session.close()
+
+def test_claimed_entries_are_not_handed_out_twice_until_the_claim_expires(db_manager):
+    queue_jobs(db_manager, chats=3, jobs_per_chat=2)
+    
+    first = db_manager.get_due_outbox(4, claimer="first")
+    second = db_manager.get_due_outbox(10, claimer="second")
+    assert len(first) == 4 and len(second) == 2
+    assert not {delivery.outbox_id for delivery in first} & {delivery.outbox_id for delivery in second}
+    assert outbox_entry(second[0].outbox_id).claimed_by.startswith("second/")
+    assert db_manager.get_due_outbox(10) == []
+    
+    # A sender that died leaves its claims behind until they expire
+    session = get_session()
+    session.execute(
+        update(OutboxEntry).where(OutboxEntry.claimed_by.startswith("first/"))
+        .values(claimed_until=datetime.utcnow() - timedelta(seconds=1))
+    )
+    session.commit()
+    session.close()
+    assert sorted(delivery.outbox_id for delivery in db_manager.get_due_outbox(10)) == sorted(
+        delivery.outbox_id for delivery in first
+    )
+
+def test_partitions_limit_the_chats_claimed(db_manager):
+    queue_jobs(db_manager, chats=4, jobs_per_chat=1)
+    assert db_manager.get_due_outbox(10, partitions=[]) == []
+    assert {delivery.chat_id for delivery in db_manager.get_due_outbox(10, partitions=[1, 3])} == {1, 3}
+
+def test_completed_entries_leave_the_outbox_and_stamp_the_ledger(db_manager):
+    queue_jobs(db_manager, chats=1, jobs_per_chat=1)
+    delivery = db_manager.get_due_outbox(10)[0]
+    
+    assert db_manager.complete_outbox_entry(delivery.outbox_id, delivery.user_id)
+    assert outbox_entry(delivery.outbox_id) is None
+    session = get_session()
+    ledger = session.query(SentNotification).filter(SentNotification.user_id == delivery.user_id).one()
+    session.close()
+    assert ledger.delivered_at is not None
+
+def test_transient_failures_are_retried_with_backoff(db_manager):
+    queue_jobs(db_manager, chats=1, jobs_per_chat=1)
+    delivery = db_manager.get_due_outbox(10)[0]
+    
+    before = datetime.utcnow()
+    assert db_manager.fail_outbox_entry(delivery.outbox_id, "TimedOut", transient=True) == 'pending'
+    entry = outbox_entry(delivery.outbox_id)
+    assert entry.attempts == 1 and entry.claimed_by is None
+    assert before + timedelta(seconds=backoff_delay(1) / 2 - 1) <= entry.next_attempt_at
+    
+    # Not due again until the backoff has passed
+    assert db_manager.get_due_outbox(10) == []
+    assert len(db_manager.get_due_outbox(10, now=entry.next_attempt_at)) == 1
+
+def test_entries_are_dead_lettered_after_max_attempts_or_a_permanent_error(db_manager):
+    queue_jobs(db_manager, chats=2, jobs_per_chat=1)
+    retried, permanent = db_manager.get_due_outbox(10)
+    
+    for attempt in range(1, OUTBOX_MAX_ATTEMPTS + 1):
+        status = db_manager.fail_outbox_entry(retried.outbox_id, "TimedOut", transient=True)
+        assert status == ('dead' if attempt == OUTBOX_MAX_ATTEMPTS else 'pending')
+    assert db_manager.fail_outbox_entry(permanent.outbox_id, "BadRequest", transient=False) == 'dead'
+    assert db_manager.get_due_outbox(10, now=datetime.utcnow() + timedelta(days=1)) == []
+
+def test_backoff_doubles_and_is_capped():
+    assert 15 <= backoff_delay(1, base=30, maximum=3600) <= 30
+    assert 60 <= backoff_delay(3, base=30, maximum=3600) <= 120
+    assert 1800 <= backoff_delay(20, base=30, maximum=3600) <= 3600
+
+def stored_user(user_id):
+    session = get_session()
+    try:
+        return session.get(User, user_id)
+    finally:
+        session.close()
+
+def test_unreachable_chats_deactivate_the_user_until_they_come_back(db_manager):
+    user_id = queue_jobs(db_manager, chats=1, jobs_per_chat=2)[1]
+    index = db_manager.get_subscription_index()
+    assert len(index) == 1
+    failed, other = db_manager.get_due_outbox(10)
+    
+    assert db_manager.fail_outbox_entry(failed.outbox_id, "Forbidden: bot was blocked", transient=False, unreachable=True) == 'dead'
+    user = stored_user(user_id)
+    assert not user.is_active and user.deactivated_reason == 'unreachable'
+    assert outbox_entry(other.outbox_id).status == 'dead'
+    assert len(index) == 0
+    
+    # Writing to the bot again (/start) means the chat works
+    db_manager.register_user(1)
+    user = stored_user(user_id)
+    assert user.is_active and user.deactivated_reason is None and user.consecutive_failures == 0
+    assert len(index) == 1
+
+def test_paused_users_stay_paused_when_they_write_again(db_manager):
+    user_id = db_manager.register_user(1)
+    
+    db_manager.set_user_active(1, False)
+    db_manager.register_user(1)
+    user = stored_user(user_id)
+    assert not user.is_active and user.deactivated_reason == 'paused'
+    
+    db_manager.set_user_active(1, True)
+    user = stored_user(user_id)
+    assert user.is_active and user.deactivated_reason is None
+
+def test_transient_failures_back_the_user_off_until_a_send_succeeds(db_manager):
+    user_id = queue_jobs(db_manager, chats=1, jobs_per_chat=1)[1]
+    db_manager.get_subscription_index()
+    delivery = db_manager.get_due_outbox(10)[0]
+    
+    db_manager.fail_outbox_entry(delivery.outbox_id, "TimedOut", transient=True, error_class="TimedOut")
+    user = stored_user(user_id)
+    assert user.consecutive_failures == 1 and user.last_error_class == "TimedOut"
+    assert user.backoff_until > datetime.utcnow()
+    
+    # New jobs are held back while the user backs off
+    db_manager.add_jobs([dict(title="Golang Developer", url="https://example.az/outbox/new", source="Test")])
+    assert user_id not in {subscription.user_id for subscription in db_manager.plan_notifications()}
+    
+    retry = db_manager.get_due_outbox(10, now=datetime.utcnow() + timedelta(days=1))[0]
+    db_manager.complete_outbox_entry(retry.outbox_id, user_id)
+    user = stored_user(user_id)
+    assert user.consecutive_failures == 0 and user.backoff_until is None and user.last_success_at is not None
+    assert user_id in {subscription.user_id for subscription in db_manager.plan_notifications()}
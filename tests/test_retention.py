@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Test that archiving old jobs shrinks the database file
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from conftest import DATABASE_PATH
+from src.models import Job, engine, get_session
+from src.retention import RetentionManager
+
+def database_size():
+    """Size of the main database file plus its write-ahead log"""
+    return sum(os.path.getsize(path) for path in (DATABASE_PATH, DATABASE_PATH + "-wal") if os.path.exists(path))
+
+def test_new_database_uses_incremental_auto_vacuum(db_manager):
+    """A freshly created database is in incremental auto-vacuum mode"""
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA main.auto_vacuum").scalar() == 2
+
+def test_archiving_shrinks_database_file(db_manager, jobs=3000):
+    """Archiving every job returns the freed pages to the filesystem"""
+    db_manager.add_jobs([
+        dict(title=f"Python Developer {n}", company="ABB", description="Job description. " * 200,
+             url=f"https://example.az/retention/{n}", source="Test", category="IT")
+        for n in range(jobs)
+    ])
+    
+    # Make every job older than the retention window
+    session = get_session()
+    session.execute(update(Job).values(scraped_date=datetime.utcnow() - timedelta(days=30)))
+    session.commit()
+    session.close()
+    
+    RetentionManager(retention_days=1, batch_pause=0).incremental_vacuum()
+    size_before = database_size()
+    archived = RetentionManager(retention_days=1, batch_pause=0).run()
+    size_after = database_size()
+    
+    print(f"Archived {archived} jobs: {size_before:,} -> {size_after:,} bytes")
+    assert archived == jobs
+    assert size_after < size_before / 2
@@ -99,7 +99,7 @@ if [ -d "venv" ]; then
 fi
 
 MISSING_PACKAGES=0
-REQUIRED_PACKAGES=("python-telegram-bot" "requests" "beautifulsoup4" "lxml" "SQLAlchemy" "schedule" "python-dotenv")
+REQUIRED_PACKAGES=("python-telegram-bot" "requests" "beautifulsoup4" "lxml" "SQLAlchemy" "python-dotenv")
 
 for package in "${REQUIRED_PACKAGES[@]}"; do
     if python3 -c "import $package" 2>/dev/null; then